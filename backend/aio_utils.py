@@ -0,0 +1,90 @@
+"""Async data layer for the request path.
+
+The boto3 helpers in db_utils and s3_utils block, so calling them from a
+sync route holds one of Starlette's default threadpool workers (40 by
+default) for the whole network round-trip. These wrappers run them on a
+dedicated executor sized to the AWS connection pool instead, which lets the
+async routes keep the event loop free and scale concurrency with
+AWS_MAX_POOL_CONNECTIONS rather than the framework's threadpool.
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import get_settings
+from db_utils import batch_get_file_metadata, claim_download, get_file_metadata
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_settings().aws_max_pool_connections,
+                    thread_name_prefix="aws-io",
+                )
+    return _executor
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking AWS call on the AWS I/O executor."""
+    loop = asyncio.get_running_loop()
+    # Carry the request's log and metrics context into the worker thread
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_get_executor(), functools.partial(ctx.run, func, *args, **kwargs))
+
+
+async def get_file_metadata_async(
+    table_name: str,
+    region_name: str,
+    file_id: str,
+    endpoint_url: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    return await run_blocking(
+        get_file_metadata,
+        table_name=table_name,
+        region_name=region_name,
+        file_id=file_id,
+        endpoint_url=endpoint_url,
+    )
+
+
+async def batch_get_file_metadata_async(
+    table_name: str,
+    region_name: str,
+    file_ids: List[str],
+    endpoint_url: Optional[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    return await run_blocking(
+        batch_get_file_metadata,
+        table_name=table_name,
+        region_name=region_name,
+        file_ids=file_ids,
+        endpoint_url=endpoint_url,
+    )
+
+
+async def claim_download_async(
+    table_name: str,
+    region_name: str,
+    file_id: str,
+    now_epoch: int,
+    endpoint_url: Optional[str] = None,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    return await run_blocking(
+        claim_download,
+        table_name=table_name,
+        region_name=region_name,
+        file_id=file_id,
+        now_epoch=now_epoch,
+        endpoint_url=endpoint_url,
+    )
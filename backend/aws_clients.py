@@ -0,0 +1,135 @@
+"""Process-wide registry of pooled boto3 clients and resources.
+
+With STORAGE_BACKEND=memory or filesystem, the in-process stand-ins from
+local_storage are returned instead.
+"""
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+from config import get_settings
+from metrics import instrument_client
+
+
+_lock = threading.Lock()
+_session: Optional[boto3.session.Session] = None
+_clients: Dict[Tuple, Any] = {}
+_credentials = None
+_generation = 0
+_local = threading.local()
+
+
+def _get_session() -> boto3.session.Session:
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+
+def _build_config(addressing_style: Optional[str] = None) -> Config:
+    settings = get_settings()
+    kwargs = {
+        "max_pool_connections": settings.aws_max_pool_connections,
+        "tcp_keepalive": settings.aws_tcp_keepalive,
+        "retries": {
+            "max_attempts": settings.aws_max_attempts,
+            "mode": settings.aws_retry_mode,
+        },
+    }
+    if addressing_style:
+        kwargs["s3"] = {"addressing_style": addressing_style}
+    return Config(**kwargs)
+
+
+def get_client(
+    service_name: str,
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    addressing_style: Optional[str] = None,
+):
+    """Return a shared client for (service, region, endpoint, addressing style).
+
+    Low-level clients are thread-safe, so one instance (and one connection
+    pool) is shared by every thread in the process.
+    """
+    key = (service_name, region_name, endpoint_url, addressing_style)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    if get_settings().storage_backend != "aws":
+        from local_storage import get_local_client
+        client = _clients[key] = get_local_client(service_name)
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _get_session().client(
+                service_name,
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                config=_build_config(addressing_style),
+            )
+            instrument_client(client)
+            _clients[key] = client
+    return client
+
+
+def get_resource(
+    service_name: str,
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+):
+    """Return a resource for (service, region, endpoint), cached per thread.
+
+    boto3 resources are not thread-safe, so each thread keeps its own
+    instance. They are built on top of the shared client so the service
+    model and connection pool are still reused.
+    """
+    cache = getattr(_local, "resources", None)
+    if cache is None or getattr(_local, "generation", None) != _generation:
+        cache = _local.resources = {}
+        _local.generation = _generation
+    key = (service_name, region_name, endpoint_url)
+    resource = cache.get(key)
+    if resource is None and get_settings().storage_backend != "aws":
+        from local_storage import get_local_resource
+        resource = cache[key] = get_local_resource(service_name)
+    if resource is None:
+        client = get_client(service_name, region_name, endpoint_url)
+        with _lock:
+            resource = _get_session().resource(
+                service_name,
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                config=_build_config(),
+            )
+        # Reuse the pooled client instead of the one the resource built
+        resource.meta.client = client
+        cache[key] = resource
+    return resource
+
+
+def get_credentials():
+    """Return frozen credentials from the shared session, or None if unavailable."""
+    global _credentials
+    if _credentials is None:
+        with _lock:
+            if _credentials is None:
+                _credentials = _get_session().get_credentials()
+    if _credentials is None:
+        return None
+    # Refreshable credentials (e.g. instance roles) refresh themselves here
+    return _credentials.get_frozen_credentials()
+
+
+def reset_clients() -> None:
+    """Drop all cached clients (e.g. after changing credentials in tests)."""
+    global _session, _credentials, _generation
+    with _lock:
+        _clients.clear()
+        _session = None
+        _credentials = None
+        _generation += 1
@@ -0,0 +1,92 @@
+"""Shared setup for the benchmark scripts in this directory.
+
+Benchmarks run the real app in process against the in-memory storage
+backend, so they need no AWS account, LocalStack or network. Settings are
+read once at import, so call setup() before importing any backend module.
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_DEFAULTS = {
+    "STORAGE_BACKEND": "memory",
+    "LOCAL_STORAGE_URL": "http://bench",
+    "AWS_REGION": "us-east-1",
+    "S3_BUCKET_NAME": "bench-bucket",
+    "DDB_TABLE_NAME": "bench-table",
+    "LOG_LEVEL": "WARNING",
+    "METRICS_EMF": "false",
+    "MAX_UPLOADS_PER_HOUR": "100000000",
+}
+
+
+def setup(**overrides: str) -> None:
+    """Point the backend at the memory store; explicit env vars and overrides win."""
+    for name, value in _DEFAULTS.items():
+        os.environ.setdefault(name, value)
+    os.environ.update(overrides)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+
+def add_latency(cls: type, methods: List[str], seconds: float) -> None:
+    """Make the stand-in's calls take about as long as a round-trip to AWS."""
+    for name in methods:
+        original = getattr(cls, name)
+
+        def slow(self, *args, __original=original, **kwargs):
+            time.sleep(seconds)
+            return __original(self, *args, **kwargs)
+
+        setattr(cls, name, slow)
+
+
+async def asgi_call(
+    app: Any,
+    method: str,
+    path: str,
+    query: str = "",
+    body: Optional[Any] = None,
+    content_type: str = "application/json",
+) -> Tuple[int, bytes]:
+    """One request straight through the ASGI app; returns (status, body). Bytes bodies are sent as is."""
+    if isinstance(body, bytes):
+        payload = body
+    else:
+        payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"content-type", content_type.encode()), (b"host", b"bench")],
+        "server": ("bench", 80),
+        "client": ("10.0.0.1", 1234),
+        "app": app,
+    }
+    sent = False
+    messages: List[Dict[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        messages.append(message)
+
+    await app(scope, receive, send)
+    status = next(m["status"] for m in messages if m["type"] == "http.response.start")
+    return status, b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+
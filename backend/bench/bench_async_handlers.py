@@ -0,0 +1,74 @@
+"""Throughput of /file-info and /download as concurrency grows.
+
+Each DynamoDB call on the memory backend is slowed down to --latency-ms to
+stand in for a network round-trip, and the metadata cache is off so every
+/file-info reads the table. Because the handlers are async and the calls
+run on the AWS I/O executor, throughput should scale with concurrency up to
+AWS_MAX_POOL_CONNECTIONS (default 50), close to pool / latency. Before,
+sync handlers stopped scaling at Starlette's 40 threadpool workers.
+
+    cd backend && python bench/bench_async_handlers.py [--latency-ms 20] [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import time
+
+from _common import add_latency, asgi_call, setup
+
+setup(METADATA_CACHE_MAX_ENTRIES="0")
+
+import main  # noqa: E402
+from config import get_settings  # noqa: E402
+from db_utils import put_file_metadata  # noqa: E402
+from local_storage import LocalTable  # noqa: E402
+
+
+async def run(path: str, query: str, requests: int, concurrency: int) -> float:
+    """Requests per second for `requests` calls with at most `concurrency` in flight."""
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with gate:
+            status, _ = await asgi_call(main.app, "GET", path, query)
+            assert status == 200, status
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+async def bench(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    put_file_metadata(
+        table_name=settings.ddb_table_name,
+        region_name=settings.aws_region,
+        item={
+            "file_id": "bench",
+            "filename": "bench.txt",
+            "s3_key": "uploads/bench/bench.txt",
+            # Far more than the API allows, so /download never runs out
+            "max_downloads": 10 ** 9,
+            "downloads": 0,
+            "expires_at_epoch": int(time.time()) + 3600,
+            "object_present": True,
+        },
+    )
+    add_latency(LocalTable, ["get_item", "update_item"], args.latency_ms / 1000)
+
+    pool = settings.aws_max_pool_connections
+    print(f"DynamoDB latency {args.latency_ms} ms, AWS I/O pool {pool}; "
+          f"ceiling ~{pool / (args.latency_ms / 1000):.0f} req/s")
+    print(f"{'concurrency':>11}  {'/file-info req/s':>16}  {'/download req/s':>15}")
+    for concurrency in args.concurrency:
+        info = await run("/file-info", "file_id=bench", args.requests, concurrency)
+        download = await run("/download", "file_id=bench", args.requests, concurrency)
+        print(f"{concurrency:>11}  {info:>16.0f}  {download:>15.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 40, 100, 200])
+    asyncio.run(bench(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""Per-request cost of the LocalStack resource checks, and lifecycle writes.
+
+With USE_LOCALSTACK and LOCALSTACK_AUTOCREATE on, the upload endpoints need
+the bucket and table to exist. This times POST /upload and /upload-file on
+the memory backend two ways. "per request" clears the readiness flag
+before every request, which is what the handlers used to do. "once" is the
+current bootstrap.ensure_resources. HeadBucket and DescribeTable are
+slowed to --latency-ms, like a LocalStack round-trip, and counted.
+
+It then runs setup_s3_lifecycle_policy for five startups with two distinct
+expiry settings and counts the PutBucketLifecycleConfiguration calls.
+
+    cd backend && python bench/bench_bootstrap.py [--requests 200] [--latency-ms 2]
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from _common import add_latency, asgi_call, setup
+
+setup(USE_LOCALSTACK="true", LOCALSTACK_AUTOCREATE="true")
+
+import bootstrap  # noqa: E402
+import main  # noqa: E402
+from config import get_settings  # noqa: E402
+from local_storage import LocalDynamoClient, LocalS3Client  # noqa: E402
+from s3_lifecycle import setup_s3_lifecycle_policy  # noqa: E402
+
+calls: Counter = Counter()
+
+
+def count_calls(cls: type, methods: list) -> None:
+    for name in methods:
+        original = getattr(cls, name)
+
+        def counted(self, *args, __original=original, __name=name, **kwargs):
+            calls[__name] += 1
+            return __original(self, *args, **kwargs)
+
+        setattr(cls, name, counted)
+
+
+_BOUNDARY = "benchboundary"
+_FORM = (
+    f"--{_BOUNDARY}\r\n"
+    'Content-Disposition: form-data; name="max_downloads"\r\n\r\n1\r\n'
+    f"--{_BOUNDARY}\r\n"
+    'Content-Disposition: form-data; name="expires_in_hours"\r\n\r\n1\r\n'
+    f"--{_BOUNDARY}\r\n"
+    'Content-Disposition: form-data; name="file"; filename="bench.txt"\r\n'
+    "Content-Type: text/plain\r\n\r\n"
+    + "x" * 1000 + "\r\n"
+    f"--{_BOUNDARY}--\r\n"
+).encode()
+
+ENDPOINTS = {
+    "POST /upload": dict(path="/upload", body={"filename": "bench.txt", "max_downloads": 1, "expires_in_hours": 1}),
+    "POST /upload-file": dict(path="/upload-file", body=_FORM,
+                              content_type=f"multipart/form-data; boundary={_BOUNDARY}"),
+}
+
+
+async def run(endpoint: dict, requests: int, per_request: bool) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        if per_request:
+            bootstrap.reset_resources()
+        status, body = await asgi_call(main.app, "POST", **endpoint)
+        assert status == 200, (status, body)
+    return (time.perf_counter() - started) / requests * 1000
+
+
+async def bench(args: argparse.Namespace) -> None:
+    count_calls(LocalS3Client, ["head_bucket", "put_bucket_lifecycle_configuration"])
+    count_calls(LocalDynamoClient, ["describe_table"])
+    add_latency(LocalS3Client, ["head_bucket"], args.latency_ms / 1000)
+    add_latency(LocalDynamoClient, ["describe_table"], args.latency_ms / 1000)
+
+    print(f"{args.requests} requests each, HeadBucket/DescribeTable at {args.latency_ms} ms")
+    print(f"{'':18} {'per request':>12} {'once':>10}")
+    checks = {}
+    for label, endpoint in ENDPOINTS.items():
+        row = []
+        for per_request in (True, False):
+            await asgi_call(main.app, "POST", **endpoint)
+            calls.clear()
+            row.append(await run(endpoint, args.requests, per_request))
+            checks[per_request] = checks.get(per_request, 0) + calls["head_bucket"] + calls["describe_table"]
+        print(f"{label:18} {row[0]:>9.2f} ms {row[1]:>7.2f} ms")
+    print(f"{'HeadBucket + DescribeTable calls':33} {checks[True]:>4} -> {checks[False]}")
+
+    settings = get_settings()
+    calls.clear()
+    for days in (7, 7, 7, 3, 3):
+        setup_s3_lifecycle_policy(settings.s3_bucket_name, settings.aws_region, expiration_days=days)
+    print(f"lifecycle: 5 startups, 2 configs -> {calls['put_bucket_lifecycle_configuration']} puts")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    asyncio.run(bench(parser.parse_args()))
@@ -0,0 +1,121 @@
+"""Stored size and compression speed for typical upload bodies.
+
+Each file goes through the same decision /upload-file makes: the ratio of
+a sample of the first chunk is measured, the body is stored raw if that
+exceeds COMPRESS_MAX_RATIO, and otherwise it is compressed chunk by chunk
+at COMPRESS_LEVEL. The corpora are:
+
+- python: the first 400 .py files of the running interpreter's stdlib
+- json:   generated JSON documents (seeded, ~1.9 MB)
+- random: incompressible bytes, standing in for PDFs, archives and media
+- files:  anything passed with --files (e.g. real PDFs)
+
+zstd is included when the optional zstandard package is installed.
+
+    cd backend && python bench/bench_compression.py [--files a.pdf b.pdf]
+"""
+
+import argparse
+import json
+import os
+import random
+import sysconfig
+import time
+from typing import Dict, List
+
+from _common import setup
+
+setup()
+
+from config import get_settings  # noqa: E402
+from content_encoding import available, measure_ratio, new_compressor  # noqa: E402
+
+
+def python_corpus(count: int = 400) -> List[bytes]:
+    stdlib = sysconfig.get_paths()["stdlib"]
+    paths = sorted(
+        os.path.join(root, name)
+        for root, dirs, names in os.walk(stdlib)
+        if "site-packages" not in root
+        for name in names
+        if name.endswith(".py")
+    )
+    bodies = []
+    for path in paths:
+        with open(path, "rb") as f:
+            bodies.append(f.read())
+        if len(bodies) == count:
+            break
+    return bodies
+
+
+def json_corpus(documents: int = 40) -> List[bytes]:
+    rng = random.Random(18)
+    words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel"]
+    return [
+        json.dumps([
+            {
+                "id": doc * 1000 + i,
+                "name": f"{rng.choice(words)}-{rng.randrange(10000)}",
+                "tags": rng.sample(words, 3),
+                "score": round(rng.random() * 100, 2),
+                "active": rng.random() < 0.5,
+            }
+            for i in range(300)
+        ], indent=2).encode()
+        for doc in range(documents)
+    ]
+
+
+def random_corpus() -> List[bytes]:
+    rng = random.Random(18)
+    return [rng.randbytes(256 * 1024) for _ in range(4)]
+
+
+def store(body: bytes, encoding: str, level: int, max_ratio: float, chunk_size: int) -> int:
+    """Bytes that would be stored for `body`."""
+    if measure_ratio(body[:chunk_size], encoding, level) > max_ratio:
+        return len(body)
+    compressor = new_compressor(encoding, level)
+    stored = 0
+    for offset in range(0, len(body), chunk_size):
+        stored += len(compressor.compress(body[offset:offset + chunk_size]))
+    return stored + len(compressor.flush())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", nargs="*", default=[])
+    args = parser.parse_args()
+
+    settings = get_settings()
+    corpora: Dict[str, List[bytes]] = {
+        "python": python_corpus(),
+        "json": json_corpus(),
+        "random": random_corpus(),
+    }
+    if args.files:
+        corpora["files"] = []
+        for path in args.files:
+            with open(path, "rb") as f:
+                corpora["files"].append(f.read())
+
+    print(f"COMPRESS_LEVEL={settings.compress_level}, COMPRESS_MAX_RATIO={settings.compress_max_ratio}")
+    print(f"{'corpus':8} {'files':>5} {'MB':>6}  {'encoding':8} {'stored':>6} {'gated':>5} {'MB/s':>6}")
+    for encoding in [e for e in ("gzip", "zstd") if available(e)]:
+        for name, bodies in corpora.items():
+            original = sum(len(b) for b in bodies)
+            started = time.perf_counter()
+            stored = [
+                store(b, encoding, settings.compress_level, settings.compress_max_ratio,
+                      settings.upload_chunk_size_bytes)
+                for b in bodies
+            ]
+            elapsed = time.perf_counter() - started
+            gated = sum(1 for b, s in zip(bodies, stored) if s == len(b))
+            print(f"{name:8} {len(bodies):>5} {original / 1e6:>6.2f}  {encoding:8} "
+                  f"{sum(stored) / original:>6.2f} {gated:>5} {original / 1e6 / elapsed:>6.0f}")
+
+
+if __name__ == "__main__":
+    main()
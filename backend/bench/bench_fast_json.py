@@ -0,0 +1,104 @@
+"""CPU per request for the hot endpoints with FAST_JSON off and on.
+
+Calls GET /file-info, POST /upload and GET /download in process through
+the ASGI app on the memory backend, so the numbers are framework and
+serialization cost, not network. Settings are read at import, so each mode
+runs in its own interpreter, alternating for --repeat rounds. CPU time is
+noisy on a shared machine, so the fastest batch is reported next to the
+median, together with the Python function calls per request (from
+cProfile), which do not vary between runs. Each run also hashes the
+OpenAPI document, which must not change with the flag.
+
+    cd backend && python bench/bench_fast_json.py [--requests 3000] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import cProfile
+import hashlib
+import json
+import os
+import pstats
+import statistics
+import subprocess
+import sys
+import time
+
+from _common import asgi_call, setup
+
+UPLOAD = {"filename": "bench.txt", "max_downloads": 5, "expires_in_hours": 1}
+
+
+def child(requests: int) -> None:
+    """Runs in a fresh interpreter with FAST_JSON set; prints one JSON line."""
+    setup()
+    import main
+
+    async def measure(method: str, path: str, **kwargs) -> dict:
+        for _ in range(200):
+            await asgi_call(main.app, method, path, **kwargs)
+        batch = max(1, requests // 10)
+        batches = []
+        for _ in range(10):
+            started = time.process_time()
+            for _ in range(batch):
+                status, _ = await asgi_call(main.app, method, path, **kwargs)
+            batches.append((time.process_time() - started) / batch * 1e6)
+        assert status == 200, status
+        profile = cProfile.Profile()
+        profile.enable()
+        for _ in range(100):
+            await asgi_call(main.app, method, path, **kwargs)
+        profile.disable()
+        return {
+            "min": min(batches),
+            "median": statistics.median(batches),
+            "calls": pstats.Stats(profile).total_calls / 100,
+        }
+
+    async def run() -> dict:
+        _, body = await asgi_call(main.app, "POST", "/upload", body=UPLOAD)
+        query = "file_id=" + json.loads(body)["file_id"]
+        return {
+            "GET /file-info": await measure("GET", "/file-info", query=query),
+            "POST /upload": await measure("POST", "/upload", body=UPLOAD),
+            # After the first five this answers maxed, which takes the same response path
+            "GET /download": await measure("GET", "/download", query=query),
+        }
+
+    results = asyncio.run(run())
+    results["openapi"] = hashlib.sha256(json.dumps(main.app.openapi(), sort_keys=True).encode()).hexdigest()
+    print(json.dumps(results))
+
+
+def report() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.requests)
+        return
+
+    modes = {"false": [], "true": []}
+    for _ in range(args.repeat):
+        for flag in modes:
+            modes[flag].append(json.loads(subprocess.run(
+                [sys.executable, __file__, "--child", "--requests", str(args.requests)],
+                env=dict(os.environ, FAST_JSON=flag), capture_output=True, text=True, check=True,
+            ).stdout.splitlines()[-1]))
+
+    print(f"{'':16} {'FAST_JSON':>9} {'min us':>7} {'median us':>9} {'calls/req':>9}")
+    for endpoint in ("GET /file-info", "POST /upload", "GET /download"):
+        for flag, runs in modes.items():
+            fastest = min(run[endpoint]["min"] for run in runs)
+            median = statistics.median(run[endpoint]["median"] for run in runs)
+            calls = runs[0][endpoint]["calls"]
+            print(f"{endpoint if flag == 'false' else '':16} {flag:>9} {fastest:>7.0f} {median:>9.0f} {calls:>9.0f}")
+    hashes = {run["openapi"] for runs in modes.values() for run in runs}
+    print("OpenAPI document identical in both modes:", "yes" if len(hashes) == 1 else "NO")
+
+
+if __name__ == "__main__":
+    report()
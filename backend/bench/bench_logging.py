@@ -0,0 +1,80 @@
+"""Log volume and CPU per request at each LOG_LEVEL.
+
+Runs an upload / file-info / download cycle through the ASGI app on the
+memory backend, with log output going to a counting sink rather than a
+terminal. At INFO a request should cost one summary line. DEBUG shows the
+per-step lines, which print() used to write on every request.
+
+    cd backend && python bench/bench_logging.py [--cycles 1000]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from _common import asgi_call, setup
+
+setup()
+
+import main  # noqa: E402
+from logs import configure_logging  # noqa: E402
+
+REQUESTS_PER_CYCLE = 3
+
+
+class CountingSink:
+    def __init__(self):
+        self.lines = 0
+        self.bytes = 0
+
+    def write(self, text: str) -> int:
+        self.lines += text.count("\n")
+        self.bytes += len(text)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+async def cycle() -> None:
+    _, body = await asgi_call(main.app, "POST", "/upload", body={
+        "filename": "bench.txt", "max_downloads": 1, "expires_in_hours": 1,
+    })
+    query = "file_id=" + json.loads(body)["file_id"]
+    await asgi_call(main.app, "GET", "/file-info", query)
+    await asgi_call(main.app, "GET", "/download", query)
+
+
+async def run(level: str, cycles: int) -> tuple:
+    sink = CountingSink()
+    stdout, sys.stdout = sys.stdout, sink
+    try:
+        configure_logging(level)
+        for _ in range(20):
+            await cycle()
+        sink.lines = sink.bytes = 0
+        started = time.process_time()
+        for _ in range(cycles):
+            await cycle()
+        cpu = time.process_time() - started
+    finally:
+        sys.stdout = stdout
+    requests = cycles * REQUESTS_PER_CYCLE
+    return sink.lines / requests, sink.bytes / requests, cpu / requests * 1e6
+
+
+def report() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'LOG_LEVEL':>9}  {'lines/req':>9}  {'bytes/req':>9}  {'CPU us/req':>10}")
+    for level in ("WARNING", "INFO", "DEBUG"):
+        lines, size, cpu = asyncio.run(run(level, args.cycles))
+        print(f"{level:>9}  {lines:>9.2f}  {size:>9.0f}  {cpu:>10.0f}")
+
+
+if __name__ == "__main__":
+    report()
@@ -0,0 +1,103 @@
+"""What the metrics instrumentation costs.
+
+First the registry primitives on their own: a histogram observation
+(bisect plus a locked increment) and a counter increment. Then the CPU per
+request of a file-info/download cycle through the ASGI app on the memory
+backend, with METRICS_ENABLED off, on, and on with CloudWatch EMF lines.
+Settings are read at import, so each mode runs in its own interpreter;
+the median of --repeat runs is reported.
+
+    cd backend && python bench/bench_metrics.py [--cycles 2000] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+from _common import asgi_call, setup
+
+MODES = {
+    "METRICS_ENABLED=false": {"METRICS_ENABLED": "false"},
+    "METRICS_ENABLED=true": {"METRICS_ENABLED": "true"},
+    "METRICS_ENABLED=true, EMF": {"METRICS_ENABLED": "true", "METRICS_EMF": "true"},
+}
+
+
+def primitives() -> None:
+    setup()
+    from metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    number = 200000
+    observe = min(timeit.repeat(
+        lambda: registry.observe("bench_seconds", 0.0123, route="/download", stage="claim"),
+        number=number, repeat=3,
+    )) / number
+    inc = min(timeit.repeat(
+        lambda: registry.inc("bench_total", endpoint="download", status="ok"),
+        number=number, repeat=3,
+    )) / number
+    print(f"registry.observe  {observe * 1e9:6.0f} ns")
+    print(f"registry.inc      {inc * 1e9:6.0f} ns")
+
+
+def child(cycles: int) -> None:
+    """Runs in a fresh interpreter with the mode's env; prints CPU us/request."""
+    setup()
+    import main
+
+    async def run() -> float:
+        _, body = await asgi_call(main.app, "POST", "/upload", body={
+            "filename": "bench.txt", "max_downloads": 5, "expires_in_hours": 1,
+        })
+        query = "file_id=" + json.loads(body)["file_id"]
+        for _ in range(200):
+            await asgi_call(main.app, "GET", "/file-info", query)
+        started = time.process_time()
+        for _ in range(cycles):
+            await asgi_call(main.app, "GET", "/file-info", query)
+            await asgi_call(main.app, "GET", "/download", "file_id=missing")
+        return (time.process_time() - started) / (cycles * 2) * 1e6
+
+    # EMF lines go to stdout; keep them out of the result line
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        cpu_us = asyncio.run(run())
+    finally:
+        sys.stdout = stdout
+    print(cpu_us)
+
+
+def report() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.cycles)
+        return
+
+    primitives()
+    baseline = None
+    for label, env in MODES.items():
+        runs = [
+            float(subprocess.run(
+                [sys.executable, __file__, "--child", "--cycles", str(args.cycles)],
+                env=dict(os.environ, **env), capture_output=True, text=True, check=True,
+            ).stdout.split()[-1])
+            for _ in range(args.repeat)
+        ]
+        cpu_us = statistics.median(runs)
+        baseline = baseline or cpu_us
+        print(f"{label:27} {cpu_us:6.0f} us CPU/request  ({(cpu_us / baseline - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    report()
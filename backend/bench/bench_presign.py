@@ -0,0 +1,101 @@
+"""Cost of presigning a download URL: botocore, local SigV4, and the URL cache.
+
+Uses the aws backend with dummy credentials; presigning makes no network
+calls. Before timing anything it checks that the local signer produces the
+same URL as botocore's s3v4 presigner for virtual-hosted, path-style and
+custom-endpoint addressing. The botocore timing goes through the pooled
+client, as create_presigned_download_url does without FAST_PRESIGN.
+
+    cd backend && python bench/bench_presign.py [--number 20000]
+"""
+
+import argparse
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from _common import setup
+
+setup(
+    STORAGE_BACKEND="aws",
+    AWS_ACCESS_KEY_ID="AKIDBENCHMARK",
+    AWS_SECRET_ACCESS_KEY="bench-secret",
+    AWS_SESSION_TOKEN="bench/session+token=",
+)
+
+import boto3  # noqa: E402
+from botocore.config import Config  # noqa: E402
+
+from presign import presign_s3_url  # noqa: E402
+from s3_utils import create_presigned_download_url  # noqa: E402
+
+BUCKET = "bench-bucket"
+KEY = "uploads/5f0c/report (final)+ü.pdf"
+
+
+def _same_url(a: str, b: str) -> bool:
+    ua, ub = urlsplit(a), urlsplit(b)
+    return (ua.netloc, ua.path, parse_qs(ua.query)) == (ub.netloc, ub.path, parse_qs(ub.query))
+
+
+def check_parity() -> None:
+    cases = [
+        ("eu-west-1", None, False),
+        ("us-east-1", None, True),
+        ("eu-west-1", "http://localhost:4566", True),
+    ]
+    for region, endpoint_url, path_style in cases:
+        s3 = boto3.client(
+            "s3",
+            region_name=region,
+            endpoint_url=endpoint_url,
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path" if path_style else "virtual"}),
+        )
+        for _ in range(3):
+            # Both sides stamp the current second; retry if it ticked over in between
+            expected = s3.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": BUCKET, "Key": KEY, "ResponseContentDisposition": "attachment"},
+                ExpiresIn=300,
+            )
+            actual = presign_s3_url(
+                "GET", BUCKET, KEY, 300, region,
+                endpoint_url=endpoint_url,
+                force_path_style=path_style,
+                query_params={"response-content-disposition": "attachment"},
+            )
+            if _same_url(expected, actual):
+                break
+        else:
+            raise SystemExit(f"local presign differs from botocore ({region}, {endpoint_url}, path={path_style})")
+    print(f"parity with botocore: ok ({len(cases)} addressing modes)")
+
+
+def per_call_us(number: int, **kwargs) -> float:
+    started = time.perf_counter()
+    for i in range(number):
+        create_presigned_download_url(
+            bucket=BUCKET,
+            key=KEY if kwargs.get("cache_fraction") else f"{KEY}.{i}",
+            expires_in_seconds=300,
+            region_name="eu-west-1",
+            **kwargs,
+        )
+    return (time.perf_counter() - started) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    check_parity()
+    botocore_us = per_call_us(args.number // 10)
+    local_us = per_call_us(args.number, fast_presign=True)
+    cached_us = per_call_us(args.number, fast_presign=True, cache_fraction=0.5)
+    print(f"botocore generate_presigned_url  {botocore_us:8.1f} us/url")
+    print(f"local SigV4 (FAST_PRESIGN)       {local_us:8.1f} us/url  ({botocore_us / local_us:.0f}x)")
+    print(f"cached URL (PRESIGN_CACHE_FRACTION=0.5) {cached_us:6.2f} us/url")
+
+
+if __name__ == "__main__":
+    main()
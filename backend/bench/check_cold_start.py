@@ -0,0 +1,57 @@
+"""Fail if the Lambda init path loads the web stack.
+
+lambda_handler defers FastAPI, the routes and Mangum to the first HTTP
+request, so warm-up pings and scheduled sweeps stay cheap. A module-level
+import in any of its dependencies can quietly undo that. This check imports
+the entry module, and the modules the sweep branches import, each in a fresh
+interpreter with the aws backend. It exits 1 if any of them loads one of the
+modules below.
+
+    cd backend && python bench/check_cold_start.py
+"""
+
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORBIDDEN = ("fastapi", "starlette", "pydantic", "mangum")
+ENTRY_MODULES = ("lambda_handler", "deletion_queue", "reconcile")
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = sorted(n for n in {forbidden!r} if n in sys.modules)
+print("%.3f %s" % (elapsed, ",".join(loaded)))
+"""
+
+
+def probe(module: str):
+    """Import module in a new interpreter; returns (seconds, forbidden modules loaded)."""
+    env = dict(os.environ, STORAGE_BACKEND="aws")
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, forbidden=FORBIDDEN)],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip().splitlines()[-1]
+    seconds, _, loaded = out.partition(" ")
+    return float(seconds), [name for name in loaded.split(",") if name]
+
+
+def main() -> int:
+    failed = False
+    for module in ENTRY_MODULES:
+        seconds, loaded = probe(module)
+        status = "FAIL" if loaded else "ok"
+        print(f"{status:4}  import {module:15} {seconds * 1000:7.1f} ms  {', '.join(loaded)}")
+        failed = failed or bool(loaded)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""One-time creation of the LocalStack bucket and table.
+
+With LOCALSTACK_AUTOCREATE on, the upload endpoints need the S3 bucket and
+DynamoDB table to exist. Checking on every request costs a head_bucket and
+a describe_table round-trip, so the check runs once per process behind a
+lock and a readiness flag. A failed attempt leaves the flag unset and the
+next request tries again.
+"""
+
+import threading
+from typing import Optional
+
+from config import Settings, get_settings
+from db_utils import ensure_table_exists
+from logs import get_logger
+from s3_utils import ensure_bucket_exists
+
+
+logger = get_logger("bootstrap")
+
+_lock = threading.Lock()
+_ready = False
+
+
+def resources_ready() -> bool:
+    return _ready
+
+
+def ensure_resources(settings: Optional[Settings] = None) -> None:
+    """Create the bucket and table if needed; a no-op after the first success."""
+    global _ready
+    if _ready:
+        return
+    if settings is None:
+        settings = get_settings()
+    with _lock:
+        if _ready:
+            return
+        if settings.use_localstack and settings.auto_create_localstack_resources:
+            logger.debug("Creating LocalStack resources")
+            ensure_bucket_exists(
+                bucket=settings.s3_bucket_name,
+                region_name=settings.aws_region,
+                endpoint_url=settings.localstack_endpoint_url,
+                force_path_style=settings.s3_force_path_style,
+            )
+            ensure_table_exists(
+                table_name=settings.ddb_table_name,
+                region_name=settings.aws_region,
+                endpoint_url=settings.localstack_endpoint_url,
+            )
+        _ready = True
+
+
+def reset_resources() -> None:
+    """Forget that resources were created (tests, or after recreating them)."""
+    global _ready
+    with _lock:
+        _ready = False
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -30,6 +30,47 @@ class Settings:
     localstack_endpoint_url: str
     s3_force_path_style: bool
     auto_create_localstack_resources: bool
+    storage_backend: str
+    local_storage_path: str
+    local_storage_url: str
+    local_storage_secret: str
+    aws_max_pool_connections: int
+    aws_tcp_keepalive: bool
+    aws_max_attempts: int
+    aws_retry_mode: str
+    max_file_size_bytes: int
+    upload_chunk_size_bytes: int
+    zip_range_size_bytes: int
+    file_retention_days: int
+    expiry_tiers_days: List[int]
+    content_dedup: bool
+    compress_content_types: Dict[str, str]
+    compress_level: int
+    compress_max_ratio: float
+    fast_presign: bool
+    presign_cache_fraction: float
+    metadata_cache_max_entries: int
+    metadata_cache_max_bytes: int
+    metadata_cache_ttl_seconds: int
+    metadata_cache_downloads_ttl_seconds: int
+    file_info_max_age_seconds: int
+    rate_limit_uploads: int
+    rate_limit_window_seconds: int
+    rate_limit_max_keys: int
+    rate_limit_backend: str
+    rate_limit_table_name: str
+    rate_limit_sync_seconds: float
+    delete_delay_seconds: int
+    deletion_workers: int
+    deletion_max_attempts: int
+    reconcile_workers: int
+    lambda_prewarm_clients: bool
+    log_level: str
+    log_debug_sample_rate: float
+    metrics_enabled: bool
+    metrics_emf: str
+    metrics_namespace: str
+    fast_json: bool
 
 
 def get_settings() -> Settings:
@@ -44,8 +85,59 @@ def get_settings() -> Settings:
     localstack_endpoint_url = os.getenv("LOCALSTACK_ENDPOINT", "http://localhost:4566")
     s3_force_path_style = os.getenv("AWS_S3_FORCE_PATH_STYLE", "true" if use_localstack else "false").lower() in {"1", "true", "yes"}
     auto_create_localstack_resources = os.getenv("LOCALSTACK_AUTOCREATE", "true").lower() in {"1", "true", "yes"}
+    storage_backend = os.getenv("STORAGE_BACKEND", "aws").lower()
+    local_storage_path = os.getenv("LOCAL_STORAGE_PATH", ".local-storage")
+    local_storage_url = os.getenv("LOCAL_STORAGE_URL", "http://localhost:8000")
+    local_storage_secret = os.getenv("LOCAL_STORAGE_SECRET", "")
+    aws_max_pool_connections = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+    aws_tcp_keepalive = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() in {"1", "true", "yes"}
+    aws_max_attempts = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
+    aws_retry_mode = os.getenv("AWS_RETRY_MODE", "standard")
+    max_file_size_bytes = int(os.getenv("MAX_FILE_SIZE_MB", "5")) * 1024 * 1024
+    upload_chunk_size_bytes = int(os.getenv("UPLOAD_CHUNK_SIZE_MB", "8")) * 1024 * 1024
+    zip_range_size_bytes = int(os.getenv("ZIP_RANGE_SIZE_MB", "8")) * 1024 * 1024
+    file_retention_days = int(os.getenv("FILE_RETENTION_DAYS", "7"))
+    expiry_tiers_env = os.getenv("EXPIRY_TIERS_DAYS", "1,3,7")
+    content_dedup = os.getenv("CONTENT_DEDUP", "true").lower() in {"1", "true", "yes"}
+    compress_content_types_env = os.getenv(
+        "COMPRESS_CONTENT_TYPES",
+        "text/=gzip,application/json=gzip,application/xml=gzip,image/svg+xml=gzip,application/msword=gzip",
+    )
+    compress_level = int(os.getenv("COMPRESS_LEVEL", "6"))
+    compress_max_ratio = float(os.getenv("COMPRESS_MAX_RATIO", "0.9"))
+    # Local SigV4 signing only makes sense against real S3 (or LocalStack)
+    fast_presign = storage_backend == "aws" and os.getenv("FAST_PRESIGN", "true").lower() in {"1", "true", "yes"}
+    presign_cache_fraction = min(max(float(os.getenv("PRESIGN_CACHE_FRACTION", "0.25")), 0.0), 0.9)
+    metadata_cache_max_entries = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "10000"))
+    metadata_cache_max_bytes = int(os.getenv("METADATA_CACHE_MAX_MB", "16")) * 1024 * 1024
+    metadata_cache_ttl_seconds = int(os.getenv("METADATA_CACHE_TTL_SECONDS", "300"))
+    metadata_cache_downloads_ttl_seconds = int(os.getenv("METADATA_CACHE_DOWNLOADS_TTL_SECONDS", "2"))
+    file_info_max_age_seconds = int(os.getenv("FILE_INFO_MAX_AGE_SECONDS", "5"))
+    rate_limit_uploads = int(os.getenv("MAX_UPLOADS_PER_HOUR", "10"))
+    rate_limit_window_seconds = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "3600"))
+    rate_limit_max_keys = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    rate_limit_backend = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    rate_limit_table_name = os.getenv("RATE_LIMIT_TABLE_NAME", "")
+    rate_limit_sync_seconds = float(os.getenv("RATE_LIMIT_SYNC_SECONDS", "5"))
+    delete_delay_seconds = int(os.getenv("DELETE_DELAY_SECONDS", "10"))
+    deletion_workers = int(os.getenv("DELETION_WORKERS", "2"))
+    deletion_max_attempts = int(os.getenv("DELETION_MAX_ATTEMPTS", "5"))
+    reconcile_workers = max(1, int(os.getenv("RECONCILE_WORKERS", "8")))
+    lambda_prewarm_clients = os.getenv("LAMBDA_PREWARM_CLIENTS", "true").lower() in {"1", "true", "yes"}
+    log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+    log_debug_sample_rate = min(max(float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0")), 0.0), 1.0)
+    metrics_enabled = os.getenv("METRICS_ENABLED", "true").lower() in {"1", "true", "yes"}
+    metrics_emf = os.getenv("METRICS_EMF", "auto").lower()
+    metrics_namespace = os.getenv("METRICS_NAMESPACE", "FileSharing")
+    fast_json = os.getenv("FAST_JSON", "false").lower() in {"1", "true", "yes"}
 
     cors_origins = [o.strip() for o in cors_origins_env.split(",") if o.strip()]
+    expiry_tiers_days = sorted({int(d) for d in expiry_tiers_env.split(",") if d.strip()})
+    compress_content_types = {}
+    for rule in compress_content_types_env.split(","):
+        prefix, _, encoding = rule.strip().partition("=")
+        if prefix and encoding:
+            compress_content_types[prefix] = encoding.lower()
     settings = Settings(
         aws_region=aws_region,
         s3_bucket_name=s3_bucket_name,
@@ -58,6 +150,47 @@ def get_settings() -> Settings:
         localstack_endpoint_url=localstack_endpoint_url,
         s3_force_path_style=s3_force_path_style,
         auto_create_localstack_resources=auto_create_localstack_resources,
+        storage_backend=storage_backend,
+        local_storage_path=local_storage_path,
+        local_storage_url=local_storage_url,
+        local_storage_secret=local_storage_secret,
+        aws_max_pool_connections=aws_max_pool_connections,
+        aws_tcp_keepalive=aws_tcp_keepalive,
+        aws_max_attempts=aws_max_attempts,
+        aws_retry_mode=aws_retry_mode,
+        max_file_size_bytes=max_file_size_bytes,
+        upload_chunk_size_bytes=upload_chunk_size_bytes,
+        zip_range_size_bytes=zip_range_size_bytes,
+        file_retention_days=file_retention_days,
+        expiry_tiers_days=expiry_tiers_days,
+        content_dedup=content_dedup,
+        compress_content_types=compress_content_types,
+        compress_level=compress_level,
+        compress_max_ratio=compress_max_ratio,
+        fast_presign=fast_presign,
+        presign_cache_fraction=presign_cache_fraction,
+        metadata_cache_max_entries=metadata_cache_max_entries,
+        metadata_cache_max_bytes=metadata_cache_max_bytes,
+        metadata_cache_ttl_seconds=metadata_cache_ttl_seconds,
+        metadata_cache_downloads_ttl_seconds=metadata_cache_downloads_ttl_seconds,
+        file_info_max_age_seconds=file_info_max_age_seconds,
+        rate_limit_uploads=rate_limit_uploads,
+        rate_limit_window_seconds=rate_limit_window_seconds,
+        rate_limit_max_keys=rate_limit_max_keys,
+        rate_limit_backend=rate_limit_backend,
+        rate_limit_table_name=rate_limit_table_name,
+        rate_limit_sync_seconds=rate_limit_sync_seconds,
+        delete_delay_seconds=delete_delay_seconds,
+        deletion_workers=deletion_workers,
+        deletion_max_attempts=deletion_max_attempts,
+        reconcile_workers=reconcile_workers,
+        lambda_prewarm_clients=lambda_prewarm_clients,
+        log_level=log_level,
+        log_debug_sample_rate=log_debug_sample_rate,
+        metrics_enabled=metrics_enabled,
+        metrics_emf=metrics_emf,
+        metrics_namespace=metrics_namespace,
+        fast_json=fast_json,
     )
 
     # In LocalStack mode, ensure dummy creds exist so presigning works
@@ -0,0 +1,93 @@
+"""Streaming gzip/zstd codecs for objects stored with a Content-Encoding.
+
+gzip uses the standard library. zstd needs the optional `zstandard`
+package; without it, zstd rules are ignored and bodies are stored raw.
+"""
+
+import zlib
+from typing import Dict, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+# Measure the ratio on at most this much of the first chunk
+SAMPLE_SIZE = 1024 * 1024
+
+
+def available(encoding: str) -> bool:
+    return encoding == "gzip" or (encoding == "zstd" and zstandard is not None)
+
+
+def encoding_for(content_type: str, rules: Dict[str, str]) -> Optional[str]:
+    """Pick the encoding for a content type from {prefix: encoding} rules; longest prefix wins."""
+    best = None
+    for prefix, encoding in rules.items():
+        if content_type.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    if best is None or not available(rules[best]):
+        return None
+    return rules[best]
+
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        # wbits=31 writes a gzip header and trailer
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._z.compress(data)
+
+    def flush(self) -> bytes:
+        return self._z.flush()
+
+
+class _ZstdCompressor:
+    def __init__(self, level: int):
+        self._z = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._z.compress(data)
+
+    def flush(self) -> bytes:
+        return self._z.flush()
+
+
+def new_compressor(encoding: str, level: int):
+    """Return an object with compress(data) -> bytes and flush() -> bytes."""
+    if encoding == "zstd":
+        return _ZstdCompressor(level)
+    return _GzipCompressor(level)
+
+
+def measure_ratio(data: bytes, encoding: str, level: int) -> float:
+    """Compressed size / original size for a sample of `data`."""
+    sample = data[:SAMPLE_SIZE]
+    if not sample:
+        return 1.0
+    compressor = new_compressor(encoding, level)
+    return len(compressor.compress(sample) + compressor.flush()) / len(sample)
+
+
+def decode_chunks(chunks: Iterator[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Undo a stored Content-Encoding on a stream of chunks."""
+    if not encoding:
+        yield from chunks
+        return
+    if encoding == "zstd":
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        for chunk in chunks:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+        return
+    decompressor = zlib.decompressobj(31)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    data = decompressor.flush()
+    if data:
+        yield data
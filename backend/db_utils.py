@@ -1,17 +1,38 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import boto3
+from boto3.dynamodb.types import TypeDeserializer
 from botocore.exceptions import ClientError
 
+from aws_clients import get_client, get_resource
+from expiry import lifecycle_expiry_epoch
+from logs import get_logger
+from metadata_cache import get_metadata_cache
+
+
+logger = get_logger("db")
+_deserializer = TypeDeserializer()
+
+
+# Rate limit counters and the content hash index share the metadata table;
+# their keys use these prefixes and are never served as file metadata.
+RATE_LIMIT_KEY_PREFIX = "ratelimit#"
+CONTENT_KEY_PREFIX = "sha256#"
+INTERNAL_KEY_PREFIXES = (RATE_LIMIT_KEY_PREFIX, CONTENT_KEY_PREFIX)
+
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_ATTEMPTS = 6
+
 
 def get_ddb_table(
     table_name: str,
     region_name: str,
     endpoint_url: Optional[str] = None,
 ):
-    resource = boto3.resource("dynamodb", region_name=region_name, endpoint_url=endpoint_url)
+    resource = get_resource("dynamodb", region_name=region_name, endpoint_url=endpoint_url)
     return resource.Table(table_name)
 
 
@@ -23,6 +44,7 @@ def put_file_metadata(
 ) -> None:
     table = get_ddb_table(table_name, region_name, endpoint_url)
     table.put_item(Item=item)
+    get_metadata_cache().put(table_name, item["file_id"], item)
 
 
 def get_file_metadata(
@@ -30,23 +52,110 @@ def get_file_metadata(
     region_name: str,
     file_id: str,
     endpoint_url: Optional[str] = None,
+    immutable_only: bool = False,
 ) -> Optional[Dict[str, Any]]:
+    """
+    Read-through the metadata cache. With immutable_only, a cached item whose
+    `downloads` may be stale is still returned.
+    """
+    if file_id.startswith(INTERNAL_KEY_PREFIXES):
+        return None
+    cache = get_metadata_cache()
+    item = cache.get(table_name, file_id, immutable_only=immutable_only)
+    if item is not None:
+        return item
     table = get_ddb_table(table_name, region_name, endpoint_url)
     resp = table.get_item(Key={"file_id": file_id})
-    return resp.get("Item")
+    item = resp.get("Item")
+    if item is not None:
+        cache.put(table_name, file_id, item)
+    return item
+
+
+def batch_get_file_metadata(
+    table_name: str,
+    region_name: str,
+    file_ids: Iterable[str],
+    endpoint_url: Optional[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch several items at once, keyed by file_id; missing ids are left out.
+
+    Fresh cache entries are served directly; the rest are read with
+    BatchGetItem in chunks of 100 keys. UnprocessedKeys (throttling or the
+    16 MB response cap) are retried with exponential backoff, and any still
+    left after BATCH_GET_MAX_ATTEMPTS fall back to single reads.
+    """
+    cache = get_metadata_cache()
+    found: Dict[str, Dict[str, Any]] = {}
+    missing: List[str] = []
+    for file_id in dict.fromkeys(file_ids):
+        if file_id.startswith(INTERNAL_KEY_PREFIXES):
+            continue
+        item = cache.get(table_name, file_id)
+        if item is not None:
+            found[file_id] = item
+        else:
+            missing.append(file_id)
+
+    resource = get_resource("dynamodb", region_name=region_name, endpoint_url=endpoint_url)
+    for start in range(0, len(missing), BATCH_GET_MAX_KEYS):
+        request = {table_name: {"Keys": [{"file_id": f} for f in missing[start:start + BATCH_GET_MAX_KEYS]]}}
+        attempts = 0
+        while request:
+            if attempts == BATCH_GET_MAX_ATTEMPTS:
+                for key in request[table_name]["Keys"]:
+                    item = get_file_metadata(table_name, region_name, key["file_id"], endpoint_url)
+                    if item is not None:
+                        found[key["file_id"]] = item
+                break
+            if attempts:
+                time.sleep(min(0.05 * 2 ** attempts, 1.0))
+            resp = resource.batch_get_item(RequestItems=request)
+            for item in resp.get("Responses", {}).get(table_name, []):
+                found[item["file_id"]] = item
+                cache.put(table_name, item["file_id"], item)
+            request = resp.get("UnprocessedKeys") or None
+            attempts += 1
+    return found
 
 
-def try_increment_downloads(
+def claim_download(
     table_name: str,
     region_name: str,
     file_id: str,
     now_epoch: int,
     endpoint_url: Optional[str] = None,
-) -> Optional[int]:
+) -> Tuple[str, Optional[Dict[str, Any]]]:
     """
-    Increments downloads atomically only if below max_downloads and not expired.
-    Returns the new downloads count if successful, None otherwise.
+    Checks and consumes one download in a single conditional update.
+
+    Returns (status, item) where status is one of ok | maxed | expired |
+    not_found and item is the metadata after the update (ok) or as it was
+    when the condition failed. DynamoDB calls per outcome:
+
+    - ok: 1 (update_item with ReturnValues=ALL_NEW)
+    - maxed / expired: 1, or 0 when the cached item already shows it
+      (downloads only grow and expiry never moves, so that is safe)
+    - not_found: 1 (the failed condition returns no old item)
+
+    Objects removed after their last download are flagged with
+    object_deleted on the item. Uploads the server saw complete carry
+    object_present; for the others (presigned single PUTs) the caller
+    still has to check S3 once and then call mark_object_present.
     """
+    # file_status brings in pydantic; keep it off the Lambda init path
+    from file_status import evaluate_status, to_record
+
+    if file_id.startswith(INTERNAL_KEY_PREFIXES):
+        return "not_found", None
+    cached = get_metadata_cache().get(table_name, file_id, immutable_only=True)
+    if cached is not None:
+        status = evaluate_status(to_record(cached), now_epoch)
+        # A pending upload may have completed since, so only trust final states
+        if status in ("expired", "maxed"):
+            return status, cached
+
     table = get_ddb_table(table_name, region_name, endpoint_url)
     try:
         resp = table.update_item(
@@ -54,19 +163,373 @@ def try_increment_downloads(
             UpdateExpression="SET downloads = downloads + :inc",
             ConditionExpression=(
                 "downloads < max_downloads AND :now < expires_at_epoch"
+                " AND attribute_not_exists(object_deleted)"
+                " AND (attribute_not_exists(upload_status) OR upload_status = :complete)"
             ),
             ExpressionAttributeValues={
                 ":inc": 1,
                 ":now": now_epoch,
+                ":complete": "complete",
             },
+            ReturnValues="ALL_NEW",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        item = e.response.get("Item")
+        if not item:
+            return "not_found", None
+        # The resource layer does not deserialize items attached to errors
+        item = _deserialize_item(item)
+        get_metadata_cache().put(table_name, file_id, item)
+        status = evaluate_status(to_record(item), now_epoch)
+        # The condition failed, so whatever changed in between made it unavailable
+        return ("maxed" if status == "ok" else status), item
+
+    item = resp["Attributes"]
+    get_metadata_cache().put(table_name, file_id, item)
+    return "ok", item
+
+
+def item_s3_keys(item: Dict[str, Any]) -> List[str]:
+    """Return the S3 keys behind an item: one for a file, several for a bundle."""
+    if "files" in item:
+        return [f["s3_key"] for f in item["files"]]
+    return [item["s3_key"]] if item.get("s3_key") else []
+
+
+def _deserialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+
+def mark_object_present(
+    table_name: str,
+    region_name: str,
+    file_id: str,
+    endpoint_url: Optional[str] = None,
+) -> None:
+    """Record that the S3 object(s) behind an item were found, so later downloads skip the HEAD."""
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    try:
+        table.update_item(
+            Key={"file_id": file_id},
+            UpdateExpression="SET object_present = :true",
+            ConditionExpression="attribute_exists(file_id) AND attribute_not_exists(object_deleted)",
+            ExpressionAttributeValues={":true": True},
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        return
+    get_metadata_cache().update_fields(table_name, file_id, {"object_present": True})
+
+
+def release_download(
+    table_name: str,
+    region_name: str,
+    file_id: str,
+    endpoint_url: Optional[str] = None,
+) -> None:
+    """Give back a download claimed for an object that turned out not to exist."""
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    get_metadata_cache().invalidate(table_name, file_id)
+    try:
+        table.update_item(
+            Key={"file_id": file_id},
+            UpdateExpression="SET downloads = downloads - :one",
+            ConditionExpression="downloads > :zero",
+            ExpressionAttributeValues={":one": 1, ":zero": 0},
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+
+
+def mark_object_deleted(
+    table_name: str,
+    region_name: str,
+    file_id: str,
+    endpoint_url: Optional[str] = None,
+) -> None:
+    """Flag that the S3 object behind an item is gone."""
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    try:
+        table.update_item(
+            Key={"file_id": file_id},
+            UpdateExpression="SET object_deleted = :true REMOVE delete_after_epoch",
+            ConditionExpression="attribute_exists(file_id)",
+            ExpressionAttributeValues={":true": True},
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+    get_metadata_cache().update_fields(table_name, file_id, {"object_deleted": True})
+
+
+def schedule_object_deletion(
+    table_name: str,
+    region_name: str,
+    file_id: str,
+    delete_after_epoch: int,
+    endpoint_url: Optional[str] = None,
+) -> None:
+    """Persist that the item's S3 object should be deleted after the given time."""
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    table.update_item(
+        Key={"file_id": file_id},
+        UpdateExpression="SET delete_after_epoch = :due",
+        ConditionExpression="attribute_exists(file_id)",
+        ExpressionAttributeValues={":due": delete_after_epoch},
+    )
+
+
+def list_due_deletions(
+    table_name: str,
+    region_name: str,
+    now_epoch: int,
+    endpoint_url: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield {"file_id", "s3_key" or "files"} for scheduled deletions that are due."""
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    kwargs = {
+        "ProjectionExpression": "file_id, s3_key, #files",
+        "FilterExpression": "delete_after_epoch <= :now AND attribute_not_exists(object_deleted)",
+        "ExpressionAttributeNames": {"#files": "files"},
+        "ExpressionAttributeValues": {":now": now_epoch},
+    }
+    while True:
+        resp = table.scan(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def scan_items(
+    table_name: str,
+    region_name: str,
+    projection: str,
+    attribute_names: Optional[Dict[str, str]] = None,
+    endpoint_url: Optional[str] = None,
+    segment: int = 0,
+    total_segments: int = 1,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every item of the table (internal entries included), projected.
+    With total_segments > 1, only `segment` of a parallel scan.
+    """
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    kwargs: Dict[str, Any] = {"ProjectionExpression": projection}
+    if attribute_names:
+        kwargs["ExpressionAttributeNames"] = attribute_names
+    if total_segments > 1:
+        kwargs["Segment"] = segment
+        kwargs["TotalSegments"] = total_segments
+    while True:
+        resp = table.scan(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def delete_metadata_items(
+    table_name: str,
+    region_name: str,
+    file_ids: Iterable[str],
+    endpoint_url: Optional[str] = None,
+) -> int:
+    """Delete items in BatchWriteItem calls of 25; returns how many were sent."""
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    cache = get_metadata_cache()
+    count = 0
+    with table.batch_writer() as batch:
+        for file_id in file_ids:
+            batch.delete_item(Key={"file_id": file_id})
+            cache.invalidate(table_name, file_id)
+            count += 1
+    return count
+
+
+def delete_content_entry(
+    table_name: str,
+    region_name: str,
+    sha256: str,
+    s3_key: str,
+    endpoint_url: Optional[str] = None,
+) -> bool:
+    """Drop the index entry for `sha256` if it still points at `s3_key`."""
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    try:
+        table.delete_item(
+            Key={"file_id": f"{CONTENT_KEY_PREFIX}{sha256}"},
+            ConditionExpression="s3_key = :key",
+            ExpressionAttributeValues={":key": s3_key},
+        )
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def increment_rate_counter(
+    table_name: str,
+    region_name: str,
+    counter_key: str,
+    amount: int,
+    ttl_epoch: int,
+    endpoint_url: Optional[str] = None,
+) -> int:
+    """
+    Atomically adds `amount` to a rate limit counter and returns the new total.
+    Counter items expire through the table's TTL attribute.
+    """
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    resp = table.update_item(
+        Key={"file_id": f"{RATE_LIMIT_KEY_PREFIX}{counter_key}"},
+        UpdateExpression="ADD hits :n SET expires_at_epoch = :ttl",
+        ExpressionAttributeValues={":n": amount, ":ttl": ttl_epoch},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(resp["Attributes"]["hits"])
+
+
+def acquire_content_object(
+    table_name: str,
+    region_name: str,
+    sha256: str,
+    s3_key: str,
+    size: int,
+    keep_until_epoch: int,
+    lifetime_seconds: int,
+    now_epoch: int,
+    endpoint_url: Optional[str] = None,
+) -> Tuple[str, bool]:
+    """
+    Take a reference on the object holding content `sha256`.
+
+    Returns (key, reused). If an indexed object is live and the bucket's
+    lifecycle rules will not expire it before `keep_until_epoch`, its
+    reference count is incremented and its key is returned with
+    reused=True. Otherwise `s3_key` is registered as the new object for
+    this content with one reference, and the caller must make sure the
+    bytes are stored there with a lifecycle lifetime of `lifetime_seconds`.
+
+    Index entries carry expires_at_epoch, so the table's TTL reaps them a
+    day after their object is gone.
+    """
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    index_key = {"file_id": f"{CONTENT_KEY_PREFIX}{sha256}"}
+    # A few minutes cover clock skew between us and S3
+    needed = keep_until_epoch + 300
+    # Same-tier uploads later that UTC day still fit before the rounded expiry
+    object_expires_epoch = lifecycle_expiry_epoch(now_epoch, lifetime_seconds)
+    for _ in range(2):
+        try:
+            resp = table.update_item(
+                Key=index_key,
+                UpdateExpression="ADD refs :one",
+                ConditionExpression="refs > :zero AND object_expires_epoch > :needed",
+                ExpressionAttributeValues={":one": 1, ":zero": 0, ":needed": needed},
+                ReturnValues="ALL_NEW",
+            )
+            return resp["Attributes"]["s3_key"], True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+        try:
+            table.put_item(
+                Item={
+                    **index_key,
+                    "s3_key": s3_key,
+                    "refs": 1,
+                    "size": size,
+                    "created_epoch": now_epoch,
+                    "object_expires_epoch": object_expires_epoch,
+                    "expires_at_epoch": object_expires_epoch + 86400,
+                },
+                # Entries written before expiry tiers have no object_expires_epoch
+                ConditionExpression=(
+                    "attribute_not_exists(file_id) OR refs <= :zero OR NOT object_expires_epoch > :needed"
+                ),
+                ExpressionAttributeValues={":zero": 0, ":needed": needed},
+            )
+            return s3_key, False
+        except ClientError as e:
+            # Someone registered the same content concurrently; reuse theirs
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+    return s3_key, False
+
+
+def release_content_object(
+    table_name: str,
+    region_name: str,
+    sha256: str,
+    s3_key: str,
+    endpoint_url: Optional[str] = None,
+) -> Optional[int]:
+    """
+    Drop one reference on the object holding content `sha256`.
+
+    Returns the remaining count; the object may be deleted once it is 0.
+    Returns None if the index has since moved to a newer object, in which
+    case `s3_key` may still be shared and is left to the lifecycle rule.
+    """
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    try:
+        resp = table.update_item(
+            Key={"file_id": f"{CONTENT_KEY_PREFIX}{sha256}"},
+            UpdateExpression="ADD refs :minus_one",
+            ConditionExpression="s3_key = :key AND refs > :zero",
+            ExpressionAttributeValues={":minus_one": -1, ":key": s3_key, ":zero": 0},
             ReturnValues="UPDATED_NEW",
         )
-        return int(resp["Attributes"]["downloads"])
     except ClientError as e:
-        # ConditionalCheckFailedException -> cannot increment
         if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
             return None
         raise
+    return int(resp["Attributes"]["refs"])
+
+
+def mark_upload_finished(
+    table_name: str,
+    region_name: str,
+    file_id: str,
+    upload_id: str,
+    upload_status: str,
+    endpoint_url: Optional[str] = None,
+) -> bool:
+    """
+    Moves a pending multipart upload to `upload_status` ("complete" or "aborted").
+    A completed upload is also flagged object_present. Returns False if the
+    item is missing or not pending under `upload_id`.
+    """
+    table = get_ddb_table(table_name, region_name, endpoint_url)
+    get_metadata_cache().invalidate(table_name, file_id)
+    values = {
+        ":status": upload_status,
+        ":uid": upload_id,
+        ":pending": "pending",
+    }
+    update = "SET upload_status = :status"
+    if upload_status == "complete":
+        update += ", object_present = :true"
+        values[":true"] = True
+    try:
+        table.update_item(
+            Key={"file_id": file_id},
+            UpdateExpression=update + " REMOVE upload_id",
+            ConditionExpression="upload_id = :uid AND upload_status = :pending",
+            ExpressionAttributeValues=values,
+        )
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return False
+        raise
 
 
 def ensure_table_exists(
@@ -75,7 +538,7 @@ def ensure_table_exists(
     endpoint_url: Optional[str] = None,
 ) -> None:
     """Create DynamoDB table in LocalStack if missing."""
-    ddb = boto3.client("dynamodb", region_name=region_name, endpoint_url=endpoint_url)
+    ddb = get_client("dynamodb", region_name=region_name, endpoint_url=endpoint_url)
     try:
         ddb.describe_table(TableName=table_name)
         return
@@ -91,17 +554,17 @@ def ensure_table_exists(
     waiter = ddb.get_waiter("table_exists")
     waiter.wait(TableName=table_name)
     
-    # Enable TTL on expires_at field (for production use)
+    # Reap expired items (file metadata, rate limit counters, content index)
     try:
         ddb.update_time_to_live(
             TableName=table_name,
             TimeToLiveSpecification={
-                'AttributeName': 'expires_at',
+                'AttributeName': 'expires_at_epoch',
                 'Enabled': True
             }
         )
-        print(f"[OK] TTL enabled on {table_name}")
+        logger.info("TTL enabled on %s", table_name)
     except ClientError as e:
-        print(f"[WARNING] Could not enable TTL: {e}")  # LocalStack might not support TTL
+        logger.warning("Could not enable TTL: %s", e)  # LocalStack might not support TTL
 
 
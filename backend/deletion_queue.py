@@ -0,0 +1,279 @@
+"""Durable, batched deletion of S3 objects after their last download.
+
+Each deletion is first persisted on the metadata item (delete_after_epoch),
+then queued in memory. A single dispatcher thread hands due entries in
+batches of up to 1000 keys to a small worker pool that issues S3
+delete_objects calls and retries failures with backoff.
+
+If the process goes away before the queue drains (e.g. a frozen Lambda
+container), sweep_pending_deletions() finds the persisted entries and
+finishes them; lambda_handler runs it for scheduled events.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from config import Settings, get_aws_endpoint_url, get_settings
+from db_utils import (
+    item_s3_keys,
+    list_due_deletions,
+    mark_object_deleted,
+    release_content_object,
+    schedule_object_deletion,
+)
+from logs import get_logger
+from metrics import DELETION_FAILURES_TOTAL, DELETIONS_TOTAL, get_registry
+from s3_utils import delete_s3_objects
+
+
+logger = get_logger("deletion")
+
+MAX_BATCH_SIZE = 1000
+
+
+class DeletionQueue:
+    def __init__(
+        self,
+        bucket: str,
+        table_name: str,
+        region_name: str,
+        endpoint_url: Optional[str] = None,
+        force_path_style: bool = False,
+        delay_seconds: int = 10,
+        max_workers: int = 2,
+        max_attempts: int = 5,
+    ):
+        self.bucket = bucket
+        self.table_name = table_name
+        self.region_name = region_name
+        self.endpoint_url = endpoint_url
+        self.force_path_style = force_path_style
+        self.delay_seconds = delay_seconds
+        self.max_attempts = max_attempts
+        self.deleted = 0
+        self.failed = 0
+        # Entries are (due_epoch, seq, file_id, s3_key, attempts)
+        self._heap: List[Tuple[float, int, str, str, int]] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        # Keys still to delete per item; the item is flagged once all are gone
+        self._remaining: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-delete")
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def schedule(self, file_id: str, s3_keys: List[str]) -> None:
+        """Persist and queue deletion of an item's objects after the configured delay."""
+        due = time.time() + self.delay_seconds
+        try:
+            schedule_object_deletion(
+                table_name=self.table_name,
+                region_name=self.region_name,
+                file_id=file_id,
+                delete_after_epoch=int(due),
+                endpoint_url=self.endpoint_url,
+            )
+        except ClientError as e:
+            # Still delete in-process; only the crash-safety net is lost
+            logger.warning("Could not persist deletion of %s: %s", file_id, e)
+        with self._cond:
+            self._remaining[file_id] = self._remaining.get(file_id, 0) + len(s3_keys)
+        for s3_key in s3_keys:
+            self._push(due, file_id, s3_key, 0)
+
+    def schedule_item(self, file_id: str, item: Dict[str, Any]) -> None:
+        """
+        Retire the objects behind a metadata item after its last download.
+
+        Deduplicated content is shared: the item only gives up its
+        reference, and the object is queued for deletion once no other
+        item refers to it.
+        """
+        sha256 = item.get("content_sha256")
+        if sha256:
+            refs = release_content_object(
+                table_name=self.table_name,
+                region_name=self.region_name,
+                sha256=sha256,
+                s3_key=item["s3_key"],
+                endpoint_url=self.endpoint_url,
+            )
+            if refs != 0:
+                mark_object_deleted(
+                    table_name=self.table_name,
+                    region_name=self.region_name,
+                    file_id=file_id,
+                    endpoint_url=self.endpoint_url,
+                )
+                return
+        self.schedule(file_id, item_s3_keys(item))
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth, lag of the oldest overdue entry, and totals."""
+        with self._cond:
+            lag = max(0.0, time.time() - self._heap[0][0]) if self._heap else 0.0
+            return {
+                "depth": len(self._heap) + self._in_flight,
+                "lag_seconds": round(lag, 3),
+                "deleted": self.deleted,
+                "failed": self.failed,
+            }
+
+    def _push(self, due: float, file_id: str, s3_key: str, attempts: int) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._seq), file_id, s3_key, attempts))
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="s3-delete-dispatch", daemon=True)
+                self._dispatcher.start()
+            self._cond.notify()
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.time():
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._cond.wait(timeout)
+                batch = []
+                while self._heap and self._heap[0][0] <= time.time() and len(batch) < MAX_BATCH_SIZE:
+                    batch.append(heapq.heappop(self._heap))
+                self._in_flight += len(batch)
+            self._executor.submit(self._process, batch)
+
+    def _process(self, batch: List[Tuple[float, int, str, str, int]]) -> None:
+        try:
+            by_key = {entry[3]: entry for entry in batch}
+            deleted, failed = delete_s3_objects(
+                bucket=self.bucket,
+                keys=list(by_key),
+                region_name=self.region_name,
+                endpoint_url=self.endpoint_url,
+                force_path_style=self.force_path_style,
+            )
+            for key in deleted:
+                _, _, file_id, _, _ = by_key[key]
+                if not self._object_done(file_id):
+                    continue
+                try:
+                    mark_object_deleted(
+                        table_name=self.table_name,
+                        region_name=self.region_name,
+                        file_id=file_id,
+                        endpoint_url=self.endpoint_url,
+                    )
+                except ClientError as e:
+                    logger.warning("Deleted %s but could not update metadata: %s", key, e)
+            for key in failed:
+                _, _, file_id, _, attempts = by_key[key]
+                if attempts + 1 < self.max_attempts:
+                    self._push(time.time() + 2 ** attempts, file_id, key, attempts + 1)
+                else:
+                    # Left persisted on the item for the sweeper to retry
+                    logger.warning("Giving up on deleting %s after %s attempts", key, attempts + 1)
+                    with self._cond:
+                        self._remaining.pop(file_id, None)
+            with self._cond:
+                self.deleted += len(deleted)
+                self.failed += len(failed)
+            get_registry().inc(DELETIONS_TOTAL, len(deleted))
+            get_registry().inc(DELETION_FAILURES_TOTAL, len(failed))
+        finally:
+            with self._cond:
+                self._in_flight -= len(batch)
+
+    def _object_done(self, file_id: str) -> bool:
+        """Count one deleted key of `file_id`; True once none are left."""
+        with self._cond:
+            if file_id not in self._remaining:
+                return False
+            self._remaining[file_id] -= 1
+            if self._remaining[file_id] > 0:
+                return False
+            del self._remaining[file_id]
+            return True
+
+
+_queue: Optional[DeletionQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_deletion_queue() -> DeletionQueue:
+    """Return the process-wide deletion queue, configured from Settings."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                settings = get_settings()
+                _queue = DeletionQueue(
+                    bucket=settings.s3_bucket_name,
+                    table_name=settings.ddb_table_name,
+                    region_name=settings.aws_region,
+                    endpoint_url=get_aws_endpoint_url(settings),
+                    force_path_style=settings.s3_force_path_style,
+                    delay_seconds=settings.delete_delay_seconds,
+                    max_workers=settings.deletion_workers,
+                    max_attempts=settings.deletion_max_attempts,
+                )
+    return _queue
+
+
+def sweep_pending_deletions(settings: Optional[Settings] = None) -> Dict[str, int]:
+    """
+    Delete every persisted deletion that is due, in batches of 1000 keys.
+    Safe to run concurrently with the in-process queue: deletes are idempotent.
+    """
+    if settings is None:
+        settings = get_settings()
+    endpoint_url = get_aws_endpoint_url(settings)
+    started = time.time()
+    totals = {"deleted": 0, "failed": 0}
+
+    def flush(entries: List[Dict[str, Any]]) -> None:
+        by_key = {key: entry["file_id"] for entry in entries for key in item_s3_keys(entry)}
+        deleted, failed = delete_s3_objects(
+            bucket=settings.s3_bucket_name,
+            keys=list(by_key),
+            region_name=settings.aws_region,
+            endpoint_url=endpoint_url,
+            force_path_style=settings.s3_force_path_style,
+        )
+        # Flag an item only when none of its keys failed
+        failed_ids = {by_key[key] for key in failed}
+        for file_id in {by_key[key] for key in deleted} - failed_ids:
+            mark_object_deleted(
+                table_name=settings.ddb_table_name,
+                region_name=settings.aws_region,
+                file_id=file_id,
+                endpoint_url=endpoint_url,
+            )
+        totals["deleted"] += len(deleted)
+        totals["failed"] += len(failed)
+
+    pending: List[Dict[str, Any]] = []
+    pending_keys = 0
+    for item in list_due_deletions(
+        table_name=settings.ddb_table_name,
+        region_name=settings.aws_region,
+        now_epoch=int(started),
+        endpoint_url=endpoint_url,
+    ):
+        keys = item_s3_keys(item)
+        if not keys:
+            continue
+        pending.append(item)
+        pending_keys += len(keys)
+        # Whole items per flush, so a bundle's keys are judged together
+        if pending_keys >= MAX_BATCH_SIZE:
+            flush(pending)
+            pending = []
+            pending_keys = 0
+    if pending:
+        flush(pending)
+
+    logger.info("Deletion sweep finished", extra={"fields": totals})
+    return totals
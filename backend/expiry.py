@@ -0,0 +1,82 @@
+"""Expiry tiers that line S3 object lifetimes up with file expiry.
+
+Every upload is tagged with the smallest tier (in days) that covers its
+link lifetime, e.g. expiry-tier=1d for a 24 hour link. The bucket has one
+lifecycle rule per tier that expires tagged objects after that many days,
+plus the FILE_RETENTION_DAYS rule for everything else. S3 honours the
+shortest matching expiration, so storage is freed about a day after a
+link expires rather than after the blanket retention period.
+
+S3 counts lifecycle days from object creation and rounds up to the next
+midnight UTC, so an object never disappears before `days` have passed.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+
+TIER_TAG_KEY = "expiry-tier"
+UPLOADS_PREFIX = "uploads/"
+DAY_SECONDS = 86400
+
+
+def tier_days_for(lifetime_seconds: int, tiers: Sequence[int], retention_days: int) -> Optional[int]:
+    """Smallest tier covering `lifetime_seconds`, or None to fall back to retention."""
+    for days in sorted(tiers):
+        if days >= retention_days:
+            break
+        if days * DAY_SECONDS >= lifetime_seconds:
+            return days
+    return None
+
+
+def tier_tagging(days: Optional[int]) -> Optional[str]:
+    """The URL-encoded Tagging value for a tier (as put_object expects it)."""
+    if days is None:
+        return None
+    return f"{TIER_TAG_KEY}={days}d"
+
+
+def object_lifetime_seconds(days: Optional[int], retention_days: int) -> int:
+    """How long S3 keeps an object of this tier, at least."""
+    return (days if days is not None else retention_days) * DAY_SECONDS
+
+
+def lifecycle_expiry_epoch(created_epoch: int, lifetime_seconds: int) -> int:
+    """When a lifecycle rule of `lifetime_seconds` expires an object created at `created_epoch`."""
+    return -(-(created_epoch + lifetime_seconds) // DAY_SECONDS) * DAY_SECONDS
+
+
+def lifecycle_rules(retention_days: int, tiers: Sequence[int]) -> List[Dict]:
+    """The bucket lifecycle rules: retention for all uploads, one rule per tier."""
+    rules: List[Dict] = [
+        {
+            'ID': 'delete-old-uploads',
+            'Status': 'Enabled',
+            'Filter': {
+                'Prefix': UPLOADS_PREFIX
+            },
+            'Expiration': {
+                'Days': retention_days
+            },
+            'AbortIncompleteMultipartUpload': {
+                'DaysAfterInitiation': 1
+            }
+        }
+    ]
+    for days in sorted(set(tiers)):
+        if days >= retention_days:
+            continue
+        rules.append({
+            'ID': f'expire-tier-{days}d',
+            'Status': 'Enabled',
+            'Filter': {
+                'And': {
+                    'Prefix': UPLOADS_PREFIX,
+                    'Tags': [{'Key': TIER_TAG_KEY, 'Value': f'{days}d'}],
+                }
+            },
+            'Expiration': {
+                'Days': days
+            },
+        })
+    return rules
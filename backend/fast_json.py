@@ -0,0 +1,76 @@
+"""Opt-in fast serialization for the hot JSON endpoints (FAST_JSON=true).
+
+By default FastAPI validates what a route returns against its
+response_model and then runs it through jsonable_encoder. The models
+these routes return are built from values the handler already trusts, so
+with FAST_JSON on:
+
+- construct() builds them with model_construct (no validation), and
+- fast_response() renders them straight to bytes, with orjson when it is
+  installed, which makes FastAPI skip both steps.
+
+The response_model stays on each route, so the OpenAPI schema and the
+response bodies are the same either way.
+"""
+
+import asyncio
+import functools
+import json
+from typing import Any, Callable, Type, TypeVar
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse, Response
+
+from config import get_settings
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def construct(model: Type[M], **fields: Any) -> M:
+    """Build a response model; skips validation when FAST_JSON is on."""
+    if _FAST_JSON:
+        return model.model_construct(**fields)
+    return model(**fields)
+
+
+def _render(result: Any, kwargs: dict) -> Any:
+    if not isinstance(result, BaseModel):
+        return result
+    rendered = FastJSONResponse(result.model_dump())
+    # Keep headers the route set on its injected `response: Response`
+    sub_response = kwargs.get("response")
+    if isinstance(sub_response, Response):
+        rendered.headers.raw.extend(sub_response.headers.raw)
+    return rendered
+
+
+def fast_response(func: Callable) -> Callable:
+    """Return a route's model as a pre-rendered response when FAST_JSON is on."""
+    if not _FAST_JSON:
+        return func
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            return _render(await func(*args, **kwargs), kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return _render(func(*args, **kwargs), kwargs)
+    return wrapper
+
+
+_FAST_JSON = get_settings().fast_json
@@ -0,0 +1,151 @@
+"""Availability of a shared file, shared by /file-info, /download and batches.
+
+A DynamoDB item carries its numbers as Decimal and is read field by field
+in several places per request. FileRecord converts the fields the status
+depends on once, and status_response() turns a record and a status into
+the matching DownloadResponse. Expiry timestamps are formatted through a
+memo keyed by the epoch value, since the same item is described again and
+again until it expires.
+"""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from fast_json import construct
+from models import BundleFileEntry, DownloadResponse
+
+
+class FileRecord:
+    __slots__ = (
+        "file_id", "filename", "s3_key", "max_downloads", "downloads", "expires_at_epoch", "files", "complete",
+        "object_deleted",
+    )
+
+    def __init__(self, item: Dict[str, Any]):
+        self.file_id: str = item.get("file_id", "")
+        self.filename: Optional[str] = item.get("filename")
+        self.s3_key: Optional[str] = item.get("s3_key")
+        self.max_downloads = int(item.get("max_downloads", 0))
+        self.downloads = int(item.get("downloads", 0))
+        self.expires_at_epoch = int(item.get("expires_at_epoch", 0))
+        self.files: Optional[List[Dict[str, Any]]] = item.get("files")
+        self.complete = item.get("upload_status", "complete") == "complete"
+        self.object_deleted = bool(item.get("object_deleted"))
+
+    @property
+    def remaining_downloads(self) -> int:
+        return max(0, self.max_downloads - self.downloads)
+
+    @property
+    def expires_at_iso(self) -> str:
+        return expiry_iso(self.expires_at_epoch)
+
+
+@lru_cache(maxsize=4096)
+def expiry_iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat() + "Z"
+
+
+def now_iso() -> str:
+    """The `now_iso` of a response; compute once and share across a batch."""
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def to_record(item: Optional[Dict[str, Any]]) -> Optional[FileRecord]:
+    return FileRecord(item) if item else None
+
+
+def evaluate_status(record: Optional[FileRecord], now_epoch: int) -> str:
+    """
+    ok | expired | maxed | not_found, without consuming a download. The
+    single source of truth for /file-info and for db_utils.claim_download.
+    """
+    if record is None or not record.complete:
+        return "not_found"
+    if now_epoch >= record.expires_at_epoch:
+        return "expired"
+    # An object already deleted (or found missing by reconcile) counts as used up
+    if record.object_deleted or record.downloads >= record.max_downloads:
+        return "maxed"
+    return "ok"
+
+
+def status_response(record: Optional[FileRecord], status: str, now: str) -> DownloadResponse:
+    """
+    Describe a record for `status`. For "ok" this is the /file-info answer;
+    /download adds the URLs itself.
+    """
+    if status == "not_found" or record is None:
+        return construct(DownloadResponse, status="not_found", message="File not found", now_iso=now)
+    if status == "expired":
+        return construct(
+            DownloadResponse,
+            status="expired",
+            message="This link has expired.",
+            filename=record.filename,
+            remaining_downloads=record.remaining_downloads,
+            expires_at_iso=record.expires_at_iso,
+            now_iso=now,
+        )
+    if status == "maxed":
+        return construct(
+            DownloadResponse,
+            status="maxed",
+            message="Maximum download limit reached.",
+            filename=record.filename,
+            remaining_downloads=0,
+            expires_at_iso=record.expires_at_iso,
+            now_iso=now,
+        )
+    return construct(
+        DownloadResponse,
+        status="ok",
+        message="File is available for download.",
+        filename=record.filename,
+        remaining_downloads=record.remaining_downloads,
+        expires_at_iso=record.expires_at_iso,
+        now_iso=now,
+        files=[construct(BundleFileEntry, filename=f["filename"]) for f in record.files] if record.files is not None else None,
+    )
+
+
+def status_etag(record: Optional[FileRecord], status: str) -> Optional[str]:
+    """Strong ETag for a /file-info answer; None when there is nothing to cache."""
+    if record is None or status == "not_found":
+        return None
+    return f'"{record.downloads}-{record.expires_at_epoch}-{status}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header lists `etag` (or is "*")."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cache_control(record: Optional[FileRecord], status: str, now_epoch: int, max_age: int) -> str:
+    """
+    Cache-Control for a /file-info answer. An available file is cached for
+    at most `max_age` seconds and never past its expiry; a missing one not
+    at all, since an upload in progress may complete any moment.
+    """
+    if record is None or status == "not_found" or max_age <= 0:
+        return "no-store"
+    if status == "ok":
+        max_age = min(max_age, max(0, record.expires_at_epoch - now_epoch))
+    return f"public, max-age={max_age}"
+
+
+def describe_items(items: Dict[str, Dict[str, Any]], file_ids: List[str], now_epoch: int) -> Dict[str, DownloadResponse]:
+    """/file-info answers for many items, against one clock and one now_iso."""
+    now = now_iso()
+    responses = {}
+    for file_id in file_ids:
+        record = to_record(items.get(file_id))
+        responses[file_id] = status_response(record, evaluate_status(record, now_epoch), now)
+    return responses
@@ -1,14 +1,57 @@
 """
 AWS Lambda handler for FastAPI application
 Optimized for AWS Free Tier usage
+
+Startup is split in two: boto3 clients are built at init time (outside the
+handler, so the first request does not pay for them), while FastAPI, the
+routes and Mangum are only imported on the first HTTP request. Warm-up
+pings and scheduled sweeps never load the web stack at all.
 """
 
 import json
-from mangum import Mangum
-from main import app
+import logging
+
+from aws_clients import get_client, get_credentials
+from config import get_aws_endpoint_url, get_settings
+from db_utils import get_ddb_table
+from logs import get_logger
+
+settings = get_settings()
+logger = get_logger("lambda")
+_mangum = None
+
+
+def _prewarm_clients():
+    """Build the pooled S3/DynamoDB clients; no network calls are made."""
+    endpoint_url = get_aws_endpoint_url(settings)
+    get_client(
+        "s3",
+        region_name=settings.aws_region,
+        endpoint_url=endpoint_url,
+        addressing_style="path" if settings.s3_force_path_style else "auto",
+    )
+    if settings.ddb_table_name:
+        get_ddb_table(settings.ddb_table_name, settings.aws_region, endpoint_url)
+    get_credentials()
+
+
+if settings.lambda_prewarm_clients:
+    _prewarm_clients()
+
+
+def _is_warmup_event(event) -> bool:
+    return bool(event.get("warmup")) or event.get("source") == "serverless-plugin-warmup"
+
+
+def handler(event, context):
+    """Mangum adapter for the FastAPI app, created on first use."""
+    global _mangum
+    if _mangum is None:
+        from mangum import Mangum
+        from main import app
+        _mangum = Mangum(app, lifespan="off")
+    return _mangum(event, context)
 
-# Create the Lambda handler
-handler = Mangum(app, lifespan="off")
 
 def lambda_handler(event, context):
     """
@@ -24,19 +67,37 @@ def lambda_handler(event, context):
             })
         return response
     
+    # Warm-up pings keep the container alive without touching the web stack
+    if _is_warmup_event(event):
+        return {'statusCode': 200, 'body': json.dumps({'status': 'warm'})}
+
+    # Daily reconciliation of S3 objects against the metadata table (see reconcile.py)
+    if event.get("task") == "reconcile":
+        from reconcile import reconcile_storage
+        return {
+            'statusCode': 200,
+            'body': json.dumps(reconcile_storage(dry_run=bool(event.get("dry_run")))),
+        }
+
+    # Scheduled (EventBridge) invocations sweep persisted deletions instead of serving HTTP
+    if event.get("source") == "aws.events" or event.get("detail-type") == "Scheduled Event":
+        from deletion_queue import sweep_pending_deletions
+        return {
+            'statusCode': 200,
+            'body': json.dumps(sweep_pending_deletions()),
+        }
+
     try:
-        # Log the event for debugging
-        print(f"Lambda event: {json.dumps(event)}")
-        print(f"Lambda context: {context.function_name}")
+        # Serializing the whole event is only worth it when DEBUG is enabled
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Lambda event: %s", json.dumps(event))
         
         # Process the request through Mangum
         response = handler(event, context)
         return add_cors_headers(response)
     except Exception as e:
-        # Log the full error for debugging
-        import traceback
-        print(f"Lambda error: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
+        # Log the full error (with traceback) for debugging
+        logger.exception("Lambda error: %s", e)
         
         # Return error response with CORS headers
         error_response = {
@@ -0,0 +1,774 @@
+"""In-process stand-ins for the DynamoDB and S3 APIs used by the backend.
+
+With STORAGE_BACKEND=memory or filesystem, aws_clients hands out these
+objects instead of boto3 clients, so db_utils, s3_utils and the whole API
+run without AWS, LocalStack or any other external process:
+
+- LocalTable / LocalDynamoResource / LocalDynamoClient implement the
+  DynamoDB calls made by db_utils, including the condition and update
+  expressions it uses, ReturnValues and ConditionalCheckFailedException.
+- LocalS3Client implements the S3 calls made by s3_utils and
+  upload_stream, including ranged GETs and multipart uploads.
+- Presigned URLs point at /local-s3/... on the API itself (see `router`),
+  signed with an HMAC so they expire and cannot be altered.
+
+`memory` keeps everything in process; `filesystem` keeps tables as JSON
+and objects as files under LOCAL_STORAGE_PATH so they survive restarts.
+Both are meant for a single process (development, demos, CI); in-progress
+multipart uploads are never persisted.
+Errors are raised as botocore ClientErrors with the codes AWS would use.
+"""
+
+import copy
+import hashlib
+import hmac
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlencode
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from config import Settings, get_settings
+
+
+_serializer = TypeSerializer()
+_MISSING = object()
+
+
+def _error(code: str, message: str, operation: str, **extra: Any) -> ClientError:
+    response = {"Error": {"Code": code, "Message": message}}
+    response.update(extra)
+    return ClientError(response, operation)
+
+
+# ---------------------------------------------------------------------------
+# DynamoDB expressions
+# ---------------------------------------------------------------------------
+
+_TOKEN = re.compile(r"\s*(<=|>=|<>|[=<>(),+\-]|[#:]?[A-Za-z_][A-Za-z0-9_]*)")
+
+
+def _tokenize(expression: str) -> List[str]:
+    tokens, pos = [], 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _TOKEN.match(expression, pos)
+        if not match:
+            raise _error("ValidationException", f"Invalid expression: {expression!r}", "Expression")
+        tokens.append(match.group(1))
+        pos = match.end()
+        while pos < len(expression) and expression[pos].isspace():
+            pos += 1
+    return tokens
+
+
+class _Expression:
+    """Recursive-descent evaluator for the subset of expression syntax we use."""
+
+    def __init__(self, expression: str, names: Dict[str, str], values: Dict[str, Any]):
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+        self.names = names
+        self.values = values
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise _error("ValidationException", "Unexpected end of expression", "Expression")
+        self.pos += 1
+        return token
+
+    def _expect(self, token: str) -> None:
+        if self._next() != token:
+            raise _error("ValidationException", f"Expected {token!r}", "Expression")
+
+    def _name(self, token: str) -> str:
+        return self.names[token] if token.startswith("#") else token
+
+    def _operand(self, item: Dict[str, Any]) -> Any:
+        token = self._next()
+        if token.startswith(":"):
+            return self.values[token]
+        return item.get(self._name(token), _MISSING)
+
+    # Conditions
+    def condition(self, item: Dict[str, Any]) -> bool:
+        result = self._or(item)
+        if self._peek() is not None:
+            raise _error("ValidationException", f"Unexpected token {self._peek()!r}", "Expression")
+        return result
+
+    def _or(self, item) -> bool:
+        result = self._and(item)
+        while self._peek() == "OR":
+            self._next()
+            right = self._and(item)
+            result = result or right
+        return result
+
+    def _and(self, item) -> bool:
+        result = self._not(item)
+        while self._peek() == "AND":
+            self._next()
+            right = self._not(item)
+            result = result and right
+        return result
+
+    def _not(self, item) -> bool:
+        if self._peek() == "NOT":
+            self._next()
+            return not self._not(item)
+        return self._primary(item)
+
+    def _primary(self, item) -> bool:
+        token = self._peek()
+        if token == "(":
+            self._next()
+            result = self._or(item)
+            self._expect(")")
+            return result
+        if token in ("attribute_exists", "attribute_not_exists"):
+            self._next()
+            self._expect("(")
+            exists = self._name(self._next()) in item
+            self._expect(")")
+            return exists if token == "attribute_exists" else not exists
+        left = self._operand(item)
+        op = self._next()
+        right = self._operand(item)
+        if left is _MISSING or right is _MISSING:
+            return op == "<>"
+        try:
+            return {
+                "=": left == right,
+                "<>": left != right,
+                "<": left < right,
+                "<=": left <= right,
+                ">": left > right,
+                ">=": left >= right,
+            }[op]
+        except TypeError:
+            return False
+
+    # Updates
+    def update(self, item: Dict[str, Any]) -> List[str]:
+        """Apply SET / REMOVE / ADD clauses in place; return the attributes touched."""
+        touched = []
+        while self._peek() is not None:
+            clause = self._next()
+            while True:
+                if clause == "SET":
+                    name = self._name(self._next())
+                    self._expect("=")
+                    value = self._operand(item)
+                    if self._peek() in ("+", "-"):
+                        op = self._next()
+                        other = self._operand(item)
+                        if value is _MISSING or other is _MISSING:
+                            raise _error("ValidationException", "Operand missing in SET expression", "UpdateItem")
+                        value = value + other if op == "+" else value - other
+                    if value is _MISSING:
+                        raise _error("ValidationException", "Operand missing in SET expression", "UpdateItem")
+                    item[name] = value
+                elif clause == "REMOVE":
+                    name = self._name(self._next())
+                    item.pop(name, None)
+                elif clause == "ADD":
+                    name = self._name(self._next())
+                    amount = self._operand(item)
+                    item[name] = item.get(name, 0) + amount
+                else:
+                    raise _error("ValidationException", f"Unsupported clause {clause!r}", "UpdateItem")
+                touched.append(name)
+                if self._peek() != ",":
+                    break
+                self._next()
+        return touched
+
+
+def _projection(item: Dict[str, Any], expression: Optional[str], names: Dict[str, str]) -> Dict[str, Any]:
+    if not expression:
+        return item
+    wanted = [names.get(p.strip(), p.strip()) for p in expression.split(",")]
+    return {k: item[k] for k in wanted if k in item}
+
+
+# ---------------------------------------------------------------------------
+# DynamoDB
+# ---------------------------------------------------------------------------
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class _TableData:
+    def __init__(self, name: str, path: Optional[Path]):
+        self.name = name
+        self.path = path
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        if path is not None and path.exists():
+            self.items = json.loads(path.read_text())
+
+    def save(self) -> None:
+        """Persist the table (filesystem backend); callers hold the lock."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent)
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.items, f, default=_to_json)
+        os.replace(tmp, self.path)
+
+
+class LocalTable:
+    def __init__(self, data: _TableData):
+        self._data = data
+        self.name = data.name
+
+    def put_item(self, Item: Dict[str, Any], ConditionExpression: Optional[str] = None,
+                 ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                 ExpressionAttributeValues: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        key = Item["file_id"]
+        with self._data.lock:
+            old = self._data.items.get(key, {})
+            if ConditionExpression and not _Expression(
+                ConditionExpression, ExpressionAttributeNames or {}, ExpressionAttributeValues or {}
+            ).condition(old):
+                raise _error("ConditionalCheckFailedException", "The conditional request failed", "PutItem")
+            self._data.items[key] = copy.deepcopy(Item)
+            self._data.save()
+        return {}
+
+    def get_item(self, Key: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        with self._data.lock:
+            item = self._data.items.get(Key["file_id"])
+            return {"Item": copy.deepcopy(item)} if item is not None else {}
+
+    def update_item(self, Key: Dict[str, Any], UpdateExpression: str,
+                    ConditionExpression: Optional[str] = None,
+                    ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                    ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+                    ReturnValues: str = "NONE",
+                    ReturnValuesOnConditionCheckFailure: str = "NONE") -> Dict[str, Any]:
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self._data.lock:
+            old = self._data.items.get(Key["file_id"])
+            current = old if old is not None else {}
+            if ConditionExpression and not _Expression(ConditionExpression, names, values).condition(current):
+                extra = {}
+                if ReturnValuesOnConditionCheckFailure == "ALL_OLD" and old is not None:
+                    extra["Item"] = {k: _serializer.serialize(v) for k, v in old.items()}
+                raise _error("ConditionalCheckFailedException", "The conditional request failed", "UpdateItem", **extra)
+            item = copy.deepcopy(old) if old is not None else dict(Key)
+            touched = _Expression(UpdateExpression, names, values).update(item)
+            self._data.items[Key["file_id"]] = item
+            self._data.save()
+            if ReturnValues == "ALL_NEW":
+                return {"Attributes": copy.deepcopy(item)}
+            if ReturnValues == "UPDATED_NEW":
+                return {"Attributes": {k: copy.deepcopy(item[k]) for k in touched if k in item}}
+            return {}
+
+    def delete_item(self, Key: Dict[str, Any], ConditionExpression: Optional[str] = None,
+                    ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                    ExpressionAttributeValues: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        with self._data.lock:
+            old = self._data.items.get(Key["file_id"], {})
+            if ConditionExpression and not _Expression(
+                ConditionExpression, ExpressionAttributeNames or {}, ExpressionAttributeValues or {}
+            ).condition(old):
+                raise _error("ConditionalCheckFailedException", "The conditional request failed", "DeleteItem")
+            if self._data.items.pop(Key["file_id"], None) is not None:
+                self._data.save()
+        return {}
+
+    def batch_writer(self, **kwargs) -> "_BatchWriter":
+        return _BatchWriter(self)
+
+    def scan(self, FilterExpression: Optional[str] = None, ProjectionExpression: Optional[str] = None,
+             ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+             ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+             ExclusiveStartKey: Optional[Dict[str, Any]] = None, Limit: int = 1000,
+             Segment: int = 0, TotalSegments: int = 1, **kwargs) -> Dict[str, Any]:
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self._data.lock:
+            keys = sorted(self._data.items)
+            if ExclusiveStartKey:
+                keys = [k for k in keys if k > ExclusiveStartKey["file_id"]]
+            page, last = [], None
+            for key in keys:
+                if TotalSegments > 1 and int(hashlib.md5(key.encode()).hexdigest(), 16) % TotalSegments != Segment:
+                    continue
+                if len(page) >= Limit:
+                    break
+                last = key
+                item = self._data.items[key]
+                if FilterExpression and not _Expression(FilterExpression, names, values).condition(item):
+                    continue
+                page.append(copy.deepcopy(_projection(item, ProjectionExpression, names)))
+            else:
+                last = None
+        resp: Dict[str, Any] = {"Items": page, "Count": len(page)}
+        if last is not None:
+            resp["LastEvaluatedKey"] = {"file_id": last}
+        return resp
+
+
+class _BatchWriter:
+    """Unbuffered stand-in for boto3's Table.batch_writer()."""
+
+    def __init__(self, table: LocalTable):
+        self._table = table
+
+    def __enter__(self) -> "_BatchWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def put_item(self, Item: Dict[str, Any]) -> None:
+        self._table.put_item(Item=Item)
+
+    def delete_item(self, Key: Dict[str, Any]) -> None:
+        self._table.delete_item(Key=Key)
+
+
+class _LocalDynamoDB:
+    def __init__(self, root: Optional[Path]):
+        self._root = root
+        self._tables: Dict[str, _TableData] = {}
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> _TableData:
+        with self._lock:
+            data = self._tables.get(name)
+            if data is None:
+                path = self._root / "dynamodb" / f"{quote(name, safe='')}.json" if self._root else None
+                data = self._tables[name] = _TableData(name, path)
+            return data
+
+
+class LocalDynamoResource:
+    def __init__(self, db: _LocalDynamoDB):
+        self._db = db
+
+    def Table(self, name: str) -> LocalTable:
+        return LocalTable(self._db.table(name))
+
+    def batch_get_item(self, RequestItems: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            responses[name] = [
+                resp["Item"] for resp in (table.get_item(Key=key) for key in request["Keys"]) if "Item" in resp
+            ]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+class _Waiter:
+    def wait(self, **kwargs) -> None:
+        pass
+
+
+class LocalDynamoClient:
+    """Control-plane calls made by ensure_table_exists; tables always exist."""
+
+    def __init__(self, db: _LocalDynamoDB):
+        self._db = db
+
+    def describe_table(self, TableName: str) -> Dict[str, Any]:
+        self._db.table(TableName)
+        return {"Table": {"TableName": TableName, "TableStatus": "ACTIVE"}}
+
+    def create_table(self, TableName: str, **kwargs) -> Dict[str, Any]:
+        return self.describe_table(TableName)
+
+    def update_time_to_live(self, TableName: str, TimeToLiveSpecification: Dict[str, Any]) -> Dict[str, Any]:
+        return {"TimeToLiveSpecification": TimeToLiveSpecification}
+
+    def describe_time_to_live(self, TableName: str) -> Dict[str, Any]:
+        return {"TimeToLiveDescription": {"TimeToLiveStatus": "DISABLED"}}
+
+    def get_waiter(self, name: str) -> _Waiter:
+        return _Waiter()
+
+
+# ---------------------------------------------------------------------------
+# S3
+# ---------------------------------------------------------------------------
+
+class _BlobStore:
+    """Bytes plus a small metadata dict per (bucket, key), in memory or on disk."""
+
+    def __init__(self, root: Optional[Path]):
+        self._root = root
+        self._blobs: Dict[Tuple[str, str], Tuple[bytes, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, bucket: str, key: str) -> Tuple[Path, Path]:
+        # Quoting keeps every key a single file name inside the root
+        bucket, name = quote(bucket, safe=""), quote(key, safe="")
+        return self._root / "s3" / bucket / name, self._root / "s3-meta" / bucket / f"{name}.json"
+
+    def put(self, bucket: str, key: str, data: bytes, meta: Dict[str, Any]) -> None:
+        if self._root is None:
+            with self._lock:
+                self._blobs[(bucket, key)] = (data, meta)
+            return
+        data_path, meta_path = self._paths(bucket, key)
+        for path, payload in ((data_path, data), (meta_path, json.dumps(meta).encode())):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+
+    def get(self, bucket: str, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        if self._root is None:
+            with self._lock:
+                return self._blobs.get((bucket, key))
+        data_path, meta_path = self._paths(bucket, key)
+        try:
+            return data_path.read_bytes(), json.loads(meta_path.read_text())
+        except FileNotFoundError:
+            return None
+
+    def delete(self, bucket: str, key: str) -> None:
+        if self._root is None:
+            with self._lock:
+                self._blobs.pop((bucket, key), None)
+            return
+        for path in self._paths(bucket, key):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def keys(self, bucket: str) -> List[str]:
+        if self._root is None:
+            with self._lock:
+                return sorted(k for b, k in self._blobs if b == bucket)
+        directory = self._root / "s3" / quote(bucket, safe="")
+        if not directory.is_dir():
+            return []
+        return sorted(unquote(p.name) for p in directory.iterdir() if not p.name.startswith(".tmp-"))
+
+
+_MULTIPART_BUCKET = ".multipart"
+
+
+class LocalS3Client:
+    def __init__(self, blobs: _BlobStore, base_url: str, secret: bytes):
+        self._blobs = blobs
+        self._base_url = base_url.rstrip("/")
+        self._secret = secret
+        self._uploads: Dict[str, Dict[str, Any]] = {}
+        self._lifecycle: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    # Objects
+    def put_object(self, Bucket: str, Key: str, Body: Any = b"", ContentType: Optional[str] = None,
+                   ContentEncoding: Optional[str] = None, Tagging: Optional[str] = None,
+                   **kwargs) -> Dict[str, Any]:
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self._blobs.put(Bucket, Key, data, {
+            "ContentType": ContentType or "binary/octet-stream",
+            "ContentEncoding": ContentEncoding,
+            "ETag": etag,
+            "LastModified": time.time(),
+            "Tagging": Tagging,
+        })
+        return {"ETag": etag}
+
+    def get_object_tagging(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        _, meta = self._load(Bucket, Key, "GetObjectTagging")
+        pairs = [p.partition("=") for p in (meta.get("Tagging") or "").split("&") if p]
+        return {"TagSet": [{"Key": unquote(k), "Value": unquote(v)} for k, _, v in pairs]}
+
+    def _load(self, bucket: str, key: str, operation: str) -> Tuple[bytes, Dict[str, Any]]:
+        blob = self._blobs.get(bucket, key)
+        if blob is None:
+            raise _error("NoSuchKey", "The specified key does not exist.", operation)
+        return blob
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None,
+                   IfMatch: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        data, meta = self._load(Bucket, Key, "GetObject")
+        if IfMatch is not None and IfMatch != meta["ETag"]:
+            raise _error("PreconditionFailed", "At least one of the pre-conditions you specified did not hold", "GetObject")
+        resp: Dict[str, Any] = {"ContentType": meta["ContentType"], "ETag": meta["ETag"]}
+        if meta.get("ContentEncoding"):
+            resp["ContentEncoding"] = meta["ContentEncoding"]
+        if Range:
+            start, _, end = Range[len("bytes="):].partition("-")
+            start = int(start)
+            if start >= len(data):
+                raise _error("InvalidRange", "The requested range is not satisfiable", "GetObject")
+            end = min(int(end) if end else len(data) - 1, len(data) - 1)
+            resp["ContentRange"] = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+        resp["ContentLength"] = len(data)
+        resp["Body"] = StreamingBody(io.BytesIO(data), len(data))
+        return resp
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        blob = self._blobs.get(Bucket, Key)
+        if blob is None:
+            raise _error("404", "Not Found", "HeadObject")
+        data, meta = blob
+        return {"ContentLength": len(data), "ContentType": meta["ContentType"], "ETag": meta["ETag"]}
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        self._blobs.delete(Bucket, Key)
+        return {}
+
+    def delete_objects(self, Bucket: str, Delete: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        for obj in Delete["Objects"]:
+            self._blobs.delete(Bucket, obj["Key"])
+        return {} if Delete.get("Quiet") else {"Deleted": [{"Key": o["Key"]} for o in Delete["Objects"]]}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", ContinuationToken: Optional[str] = None,
+                        StartAfter: Optional[str] = None, MaxKeys: int = 1000, **kwargs) -> Dict[str, Any]:
+        after = ContinuationToken or StartAfter or ""
+        keys = [k for k in self._blobs.keys(Bucket) if k.startswith(Prefix) and k > after]
+        page = keys[:MaxKeys]
+        contents = []
+        for key in page:
+            blob = self._blobs.get(Bucket, key)
+            if blob is not None:
+                data, meta = blob
+                modified = datetime.fromtimestamp(meta.get("LastModified", 0), tz=timezone.utc)
+                contents.append({"Key": key, "Size": len(data), "ETag": meta["ETag"], "LastModified": modified})
+        resp: Dict[str, Any] = {"Contents": contents, "KeyCount": len(contents), "IsTruncated": len(keys) > MaxKeys}
+        if resp["IsTruncated"]:
+            resp["NextContinuationToken"] = page[-1]
+        return resp
+
+    # Multipart
+    def create_multipart_upload(self, Bucket: str, Key: str, ContentType: Optional[str] = None,
+                                ContentEncoding: Optional[str] = None, Tagging: Optional[str] = None,
+                                **kwargs) -> Dict[str, Any]:
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {
+                "Bucket": Bucket, "Key": Key, "ContentType": ContentType,
+                "ContentEncoding": ContentEncoding, "Tagging": Tagging, "Parts": {},
+            }
+        return {"UploadId": upload_id, "Bucket": Bucket, "Key": Key}
+
+    def _upload(self, upload_id: str, operation: str) -> Dict[str, Any]:
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+        if upload is None:
+            raise _error("NoSuchUpload", "The specified upload does not exist.", operation)
+        return upload
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: Any = b"",
+                    **kwargs) -> Dict[str, Any]:
+        upload = self._upload(UploadId, "UploadPart")
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self._blobs.put(_MULTIPART_BUCKET, f"{UploadId}/{PartNumber}", data, {"ETag": etag})
+        with self._lock:
+            upload["Parts"][int(PartNumber)] = etag
+        return {"ETag": etag}
+
+    def list_parts(self, Bucket: str, Key: str, UploadId: str, PartNumberMarker: int = 0,
+                   MaxParts: int = 1000, **kwargs) -> Dict[str, Any]:
+        upload = self._upload(UploadId, "ListParts")
+        with self._lock:
+            numbers = sorted(n for n in upload["Parts"] if n > int(PartNumberMarker))
+        page = numbers[:MaxParts]
+        parts = []
+        for number in page:
+            blob = self._blobs.get(_MULTIPART_BUCKET, f"{UploadId}/{number}")
+            if blob is not None:
+                parts.append({"PartNumber": number, "ETag": blob[1]["ETag"], "Size": len(blob[0])})
+        resp: Dict[str, Any] = {"Bucket": Bucket, "Key": Key, "UploadId": UploadId, "Parts": parts,
+                                "IsTruncated": len(numbers) > MaxParts}
+        if resp["IsTruncated"]:
+            resp["NextPartNumberMarker"] = page[-1]
+        return resp
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str,
+                                  MultipartUpload: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        upload = self._upload(UploadId, "CompleteMultipartUpload")
+        chunks = []
+        for part in MultipartUpload["Parts"]:
+            number = int(part["PartNumber"])
+            if upload["Parts"].get(number) != part["ETag"]:
+                raise _error("InvalidPart", f"Part {number} was not uploaded or its ETag does not match.",
+                             "CompleteMultipartUpload")
+            chunks.append(self._blobs.get(_MULTIPART_BUCKET, f"{UploadId}/{number}")[0])
+        self.put_object(Bucket, Key, b"".join(chunks), upload["ContentType"], upload["ContentEncoding"],
+                        upload["Tagging"])
+        self.abort_multipart_upload(Bucket, Key, UploadId)
+        return {"Bucket": Bucket, "Key": Key}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            upload = self._uploads.pop(UploadId, None)
+        if upload is None:
+            raise _error("NoSuchUpload", "The specified upload does not exist.", "AbortMultipartUpload")
+        for number in upload["Parts"]:
+            self._blobs.delete(_MULTIPART_BUCKET, f"{UploadId}/{number}")
+        return {}
+
+    # Buckets
+    def head_bucket(self, Bucket: str, **kwargs) -> Dict[str, Any]:
+        return {}
+
+    def create_bucket(self, Bucket: str, **kwargs) -> Dict[str, Any]:
+        return {"Location": f"/{Bucket}"}
+
+    def get_bucket_lifecycle_configuration(self, Bucket: str, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            rules = self._lifecycle.get(Bucket)
+        if rules is None:
+            raise _error("NoSuchLifecycleConfiguration", "The lifecycle configuration does not exist",
+                         "GetBucketLifecycleConfiguration")
+        return {"Rules": copy.deepcopy(rules)}
+
+    def put_bucket_lifecycle_configuration(self, Bucket: str, LifecycleConfiguration: Dict[str, Any],
+                                           **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._lifecycle[Bucket] = copy.deepcopy(LifecycleConfiguration["Rules"])
+        return {}
+
+    def delete_bucket_lifecycle(self, Bucket: str, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._lifecycle.pop(Bucket, None)
+        return {}
+
+    # Presigning
+    def generate_presigned_url(self, ClientMethod: str, Params: Dict[str, Any], ExpiresIn: int = 3600,
+                               **kwargs) -> str:
+        method = {"put_object": "PUT", "upload_part": "PUT", "get_object": "GET"}[ClientMethod]
+        query = {"method": method, "expires": str(int(time.time()) + int(ExpiresIn))}
+        if ClientMethod == "upload_part":
+            query["uploadId"] = Params["UploadId"]
+            query["partNumber"] = str(Params["PartNumber"])
+        if Params.get("ResponseContentDisposition"):
+            query["response-content-disposition"] = Params["ResponseContentDisposition"]
+        if Params.get("ContentType"):
+            query["content-type"] = Params["ContentType"]
+        if Params.get("Tagging"):
+            query["x-amz-tagging"] = Params["Tagging"]
+        query["signature"] = self.sign(Params["Bucket"], Params["Key"], query)
+        return f"{self._base_url}/local-s3/{Params['Bucket']}/{quote(Params['Key'])}?{urlencode(query)}"
+
+    def sign(self, bucket: str, key: str, query: Dict[str, str]) -> str:
+        payload = "\n".join([bucket, key] + [f"{k}={v}" for k, v in sorted(query.items()) if k != "signature"])
+        return hmac.new(self._secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Registry and presigned URL serving
+# ---------------------------------------------------------------------------
+
+LOCAL_BACKENDS = ("memory", "filesystem")
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {}
+
+
+def _get_state(settings: Settings) -> Dict[str, Any]:
+    with _lock:
+        if not _state:
+            root = Path(settings.local_storage_path) if settings.storage_backend == "filesystem" else None
+            db = _LocalDynamoDB(root)
+            _state["dynamodb_resource"] = LocalDynamoResource(db)
+            _state["dynamodb"] = LocalDynamoClient(db)
+            _state["s3"] = LocalS3Client(
+                _BlobStore(root),
+                settings.local_storage_url,
+                settings.local_storage_secret.encode("utf-8") or os.urandom(32),
+            )
+        return _state
+
+
+def get_local_client(service_name: str):
+    return _get_state(get_settings())[service_name]
+
+
+def get_local_resource(service_name: str):
+    return _get_state(get_settings())[f"{service_name}_resource"]
+
+
+def reset_local_storage() -> None:
+    """Forget in-memory state (tests and benchmarks); files on disk are kept."""
+    with _lock:
+        _state.clear()
+
+
+router = APIRouter()
+
+
+def _check_signature(request: Request, bucket: str, key: str, method: str) -> Dict[str, str]:
+    client: LocalS3Client = get_local_client("s3")
+    query = dict(request.query_params)
+    signature = query.get("signature", "")
+    if query.get("method") != method or not hmac.compare_digest(signature, client.sign(bucket, key, query)):
+        raise HTTPException(status_code=403, detail="SignatureDoesNotMatch")
+    if int(query.get("expires", "0")) < time.time():
+        raise HTTPException(status_code=403, detail="Request has expired")
+    return query
+
+
+@router.put("/local-s3/{bucket}/{key:path}")
+async def local_s3_put(bucket: str, key: str, request: Request) -> Response:
+    """Serve presigned PUT URLs (single object or multipart part)."""
+    query = _check_signature(request, bucket, key, "PUT")
+    client: LocalS3Client = get_local_client("s3")
+    body = await request.body()
+    content_type = request.headers.get("content-type")
+    if query.get("content-type") and content_type != query["content-type"]:
+        raise HTTPException(status_code=403, detail="SignatureDoesNotMatch")
+    try:
+        if "uploadId" in query:
+            resp = client.upload_part(bucket, key, query["uploadId"], int(query["partNumber"]), body)
+        else:
+            resp = client.put_object(bucket, key, body, content_type, request.headers.get("content-encoding"),
+                                     query.get("x-amz-tagging"))
+    except ClientError as e:
+        raise HTTPException(status_code=404, detail=e.response["Error"]["Code"])
+    return Response(status_code=200, headers={"ETag": resp["ETag"]})
+
+
+@router.get("/local-s3/{bucket}/{key:path}")
+def local_s3_get(bucket: str, key: str, request: Request) -> Response:
+    """Serve presigned GET URLs."""
+    query = _check_signature(request, bucket, key, "GET")
+    client: LocalS3Client = get_local_client("s3")
+    try:
+        resp = client.get_object(bucket, key)
+    except ClientError:
+        raise HTTPException(status_code=404, detail="NoSuchKey")
+    headers = {"ETag": resp["ETag"]}
+    if resp.get("ContentEncoding"):
+        headers["Content-Encoding"] = resp["ContentEncoding"]
+    if query.get("response-content-disposition"):
+        headers["Content-Disposition"] = query["response-content-disposition"]
+    return Response(resp["Body"].read(), media_type=resp["ContentType"], headers=headers)
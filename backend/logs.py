@@ -0,0 +1,152 @@
+"""Structured, level-gated JSON logging with per-request context."""
+
+import contextvars
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+from typing import Any, Dict
+from urllib.parse import parse_qs
+
+from config import get_settings
+
+
+_ROOT_LOGGER = "files"
+_EMPTY: Dict[str, Any] = {}
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default=_EMPTY)
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """Render each record as one JSON line, merged with the request context."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        payload.update(_context.get())
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, separators=(",", ":"))
+
+
+class DebugSampler(logging.Filter):
+    """Let through only a fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+def configure_logging(level: str = "INFO", debug_sample_rate: float = 1.0) -> None:
+    """Attach the JSON handler to the application's logger tree (idempotent)."""
+    global _configured
+    logger = logging.getLogger(_ROOT_LOGGER)
+    logger.handlers.clear()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    if debug_sample_rate < 1.0:
+        handler.addFilter(DebugSampler(debug_sample_rate))
+    logger.addHandler(handler)
+    logger.setLevel(level.upper())
+    # Lambda's runtime installs its own root handler; avoid double lines
+    logger.propagate = False
+    _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a logger under the application tree, configuring it on first use."""
+    if not _configured:
+        settings = get_settings()
+        configure_logging(settings.log_level, settings.log_debug_sample_rate)
+    return logging.getLogger(f"{_ROOT_LOGGER}.{name}")
+
+
+def bind(**fields: Any) -> None:
+    """Add fields (e.g. file_id) to every record logged in the current request."""
+    ctx = _context.get()
+    if ctx is _EMPTY:
+        _context.set(dict(fields))
+    else:
+        # Mutate in place so fields bound inside threadpool handlers
+        # (which run on a copy of the context) still reach the request line
+        ctx.update(fields)
+
+
+def start_request(**fields: Any) -> contextvars.Token:
+    """Start a fresh request context; pass the token to end_request()."""
+    return _context.set(dict(fields))
+
+
+def end_request(token: contextvars.Token) -> None:
+    _context.reset(token)
+
+
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+class RequestLogMiddleware:
+    """
+    ASGI middleware that opens a log context per request (request_id, file_id)
+    and writes exactly one summary line when the response has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.logger = get_logger("request")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        aws_context = scope.get("aws.context")
+        request_id = getattr(aws_context, "aws_request_id", None)
+        if not request_id:
+            for name, value in scope.get("headers") or []:
+                if name == b"x-request-id":
+                    request_id = value.decode("latin-1")
+                    break
+        fields = {"request_id": request_id or uuid.uuid4().hex}
+        query_string = scope.get("query_string") or b""
+        if b"file_id=" in query_string:
+            file_ids = parse_qs(query_string.decode("latin-1")).get("file_id")
+            if file_ids:
+                fields["file_id"] = file_ids[0]
+        token = start_request(**fields)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.logger.log(
+                logging.ERROR if status >= 500 else logging.INFO,
+                "request",
+                extra={"fields": {
+                    "method": scope.get("method"),
+                    "path": scope.get("path"),
+                    "status": status,
+                    "duration_ms": elapsed_ms(started),
+                }},
+            )
+            end_request(token)
@@ -1,52 +1,113 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict
-from collections import defaultdict
-import time
+from typing import Optional
+from urllib.parse import quote
 
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form, Request
+from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
+from botocore.exceptions import BotoCoreError, ClientError
 
+from aio_utils import (
+    batch_get_file_metadata_async,
+    claim_download_async,
+    get_file_metadata_async,
+    run_blocking,
+)
+from bootstrap import ensure_resources, resources_ready
 from config import get_settings, get_aws_endpoint_url
+from content_encoding import encoding_for
 from db_utils import (
+    acquire_content_object,
     get_file_metadata,
+    item_s3_keys,
+    mark_object_present,
+    mark_upload_finished,
     put_file_metadata,
-    try_increment_downloads,
-    ensure_table_exists,
+    release_content_object,
+    release_download,
+)
+from deletion_queue import get_deletion_queue
+from expiry import object_lifetime_seconds, tier_days_for, tier_tagging
+from fast_json import construct, fast_response
+from file_status import (
+    cache_control,
+    describe_items,
+    etag_matches,
+    evaluate_status,
+    now_iso,
+    status_etag,
+    status_response,
+    to_record,
+)
+from logs import RequestLogMiddleware, bind, get_logger
+from metadata_cache import get_metadata_cache
+from metrics import (
+    DEDUP_BYTES_SAVED_TOTAL,
+    DEDUP_HITS_TOTAL,
+    RESPONSE_STATUS_TOTAL,
+    MetricsMiddleware,
+    count_status,
+    get_registry,
+    timed,
+)
+from models import (
+    BatchFileInfoRequest,
+    BatchFileInfoResponse,
+    BundleFileEntry,
+    BundleInitRequest,
+    BundleInitResponse,
+    BundleUploadUrl,
+    DownloadResponse,
+    MultipartAbortRequest,
+    MultipartCompleteRequest,
+    MultipartInitRequest,
+    MultipartInitResponse,
+    MultipartPartsRequest,
+    MultipartPartsResponse,
+    MultipartPartUrl,
+    UploadInitRequest,
+    UploadInitResponse,
 )
-from models import DownloadResponse, UploadInitRequest, UploadInitResponse
+from rate_limit import create_rate_limiter
 from s3_utils import (
-    check_s3_object_exists,
+    abort_multipart_upload,
+    complete_multipart_upload,
+    create_multipart_upload,
+    create_presigned_part_urls,
     create_presigned_download_url,
     create_presigned_upload_url,
+    check_s3_object_exists,
     delete_s3_object,
-    ensure_bucket_exists,
     get_s3_client,
+    multipart_upload_size,
+    open_s3_object_ranges,
 )
 from s3_lifecycle import setup_s3_lifecycle_policy
+from upload_stream import EmptyUploadError, UploadTooLargeError, stream_upload_to_s3
+from zip_stream import stream_zip, unique_names
 
 
 app = FastAPI(title="Secure File Sharing API")
 settings = get_settings()
+logger = get_logger("api")
 
-# Simple in-memory rate limiting (for production, use Redis)
-upload_requests: Dict[str, list] = defaultdict(list)
-RATE_LIMIT_PER_IP = 10  # uploads per hour
-RATE_LIMIT_WINDOW = 3600  # 1 hour in seconds
+# Upload rate limiting (in-memory or shared through DynamoDB; see rate_limit.py)
+upload_rate_limiter = create_rate_limiter(settings)
 
 def check_rate_limit(ip: str) -> bool:
     """Check if IP is within rate limits."""
-    now = time.time()
-    # Clean old requests
-    upload_requests[ip] = [req_time for req_time in upload_requests[ip] if now - req_time < RATE_LIMIT_WINDOW]
-    
-    if len(upload_requests[ip]) >= RATE_LIMIT_PER_IP:
-        return False
-    
-    upload_requests[ip].append(now)
-    return True
+    return upload_rate_limiter.allow(ip)
+
+
+def _expiry_tier(expires_in_hours: int) -> Optional[int]:
+    """Expiry tier (days) for the objects of a link; see expiry.py."""
+    return tier_days_for(expires_in_hours * 3600, settings.expiry_tiers_days, settings.file_retention_days)
 
 # CORS
 if settings.cors_origins == ["*"]:
@@ -54,6 +115,8 @@ if settings.cors_origins == ["*"]:
 else:
     allow_origins = settings.cors_origins
 
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestLogMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
@@ -62,52 +125,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# In-process storage: presigned URLs point back at this API
+if settings.storage_backend != "aws":
+    from local_storage import router as local_storage_router
+    app.include_router(local_storage_router)
+
 
 @app.on_event("startup")
 async def startup_event():
-    """Set up S3 lifecycle policies on startup for cost protection."""
+    """Create LocalStack resources and set up S3 lifecycle policies on startup."""
+    if settings.s3_bucket_name and settings.ddb_table_name:
+        try:
+            await run_blocking(ensure_resources, settings)
+        except (BotoCoreError, ClientError) as e:
+            # Not fatal: the upload endpoints try again on first use
+            logger.warning("Could not create LocalStack resources at startup: %s", e)
     if settings.s3_bucket_name and not settings.use_localstack:
         # Only set up lifecycle in production (real AWS)
         setup_s3_lifecycle_policy(
             bucket_name=settings.s3_bucket_name,
-            region_name=settings.aws_region
+            region_name=settings.aws_region,
+            expiration_days=settings.file_retention_days,
+            tier_days=settings.expiry_tiers_days,
         )
 
 
 @app.get("/health")
 def health() -> dict:
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "metadata_cache": get_metadata_cache().stats(),
+        "deletion_queue": get_deletion_queue().stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Latency histograms and counters in the Prometheus text format."""
+    registry = get_registry()
+    # Hits, misses and deletions are counters, incremented where they happen
+    cache_stats = get_metadata_cache().stats()
+    for name in ("entries", "bytes"):
+        registry.set_gauge(f"metadata_cache_{name}", cache_stats[name])
+    queue_stats = get_deletion_queue().stats()
+    for name in ("depth", "lag_seconds"):
+        registry.set_gauge(f"deletion_queue_{name}", queue_stats[name])
+    return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
 @app.post("/upload", response_model=UploadInitResponse)
+@fast_response
 def initiate_upload(req: UploadInitRequest) -> UploadInitResponse:
-    print(f"Upload request received: filename={req.filename}, max_downloads={req.max_downloads}, expires_in_hours={req.expires_in_hours}")
+    logger.debug(
+        "Upload request received: filename=%s, max_downloads=%s, expires_in_hours=%s",
+        req.filename, req.max_downloads, req.expires_in_hours,
+    )
     
     if not settings.s3_bucket_name or not settings.ddb_table_name:
-        print("ERROR: Missing S3_BUCKET_NAME or DDB_TABLE_NAME")
+        logger.error("Missing S3_BUCKET_NAME or DDB_TABLE_NAME")
         raise HTTPException(
             status_code=500,
             detail="Server not configured: missing S3_BUCKET_NAME or DDB_TABLE_NAME",
         )
 
-    # LocalStack: auto-create bucket and table if enabled
-    if settings.use_localstack and settings.auto_create_localstack_resources:
-        print("Creating LocalStack resources...")
-        ensure_bucket_exists(
-            bucket=settings.s3_bucket_name,
-            region_name=settings.aws_region,
-            endpoint_url=settings.localstack_endpoint_url,
-            force_path_style=settings.s3_force_path_style,
-        )
-        ensure_table_exists(
-            table_name=settings.ddb_table_name,
-            region_name=settings.aws_region,
-            endpoint_url=settings.localstack_endpoint_url,
-        )
+    # LocalStack: auto-create bucket and table (once per process)
+    ensure_resources(settings)
 
     file_id = str(uuid.uuid4())
     s3_key = f"uploads/{file_id}/{req.filename}"
-    print(f"Generated file_id: {file_id}, s3_key: {s3_key}")
+    bind(file_id=file_id)
+    logger.debug("Generated s3_key: %s", s3_key)
 
     # Generate presigned upload URL
     upload_url = create_presigned_upload_url(
@@ -117,14 +204,15 @@ def initiate_upload(req: UploadInitRequest) -> UploadInitResponse:
         region_name=settings.aws_region,
         endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
         force_path_style=settings.s3_force_path_style,
+        fast_presign=settings.fast_presign,
+        tagging=tier_tagging(_expiry_tier(req.expires_in_hours)),
     )
-    print(f"Generated presigned URL: {upload_url[:100]}...")
 
     # Compute expiry
     now = datetime.now(tz=timezone.utc)
     expires_at = now + timedelta(hours=req.expires_in_hours)
     expires_at_epoch = int(expires_at.timestamp())
-    print(f"File expires at: {expires_at} (epoch: {expires_at_epoch})")
+    logger.debug("File expires at epoch %s", expires_at_epoch)
 
     # Write metadata
     metadata_item = {
@@ -135,25 +223,87 @@ def initiate_upload(req: UploadInitRequest) -> UploadInitResponse:
         "downloads": 0,
         "expires_at_epoch": expires_at_epoch,
     }
-    print(f"Writing metadata: {metadata_item}")
-    put_file_metadata(
-        table_name=settings.ddb_table_name,
-        region_name=settings.aws_region,
-        endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
-        item=metadata_item,
-    )
+    logger.debug("Writing metadata: %s", metadata_item)
+    with timed("metadata_write"):
+        put_file_metadata(
+            table_name=settings.ddb_table_name,
+            region_name=settings.aws_region,
+            endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+            item=metadata_item,
+        )
 
     download_page_url = f"{settings.frontend_base_url.rstrip('/')}/file/{file_id}"
-    response = UploadInitResponse(
+    response = construct(
+        UploadInitResponse,
         file_id=file_id,
         upload_url=upload_url,
         s3_key=s3_key,
         download_page_url=download_page_url,
     )
-    print(f"Returning response: {response}")
     return response
 
 
+@app.post("/bundle", response_model=BundleInitResponse)
+def initiate_bundle_upload(req: BundleInitRequest) -> BundleInitResponse:
+    """Share several files under one link: one metadata item, one URL per file."""
+    if not settings.s3_bucket_name or not settings.ddb_table_name:
+        raise HTTPException(
+            status_code=500,
+            detail="Server not configured: missing S3_BUCKET_NAME or DDB_TABLE_NAME",
+        )
+
+    # LocalStack: auto-create bucket and table (once per process)
+    ensure_resources(settings)
+
+    file_id = str(uuid.uuid4())
+    bind(file_id=file_id)
+    files = []
+    upload_urls = []
+    tagging = tier_tagging(_expiry_tier(req.expires_in_hours))
+    for index, entry in enumerate(req.files):
+        # The index keeps keys unique when two files share a name
+        s3_key = f"uploads/{file_id}/{index}/{entry.filename}"
+        files.append({"filename": entry.filename, "s3_key": s3_key})
+        upload_urls.append(BundleUploadUrl(
+            filename=entry.filename,
+            s3_key=s3_key,
+            upload_url=create_presigned_upload_url(
+                bucket=settings.s3_bucket_name,
+                key=s3_key,
+                expires_in_seconds=settings.presigned_upload_ttl_seconds,
+                region_name=settings.aws_region,
+                content_type=entry.content_type,
+                endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+                force_path_style=settings.s3_force_path_style,
+                fast_presign=settings.fast_presign,
+                tagging=tagging,
+            ),
+        ))
+
+    now = datetime.now(tz=timezone.utc)
+    expires_at = now + timedelta(hours=req.expires_in_hours)
+    with timed("metadata_write"):
+        put_file_metadata(
+            table_name=settings.ddb_table_name,
+            region_name=settings.aws_region,
+            endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+            item={
+                "file_id": file_id,
+                "filename": req.name or f"{len(files)} files",
+                "files": files,
+                "max_downloads": int(req.max_downloads),
+                "downloads": 0,
+                "expires_at_epoch": int(expires_at.timestamp()),
+            },
+        )
+
+    return BundleInitResponse(
+        file_id=file_id,
+        files=upload_urls,
+        download_page_url=f"{settings.frontend_base_url.rstrip('/')}/file/{file_id}",
+    )
+
+
 @app.post("/upload-file")
 async def upload_file(
     request: Request,
@@ -162,40 +312,28 @@ async def upload_file(
     expires_in_hours: int = Form(24, ge=1, le=72),
 ):
     """Upload file directly through backend to avoid CORS issues with LocalStack."""
-    print(f"Direct upload request: filename={file.filename}, max_downloads={max_downloads}, expires_in_hours={expires_in_hours}")
+    logger.debug(
+        "Direct upload request: filename=%s, max_downloads=%s, expires_in_hours=%s",
+        file.filename, max_downloads, expires_in_hours,
+    )
     
     # Rate limiting
     client_ip = request.client.host
-    if not check_rate_limit(client_ip):
+    with timed("rate_limit"):
+        allowed = await run_blocking(check_rate_limit, client_ip)
+    if not allowed:
         raise HTTPException(
             status_code=429,
-            detail=f"Rate limit exceeded. Maximum {RATE_LIMIT_PER_IP} uploads per hour per IP"
+            detail=f"Rate limit exceeded. Maximum {settings.rate_limit_uploads} uploads per hour per IP"
         )
     
     # File validation
-    MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
     ALLOWED_CONTENT_TYPES = [
         'image/', 'text/', 'application/pdf', 'application/zip',
         'application/json', 'application/msword', 'application/vnd.openxmlformats',
         'video/', 'audio/'
     ]
     
-    # Read file content first to check size
-    file_content = await file.read()
-    file_size = len(file_content)
-    
-    if file_size > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum size is {MAX_FILE_SIZE // 1024 // 1024}MB"
-        )
-    
-    if file_size == 0:
-        raise HTTPException(
-            status_code=400,
-            detail="Empty file not allowed"
-        )
-    
     content_type = file.content_type or ""
     if not any(content_type.startswith(allowed) for allowed in ALLOWED_CONTENT_TYPES):
         raise HTTPException(
@@ -209,22 +347,13 @@ async def upload_file(
             detail="Server not configured: missing S3_BUCKET_NAME or DDB_TABLE_NAME",
         )
 
-    # LocalStack: auto-create bucket and table if enabled
-    if settings.use_localstack and settings.auto_create_localstack_resources:
-        ensure_bucket_exists(
-            bucket=settings.s3_bucket_name,
-            region_name=settings.aws_region,
-            endpoint_url=settings.localstack_endpoint_url,
-            force_path_style=settings.s3_force_path_style,
-        )
-        ensure_table_exists(
-            table_name=settings.ddb_table_name,
-            region_name=settings.aws_region,
-            endpoint_url=settings.localstack_endpoint_url,
-        )
+    # LocalStack: auto-create bucket and table (once per process)
+    if not resources_ready():
+        await run_blocking(ensure_resources, settings)
 
     file_id = str(uuid.uuid4())
     s3_key = f"uploads/{file_id}/{file.filename}"
+    bind(file_id=file_id)
 
     # Upload file directly to S3
     s3 = get_s3_client(
@@ -233,34 +362,115 @@ async def upload_file(
         force_path_style=settings.s3_force_path_style,
     )
     
-    print(f"File content length: {file_size} bytes")
-    print(f"File content preview: {file_content[:100] if file_content else 'EMPTY'}")
-    s3.put_object(
-        Bucket=settings.s3_bucket_name,
-        Key=s3_key,
-        Body=file_content,
-        ContentType=file.content_type or "application/octet-stream",
-    )
-
     # Compute expiry
     now = datetime.now(tz=timezone.utc)
     expires_at = now + timedelta(hours=expires_in_hours)
     expires_at_epoch = int(expires_at.timestamp())
+    tier_days = _expiry_tier(expires_in_hours)
+    tagging = tier_tagging(tier_days)
 
-    # Write metadata
-    put_file_metadata(
-        table_name=settings.ddb_table_name,
-        region_name=settings.aws_region,
-        endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
-        item={
+    # Identical content is stored once; see db_utils.acquire_content_object
+    content = {}
+
+    async def acquire_content(sha256: str, size: int) -> Optional[str]:
+        content["key"], content["reused"] = await run_blocking(
+            acquire_content_object,
+            table_name=settings.ddb_table_name,
+            region_name=settings.aws_region,
+            sha256=sha256,
+            s3_key=s3_key,
+            size=size,
+            keep_until_epoch=expires_at_epoch,
+            lifetime_seconds=object_lifetime_seconds(tier_days, settings.file_retention_days),
+            now_epoch=int(now.timestamp()),
+            endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+        )
+        content["sha256"] = sha256
+        return content["key"] if content["reused"] else None
+
+    # Stream the body to S3 in chunks; size limits are enforced while reading
+    try:
+        try:
+            with timed("s3_upload"):
+                result = await stream_upload_to_s3(
+                    upload=file,
+                    s3=s3,
+                    bucket=settings.s3_bucket_name,
+                    key=s3_key,
+                    content_type=file.content_type or "application/octet-stream",
+                    max_size=settings.max_file_size_bytes,
+                    chunk_size=settings.upload_chunk_size_bytes,
+                    extra_args={"Tagging": tagging} if tagging else None,
+                    find_existing=acquire_content if settings.content_dedup else None,
+                    content_encoding=encoding_for(content_type, settings.compress_content_types),
+                    compress_level=settings.compress_level,
+                    compress_max_ratio=settings.compress_max_ratio,
+                )
+        except UploadTooLargeError:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size is {settings.max_file_size_bytes // 1024 // 1024}MB"
+            )
+        except EmptyUploadError:
+            raise HTTPException(
+                status_code=400,
+                detail="Empty file not allowed"
+            )
+        logger.debug("File content length: %s bytes, stored with encoding %s", result.size, result.encoding)
+
+        if settings.content_dedup:
+            registry = get_registry()
+            if result.reused:
+                registry.inc(DEDUP_HITS_TOTAL)
+                registry.inc(DEDUP_BYTES_SAVED_TOTAL, result.size, kind="storage")
+                registry.inc(DEDUP_BYTES_SAVED_TOTAL, result.size, kind="put")
+            elif not content:
+                # Multipart bodies are only hashed once stored; drop the copy if it is a duplicate
+                await acquire_content(result.sha256, result.size)
+                if content["reused"]:
+                    await run_blocking(
+                        delete_s3_object,
+                        bucket=settings.s3_bucket_name,
+                        key=s3_key,
+                        region_name=settings.aws_region,
+                        endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+                        force_path_style=settings.s3_force_path_style,
+                    )
+                    registry.inc(DEDUP_HITS_TOTAL)
+                    registry.inc(DEDUP_BYTES_SAVED_TOTAL, result.size, kind="storage")
+
+        # Write metadata
+        item = {
             "file_id": file_id,
             "filename": file.filename,
-            "s3_key": s3_key,
+            "s3_key": content.get("key", s3_key),
             "max_downloads": max_downloads,
             "downloads": 0,
             "expires_at_epoch": expires_at_epoch,
-        },
-    )
+            "object_present": True,
+        }
+        if content:
+            item["content_sha256"] = content["sha256"]
+        with timed("metadata_write"):
+            await run_blocking(
+                put_file_metadata,
+                table_name=settings.ddb_table_name,
+                region_name=settings.aws_region,
+                endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+                item=item,
+            )
+    except BaseException:
+        # Give back a reference taken for an upload that did not complete
+        if content:
+            await run_blocking(
+                release_content_object,
+                table_name=settings.ddb_table_name,
+                region_name=settings.aws_region,
+                sha256=content["sha256"],
+                s3_key=content["key"],
+                endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+            )
+        raise
 
     download_page_url = f"{settings.frontend_base_url.rstrip('/')}/file/{file_id}"
     return {
@@ -270,191 +480,430 @@ async def upload_file(
     }
 
 
-@app.get("/file-info", response_model=DownloadResponse)
-def get_file_info(file_id: str = Query(..., min_length=1)) -> DownloadResponse:
-    """Get file information without incrementing download count."""
-    if not settings.s3_bucket_name or not settings.ddb_table_name:
-        raise HTTPException(status_code=500, detail="Server is not configured")
-
+def _get_pending_multipart_item(file_id: str) -> dict:
+    """Load the metadata item of a multipart upload that is still in progress."""
+    bind(file_id=file_id)
     item = get_file_metadata(
         table_name=settings.ddb_table_name,
         region_name=settings.aws_region,
         endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
         file_id=file_id,
     )
-    if not item:
-        return DownloadResponse(status="not_found", message="File not found")
-
-    now_epoch = int(datetime.now(tz=timezone.utc).timestamp())
-    filename = item.get("filename")
-    max_downloads = int(item.get("max_downloads", 0))
-    downloads = int(item.get("downloads", 0))
-    expires_at_epoch = int(item.get("expires_at_epoch", 0))
-
-    if now_epoch >= expires_at_epoch:
-        return DownloadResponse(
-            status="expired",
-            message="This link has expired.",
-            filename=filename,
-            remaining_downloads=max(0, max_downloads - downloads),
-            expires_at_iso=datetime.fromtimestamp(expires_at_epoch, tz=timezone.utc).isoformat() + "Z",
-        )
+    if not item or item.get("upload_status") != "pending" or not item.get("upload_id"):
+        raise HTTPException(status_code=404, detail="No multipart upload in progress for this file")
+    return item
 
-    if downloads >= max_downloads:
-        return DownloadResponse(
-            status="maxed",
-            message="Maximum download limit reached.",
-            filename=filename,
-            remaining_downloads=0,
-            expires_at_iso=datetime.fromtimestamp(expires_at_epoch, tz=timezone.utc).isoformat() + "Z",
-        )
 
-    # File is available for download
-    return DownloadResponse(
-        status="ok",
-        message="File is available for download.",
-        filename=filename,
-        remaining_downloads=max(0, max_downloads - downloads),
-        expires_at_iso=datetime.fromtimestamp(expires_at_epoch, tz=timezone.utc).isoformat() + "Z",
+def _abort_multipart(file_id: str, item: dict) -> None:
+    """Discard the parts of a pending multipart upload and mark its item aborted."""
+    abort_multipart_upload(
+        bucket=settings.s3_bucket_name,
+        key=item["s3_key"],
+        upload_id=item["upload_id"],
+        region_name=settings.aws_region,
+        endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+        force_path_style=settings.s3_force_path_style,
+    )
+    mark_upload_finished(
+        table_name=settings.ddb_table_name,
+        region_name=settings.aws_region,
+        file_id=file_id,
+        upload_id=item["upload_id"],
+        upload_status="aborted",
+        endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
     )
 
 
-@app.get("/download", response_model=DownloadResponse)
-def download(file_id: str = Query(..., min_length=1)) -> DownloadResponse:
+@app.post("/multipart/initiate", response_model=MultipartInitResponse)
+def initiate_multipart_upload(req: MultipartInitRequest) -> MultipartInitResponse:
+    """Start a multipart upload so the client can push parts in parallel."""
     if not settings.s3_bucket_name or not settings.ddb_table_name:
-        raise HTTPException(status_code=500, detail="Server is not configured")
+        raise HTTPException(
+            status_code=500,
+            detail="Server not configured: missing S3_BUCKET_NAME or DDB_TABLE_NAME",
+        )
 
-    item = get_file_metadata(
+    if req.size_bytes > settings.max_file_size_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size is {settings.max_file_size_bytes // 1024 // 1024}MB"
+        )
+
+    # LocalStack: auto-create bucket and table (once per process)
+    ensure_resources(settings)
+
+    file_id = str(uuid.uuid4())
+    s3_key = f"uploads/{file_id}/{req.filename}"
+    bind(file_id=file_id)
+    upload_id = create_multipart_upload(
+        bucket=settings.s3_bucket_name,
+        key=s3_key,
+        region_name=settings.aws_region,
+        content_type=req.content_type,
+        endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+        force_path_style=settings.s3_force_path_style,
+        tagging=tier_tagging(_expiry_tier(req.expires_in_hours)),
+    )
+
+    now = datetime.now(tz=timezone.utc)
+    expires_at = now + timedelta(hours=req.expires_in_hours)
+    put_file_metadata(
         table_name=settings.ddb_table_name,
         region_name=settings.aws_region,
         endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+        item={
+            "file_id": file_id,
+            "filename": req.filename,
+            "s3_key": s3_key,
+            "max_downloads": int(req.max_downloads),
+            "downloads": 0,
+            "expires_at_epoch": int(expires_at.timestamp()),
+            "upload_id": upload_id,
+            "upload_status": "pending",
+        },
+    )
+
+    return MultipartInitResponse(
         file_id=file_id,
+        upload_id=upload_id,
+        s3_key=s3_key,
+        download_page_url=f"{settings.frontend_base_url.rstrip('/')}/file/{file_id}",
     )
-    if not item:
-        return DownloadResponse(status="not_found", message="File not found")
 
-    print(f"Retrieved item: {item}")
-    now_epoch = int(datetime.now(tz=timezone.utc).timestamp())
-    filename = item.get("filename")
-    s3_key = item.get("s3_key")
-    max_downloads = int(item.get("max_downloads", 0))
-    downloads = int(item.get("downloads", 0))
-    expires_at_epoch = int(item.get("expires_at_epoch", 0))
-
-    print(f"File info: max_downloads={max_downloads}, downloads={downloads}, expires_at_epoch={expires_at_epoch}, now_epoch={now_epoch}")
-
-    if now_epoch >= expires_at_epoch:
-        print("File has expired")
-        return DownloadResponse(
-            status="expired",
-            message="This link has expired.",
-            filename=filename,
-            remaining_downloads=max(0, max_downloads - downloads),
-            expires_at_iso=datetime.fromtimestamp(expires_at_epoch, tz=timezone.utc).isoformat() + "Z",
-        )
 
-    if downloads >= max_downloads:
-        print("Maximum downloads reached")
-        return DownloadResponse(
-            status="maxed",
-            message="Maximum download limit reached.",
-            filename=filename,
-            remaining_downloads=0,
-            expires_at_iso=datetime.fromtimestamp(expires_at_epoch, tz=timezone.utc).isoformat() + "Z",
+@app.post("/multipart/parts", response_model=MultipartPartsResponse)
+def presign_multipart_parts(req: MultipartPartsRequest) -> MultipartPartsResponse:
+    """Presign upload URLs for a batch of parts; failed parts can be re-requested alone."""
+    item = _get_pending_multipart_item(req.file_id)
+    urls = create_presigned_part_urls(
+        bucket=settings.s3_bucket_name,
+        key=item["s3_key"],
+        upload_id=item["upload_id"],
+        part_numbers=sorted(set(req.part_numbers)),
+        expires_in_seconds=settings.presigned_upload_ttl_seconds,
+        region_name=settings.aws_region,
+        endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+        force_path_style=settings.s3_force_path_style,
+    )
+    return MultipartPartsResponse(
+        file_id=req.file_id,
+        parts=[MultipartPartUrl(part_number=n, upload_url=url) for n, url in urls.items()],
+    )
+
+
+@app.post("/multipart/complete")
+def finish_multipart_upload(req: MultipartCompleteRequest) -> dict:
+    """Assemble the uploaded parts and make the file available for download."""
+    item = _get_pending_multipart_item(req.file_id)
+    endpoint_url = settings.localstack_endpoint_url if settings.use_localstack else None
+    # The declared size is only a hint; the parts themselves were PUT straight to S3
+    size = multipart_upload_size(
+        bucket=settings.s3_bucket_name,
+        key=item["s3_key"],
+        upload_id=item["upload_id"],
+        part_numbers=[p.part_number for p in req.parts],
+        region_name=settings.aws_region,
+        endpoint_url=endpoint_url,
+        force_path_style=settings.s3_force_path_style,
+    )
+    if size > settings.max_file_size_bytes:
+        _abort_multipart(req.file_id, item)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size is {settings.max_file_size_bytes // 1024 // 1024}MB"
+        )
+    try:
+        complete_multipart_upload(
+            bucket=settings.s3_bucket_name,
+            key=item["s3_key"],
+            upload_id=item["upload_id"],
+            parts=[{"PartNumber": p.part_number, "ETag": p.etag} for p in req.parts],
+            region_name=settings.aws_region,
+            endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+            force_path_style=settings.s3_force_path_style,
         )
+    except ClientError as e:
+        logger.warning("Failed to complete multipart upload: %s", e)
+        raise HTTPException(status_code=400, detail="Could not complete upload; check part numbers and ETags")
 
-    print(f"Attempting to increment downloads from {downloads} to {downloads + 1}")
-    # Attempt atomic increment; if it fails due to race/expiry, return appropriate status
-    new_count = try_increment_downloads(
+    mark_upload_finished(
         table_name=settings.ddb_table_name,
         region_name=settings.aws_region,
-        file_id=file_id,
-        now_epoch=now_epoch,
+        file_id=req.file_id,
+        upload_id=item["upload_id"],
+        upload_status="complete",
         endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
     )
-    print(f"Increment result: {new_count}")
-    if new_count is None:
-        # Either expired or maxed out in the meantime
-        print("Increment failed, rechecking metadata")
-        item = get_file_metadata(
+    return {
+        "file_id": req.file_id,
+        "download_page_url": f"{settings.frontend_base_url.rstrip('/')}/file/{req.file_id}",
+        "message": "File uploaded successfully",
+    }
+
+
+@app.post("/multipart/abort")
+def cancel_multipart_upload(req: MultipartAbortRequest) -> dict:
+    """Abort an in-progress multipart upload and discard its parts."""
+    item = _get_pending_multipart_item(req.file_id)
+    _abort_multipart(req.file_id, item)
+    return {"file_id": req.file_id, "message": "Upload aborted"}
+
+
+@app.get("/file-info", response_model=DownloadResponse)
+@fast_response
+@count_status("file_info")
+async def get_file_info(
+    request: Request,
+    response: Response,
+    file_id: str = Query(..., min_length=1),
+) -> DownloadResponse:
+    """
+    Get file information without incrementing download count.
+
+    Answers carry a strong ETag and a short Cache-Control max-age, so
+    polling clients and caches in front of the API can revalidate with
+    If-None-Match and receive 304 Not Modified.
+    """
+    if not settings.s3_bucket_name or not settings.ddb_table_name:
+        raise HTTPException(status_code=500, detail="Server is not configured")
+
+    with timed("metadata_read"):
+        item = await get_file_metadata_async(
             table_name=settings.ddb_table_name,
             region_name=settings.aws_region,
             endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
             file_id=file_id,
-        ) or {}
-        downloads = int(item.get("downloads", downloads))
-        max_downloads = int(item.get("max_downloads", max_downloads))
-        expires_at_epoch = int(item.get("expires_at_epoch", expires_at_epoch))
+        )
+    now_epoch = int(datetime.now(tz=timezone.utc).timestamp())
+    record = to_record(item)
+    status = evaluate_status(record, now_epoch)
+    headers = {"Cache-Control": cache_control(record, status, now_epoch, settings.file_info_max_age_seconds)}
+    etag = status_etag(record, status)
+    if etag is not None:
+        headers["ETag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return status_response(record, status, now_iso())
+
+
+@app.post("/file-info/batch", response_model=BatchFileInfoResponse)
+async def get_file_info_batch(req: BatchFileInfoRequest) -> BatchFileInfoResponse:
+    """Get information for up to 100 files with batched DynamoDB reads."""
+    if not settings.s3_bucket_name or not settings.ddb_table_name:
+        raise HTTPException(status_code=500, detail="Server is not configured")
 
-        if int(datetime.now(tz=timezone.utc).timestamp()) >= expires_at_epoch:
-            return DownloadResponse(status="expired", message="This link has expired.", filename=filename)
-        return DownloadResponse(status="maxed", message="Maximum download limit reached.", filename=filename)
+    with timed("metadata_read"):
+        items = await batch_get_file_metadata_async(
+            table_name=settings.ddb_table_name,
+            region_name=settings.aws_region,
+            endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+            file_ids=req.file_ids,
+        )
 
-    # Check if file still exists in S3 (might have been deleted after reaching max downloads)
-    file_exists = check_s3_object_exists(
-        bucket=settings.s3_bucket_name,
-        key=s3_key,
-        region_name=settings.aws_region,
-        endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
-        force_path_style=settings.s3_force_path_style,
-    )
-    
-    if not file_exists:
-        print(f"File {s3_key} no longer exists in S3 (likely deleted after reaching max downloads)")
-        return DownloadResponse(
-            status="maxed", 
-            message="This file has reached its download limit and is no longer available.", 
-            filename=filename,
-            remaining_downloads=0,
+    # Evaluate every entry against the same clock
+    now_epoch = int(datetime.now(tz=timezone.utc).timestamp())
+    files = describe_items(items, req.file_ids, now_epoch)
+    registry = get_registry()
+    for response in files.values():
+        registry.inc(RESPONSE_STATUS_TOTAL, endpoint="file_info_batch", status=response.status)
+    return BatchFileInfoResponse(files=files)
+
+
+async def _existing_keys(keys: list) -> set:
+    """The keys among `keys` that exist in the bucket, checked concurrently."""
+    endpoint_url = settings.localstack_endpoint_url if settings.use_localstack else None
+    with timed("s3_head"):
+        exists = await asyncio.gather(*(
+            run_blocking(
+                check_s3_object_exists,
+                bucket=settings.s3_bucket_name,
+                key=key,
+                region_name=settings.aws_region,
+                endpoint_url=endpoint_url,
+                force_path_style=settings.s3_force_path_style,
+            )
+            for key in keys
+        ))
+    return {key for key, found in zip(keys, exists) if found}
+
+
+@app.get("/download", response_model=DownloadResponse)
+@fast_response
+@count_status("download")
+async def download(file_id: str = Query(..., min_length=1)) -> DownloadResponse:
+    if not settings.s3_bucket_name or not settings.ddb_table_name:
+        raise HTTPException(status_code=500, detail="Server is not configured")
+
+    now_epoch = int(datetime.now(tz=timezone.utc).timestamp())
+    # Check and consume a download in one conditional update
+    with timed("claim"):
+        status, item = await claim_download_async(
+            table_name=settings.ddb_table_name,
+            region_name=settings.aws_region,
+            file_id=file_id,
+            now_epoch=now_epoch,
+            endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
         )
+    record = to_record(item)
+    present = None
+    if status == "ok" and not item.get("object_present"):
+        # Presigned uploads are not confirmed; see once whether the client sent the object
+        keys = item_s3_keys(item)
+        present = await _existing_keys(keys)
+        if not present:
+            await run_blocking(
+                release_download,
+                table_name=settings.ddb_table_name,
+                region_name=settings.aws_region,
+                file_id=file_id,
+                endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+            )
+            status = "not_found"
+        elif len(present) == len(keys):
+            await run_blocking(
+                mark_object_present,
+                table_name=settings.ddb_table_name,
+                region_name=settings.aws_region,
+                file_id=file_id,
+                endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
+            )
+    bind(outcome=status)
+    if status != "ok":
+        return status_response(record, status, now_iso())
 
-    # Check if this will be the last allowed download
-    remaining_downloads = max(0, max_downloads - new_count)
+    # The claim already counted this download
+    remaining_downloads = record.remaining_downloads
     
-    # Generate presigned download URL
-    print(f"Generating presigned download URL for bucket={settings.s3_bucket_name}, key={s3_key}")
-    download_url = create_presigned_download_url(
+    # Generate presigned download URLs; a bundle counts as one download
+    presign_kwargs = dict(
         bucket=settings.s3_bucket_name,
-        key=s3_key,
         expires_in_seconds=settings.presigned_download_ttl_seconds,
         region_name=settings.aws_region,
         endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
         force_path_style=settings.s3_force_path_style,
+        fast_presign=settings.fast_presign,
+        cache_fraction=settings.presign_cache_fraction,
     )
-    print(f"Generated download URL: {download_url}")
+    download_url = None
+    files = None
+    if record.files is not None:
+        files = [
+            construct(BundleFileEntry, filename=f["filename"], download_url=create_presigned_download_url(key=f["s3_key"], **presign_kwargs))
+            for f in record.files
+            if present is None or f["s3_key"] in present
+        ]
+    else:
+        # Deduplicated objects may be stored under another upload's filename
+        download_url = create_presigned_download_url(
+            key=record.s3_key,
+            filename=record.filename if item.get("content_sha256") else None,
+            **presign_kwargs,
+        )
     
     # If this was the last allowed download, schedule deletion after a short delay
     # This gives the user time to download before the file is deleted
     if remaining_downloads == 0:
-        print(f"Maximum downloads reached ({new_count}/{max_downloads}). Will delete file from S3 after download...")
-        # Note: In production, you might want to use a background task or queue for this
-        # For now, we'll delete immediately since presigned URLs have a short expiry
-        import threading
-        import time
-        
-        def delayed_delete():
-            time.sleep(10)  # Wait 10 seconds for download to complete
-            delete_success = delete_s3_object(
-                bucket=settings.s3_bucket_name,
-                key=s3_key,
-                region_name=settings.aws_region,
-                endpoint_url=(settings.localstack_endpoint_url if settings.use_localstack else None),
-                force_path_style=settings.s3_force_path_style,
-            )
-            if delete_success:
-                print(f"[OK] File {s3_key} successfully deleted from S3 after download completion")
-            else:
-                print(f"[WARNING] Failed to delete file {s3_key} from S3 after download completion")
-        
-        # Start background deletion
-        threading.Thread(target=delayed_delete, daemon=True).start()
+        logger.debug("Maximum downloads reached (%s/%s); scheduling deletion", record.downloads, record.max_downloads)
+        with timed("schedule_deletion"):
+            await run_blocking(get_deletion_queue().schedule_item, file_id, item)
     
-    return DownloadResponse(
+    return construct(
+        DownloadResponse,
         status="ok",
-        filename=filename,
+        filename=record.filename,
         download_url=download_url,
         remaining_downloads=remaining_downloads,
-        expires_at_iso=datetime.fromtimestamp(expires_at_epoch, tz=timezone.utc).isoformat() + "Z",
+        expires_at_iso=record.expires_at_iso,
+        now_iso=now_iso(),
+        files=files,
     )
 
 
+def _zip_members(item: dict) -> list:
+    """The (filename, s3_key) entries of a bundle, or of a single file."""
+    if "files" in item:
+        return item["files"]
+    return [{"filename": item.get("filename"), "s3_key": item.get("s3_key")}]
+
+
+@app.get("/download-zip")
+async def download_zip(file_id: str = Query(..., min_length=1)) -> StreamingResponse:
+    """Stream a file or bundle as one ZIP archive; counts as one download."""
+    if not settings.s3_bucket_name or not settings.ddb_table_name:
+        raise HTTPException(status_code=500, detail="Server is not configured")
+
+    now_epoch = int(datetime.now(tz=timezone.utc).timestamp())
+    endpoint_url = settings.localstack_endpoint_url if settings.use_localstack else None
+
+    # Bundle members may never have been uploaded; find out before a download is used up
+    with timed("metadata_read"):
+        current = await get_file_metadata_async(
+            table_name=settings.ddb_table_name,
+            region_name=settings.aws_region,
+            endpoint_url=endpoint_url,
+            file_id=file_id,
+        )
+    present = None
+    if evaluate_status(to_record(current), now_epoch) == "ok" and not current.get("object_present"):
+        keys = [f["s3_key"] for f in _zip_members(current)]
+        present = await _existing_keys(keys)
+        if len(present) == len(keys):
+            await run_blocking(
+                mark_object_present,
+                table_name=settings.ddb_table_name,
+                region_name=settings.aws_region,
+                file_id=file_id,
+                endpoint_url=endpoint_url,
+            )
+        if not present:
+            bind(outcome="not_found")
+            get_registry().inc(RESPONSE_STATUS_TOTAL, endpoint="download_zip", status="not_found")
+            raise HTTPException(status_code=404, detail="File not found")
+
+    with timed("claim"):
+        status, item = await claim_download_async(
+            table_name=settings.ddb_table_name,
+            region_name=settings.aws_region,
+            file_id=file_id,
+            now_epoch=now_epoch,
+            endpoint_url=endpoint_url,
+        )
+    bind(outcome=status)
+    get_registry().inc(RESPONSE_STATUS_TOTAL, endpoint="download_zip", status=status)
+    if status == "not_found":
+        raise HTTPException(status_code=404, detail="File not found")
+    if status == "expired":
+        raise HTTPException(status_code=410, detail="This link has expired.")
+    if status == "maxed":
+        raise HTTPException(status_code=410, detail="Maximum download limit reached.")
+
+    files = [f for f in _zip_members(item) if present is None or f["s3_key"] in present]
+    names = unique_names(f["filename"] or "file" for f in files)
+    # A member deleted since the check is left out rather than breaking the stream
+    entries = [
+        (name, functools.partial(
+            open_s3_object_ranges,
+            bucket=settings.s3_bucket_name,
+            key=f["s3_key"],
+            range_size=settings.zip_range_size_bytes,
+            region_name=settings.aws_region,
+            endpoint_url=endpoint_url,
+            force_path_style=settings.s3_force_path_style,
+            missing_ok=True,
+        ))
+        for name, f in zip(names, files)
+    ]
+
+    # Delete only after the archive has been sent, however long that takes
+    background = None
+    if to_record(item).remaining_downloads == 0:
+        background = BackgroundTask(get_deletion_queue().schedule_item, file_id, item)
+
+    archive_name = (item.get("filename") or file_id).rsplit(".", 1)[0] + ".zip"
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(archive_name)}"},
+        background=background,
+    )
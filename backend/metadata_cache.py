@@ -0,0 +1,157 @@
+"""In-process TTL + LRU cache for file metadata items."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import get_settings
+from metrics import METADATA_CACHE_HITS_TOTAL, METADATA_CACHE_MISSES_TOTAL, get_registry
+
+
+# Fields that change after the item is written; everything else (filename,
+# s3_key, max_downloads, expires_at_epoch, ...) is fixed at upload time.
+MUTABLE_FIELDS = frozenset({"downloads", "upload_status", "upload_id", "object_deleted"})
+
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+class _Entry:
+    __slots__ = ("item", "size", "expires_at", "mutable_expires_at")
+
+    def __init__(self, item: Dict[str, Any], size: int, expires_at: float, mutable_expires_at: float):
+        self.item = item
+        self.size = size
+        self.expires_at = expires_at
+        self.mutable_expires_at = mutable_expires_at
+
+
+def _estimate_size(item: Dict[str, Any]) -> int:
+    return _ENTRY_OVERHEAD_BYTES + sum(len(str(k)) + len(str(v)) for k, v in item.items())
+
+
+class MetadataCache:
+    """
+    Read-through cache in front of get_file_metadata.
+
+    Entries are bounded both by count and by an estimate of their size and
+    evicted least-recently-used first. Immutable fields are trusted for
+    `ttl_seconds`; mutable ones such as `downloads` only for
+    `mutable_ttl_seconds`, after which a full read has to go to DynamoDB.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        mutable_ttl_seconds: float,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.mutable_ttl_seconds = mutable_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, table_name: str, file_id: str, immutable_only: bool = False) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached item, or None on a miss."""
+        if not self.enabled:
+            return None
+        key = (table_name, file_id)
+        now = time.monotonic()
+        item = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+            elif not immutable_only and entry.mutable_expires_at <= now:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                item = dict(entry.item)
+        get_registry().inc(METADATA_CACHE_HITS_TOTAL if item is not None else METADATA_CACHE_MISSES_TOTAL)
+        return item
+
+    def put(self, table_name: str, file_id: str, item: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        key = (table_name, file_id)
+        now = time.monotonic()
+        entry = _Entry(
+            dict(item),
+            _estimate_size(item),
+            now + self.ttl_seconds,
+            now + min(self.mutable_ttl_seconds, self.ttl_seconds),
+        )
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def update_fields(self, table_name: str, file_id: str, fields: Dict[str, Any]) -> None:
+        """Write-through an update that is known to have succeeded."""
+        if not self.enabled:
+            return
+        key = (table_name, file_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.item.update(fields)
+            entry.mutable_expires_at = min(time.monotonic() + self.mutable_ttl_seconds, entry.expires_at)
+
+    def invalidate(self, table_name: str, file_id: str) -> None:
+        with self._lock:
+            self._remove((table_name, file_id))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+
+_cache: Optional[MetadataCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_metadata_cache() -> MetadataCache:
+    """Return the process-wide metadata cache, configured from Settings."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                settings = get_settings()
+                _cache = MetadataCache(
+                    max_entries=settings.metadata_cache_max_entries,
+                    max_bytes=settings.metadata_cache_max_bytes,
+                    ttl_seconds=settings.metadata_cache_ttl_seconds,
+                    mutable_ttl_seconds=settings.metadata_cache_downloads_ttl_seconds,
+                )
+    return _cache
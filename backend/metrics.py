@@ -0,0 +1,353 @@
+"""In-process latency histograms and counters.
+
+Exposed in Prometheus text format through /metrics and, on Lambda, as one
+CloudWatch Embedded Metric Format (EMF) line per request. Recording a value
+is a dict lookup and a few integer increments under a lock, so it stays on
+in production.
+
+Three sources feed the registry:
+
+- MetricsMiddleware: one duration per request, labelled by route and status.
+- timed(): per-stage durations inside handlers (presign, metadata write, ...).
+- instrument_client(): botocore event hooks on the pooled clients that time
+  every AWS API call by service and operation.
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import get_settings
+
+
+# Seconds; tuned for calls between a cache hit and a slow S3 upload
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = "http_request_duration_seconds"
+STAGE_SECONDS = "stage_duration_seconds"
+AWS_CALL_SECONDS = "aws_call_duration_seconds"
+RESPONSE_STATUS_TOTAL = "file_response_status_total"
+DEDUP_HITS_TOTAL = "dedup_hits_total"
+DEDUP_BYTES_SAVED_TOTAL = "dedup_bytes_saved_total"
+METADATA_CACHE_HITS_TOTAL = "metadata_cache_hits_total"
+METADATA_CACHE_MISSES_TOTAL = "metadata_cache_misses_total"
+DELETIONS_TOTAL = "deletion_queue_deleted_total"
+DELETION_FAILURES_TOTAL = "deletion_queue_failed_total"
+
+_HELP = {
+    REQUEST_SECONDS: "Request latency by route and HTTP status.",
+    STAGE_SECONDS: "Latency of handler stages by route and stage.",
+    AWS_CALL_SECONDS: "Latency of AWS API calls, retries included.",
+    RESPONSE_STATUS_TOTAL: "File responses by endpoint and DownloadResponse.status.",
+    DEDUP_HITS_TOTAL: "Uploads whose content was already stored.",
+    DEDUP_BYTES_SAVED_TOTAL: "Bytes not stored (storage) or not sent to S3 (put) thanks to dedup.",
+    METADATA_CACHE_HITS_TOTAL: "Metadata reads answered from the in-process cache.",
+    METADATA_CACHE_MISSES_TOTAL: "Metadata reads the in-process cache could not answer.",
+    DELETIONS_TOTAL: "S3 objects deleted by the deletion queue.",
+    DELETION_FAILURES_TOTAL: "S3 deletions that failed (and were retried or given up).",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+def _route_of(scope: Dict[str, Any]) -> str:
+    """The matched route template, e.g. /download; never the raw path."""
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+class _RequestMetrics:
+    """Stage and AWS call durations of one request, for its EMF line."""
+
+    __slots__ = ("scope", "durations")
+
+    def __init__(self, scope: Dict[str, Any]):
+        # The router fills in scope["route"] before any handler stage runs
+        self.scope = scope
+        self.durations: Dict[str, float] = {}
+
+    @property
+    def route(self) -> str:
+        return _route_of(self.scope)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+
+_request: contextvars.ContextVar[Optional[_RequestMetrics]] = contextvars.ContextVar("request_metrics", default=None)
+
+
+class MetricsRegistry:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                # One slot per bucket plus +Inf
+                histogram = series[key] = _Histogram(len(self.buckets) + 1)
+            histogram.counts[index] += 1
+            histogram.total += seconds
+            histogram.count += 1
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def render_prometheus(self) -> str:
+        """Render every series in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                _header(lines, name, "counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+            for name, series in sorted(self._gauges.items()):
+                _header(lines, name, "gauge")
+                for key, value in series.items():
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+            for name, series in sorted(self._histograms.items()):
+                _header(lines, name, "histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(key, le=_number(bound))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(key, le='+Inf')} {histogram.count}")
+                    lines.append(f"{name}_sum{_labels(key)} {histogram.total:.6f}")
+                    lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _header(lines: List[str], name: str, kind: str) -> None:
+    if name in _HELP:
+        lines.append(f"# HELP {name} {_HELP[name]}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def _labels(key: LabelKey, **extra: str) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = MetricsRegistry()
+    return _registry
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    request = _request.get()
+    route = request.route if request is not None else ""
+    get_registry().observe(STAGE_SECONDS, seconds, route=route, stage=stage)
+    if request is not None:
+        request.add(f"stage.{stage}", seconds)
+
+
+class timed:
+    """
+    Time a handler stage, as a context manager or as a decorator on sync or
+    async functions:
+
+        with timed("metadata_write"):
+            put_file_metadata(...)
+
+        @timed("presign")
+        def create_presigned_upload_url(...): ...
+    """
+
+    __slots__ = ("stage", "_started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._started = 0.0
+
+    def __enter__(self) -> "timed":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if _METRICS_ON:
+            record_stage(self.stage, time.perf_counter() - self._started)
+
+    def __call__(self, func: Callable) -> Callable:
+        stage = self.stage
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def count_status(endpoint: str) -> Callable:
+    """
+    Count the `status` of the DownloadResponse an async route returns.
+    Plain responses (e.g. a 304) are counted as their HTTP status code.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            response = await func(*args, **kwargs)
+            if _METRICS_ON:
+                status = getattr(response, "status", None) or str(response.status_code)
+                get_registry().inc(RESPONSE_STATUS_TOTAL, endpoint=endpoint, status=status)
+            return response
+        return wrapper
+    return decorator
+
+
+def _before_aws_call(model, context, **kwargs) -> None:
+    context["metrics_started"] = time.perf_counter()
+
+
+def _after_aws_call(model, context, **kwargs) -> None:
+    started = context.pop("metrics_started", None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    service = model.service_model.service_name
+    get_registry().observe(AWS_CALL_SECONDS, seconds, service=service, operation=model.name)
+    request = _request.get()
+    if request is not None:
+        request.add(f"aws.{service}.{model.name}", seconds)
+
+
+def instrument_client(client) -> None:
+    """Time every API call made through `client` (retries included)."""
+    if not _METRICS_ON:
+        return
+    events = client.meta.events
+    events.register("before-call.*.*", _before_aws_call)
+    events.register("after-call.*.*", _after_aws_call)
+    events.register("after-call-error.*.*", _after_aws_call)
+
+
+def _emf_enabled(setting: str) -> bool:
+    if setting == "auto":
+        return bool(os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+    return setting in {"1", "true", "yes"}
+
+
+def emf_line(namespace: str, route: str, status: int, seconds: float, durations: Dict[str, float]) -> str:
+    """Build a CloudWatch EMF record with the request's durations in milliseconds."""
+    values: Dict[str, Any] = {"duration": round(seconds * 1000, 3)}
+    for name, value in durations.items():
+        values[name] = round(value * 1000, 3)
+    record: Dict[str, Any] = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": namespace,
+                "Dimensions": [["route"]],
+                "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in values],
+            }],
+        },
+        "route": route,
+        "status": status,
+    }
+    record.update(values)
+    return json.dumps(record, separators=(",", ":"))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that times each request and collects the stage and AWS
+    call durations recorded while it runs. Unmatched paths are folded into a
+    single "unmatched" route to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        settings = get_settings()
+        self.namespace = settings.metrics_namespace
+        self.emf = _emf_enabled(settings.metrics_emf)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _METRICS_ON:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        request = _RequestMetrics(scope)
+        token = _request.set(request)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request.reset(token)
+            seconds = time.perf_counter() - started
+            route = _route_of(scope)
+            get_registry().observe(REQUEST_SECONDS, seconds, route=route, method=scope.get("method", ""), status=str(status))
+            if self.emf:
+                sys.stdout.write(emf_line(self.namespace, route, status, seconds, request.durations) + "\n")
+
+
+_METRICS_ON = get_settings().metrics_enabled
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, conint
 
 
 class UploadInitRequest(BaseModel):
@@ -21,6 +21,11 @@ class DownloadQuery(BaseModel):
     file_id: str
 
 
+class BundleFileEntry(BaseModel):
+    filename: str
+    download_url: Optional[str] = None
+
+
 class DownloadResponse(BaseModel):
     status: str  # ok | expired | maxed | not_found | error
     message: Optional[str] = None
@@ -29,5 +34,77 @@ class DownloadResponse(BaseModel):
     remaining_downloads: Optional[int] = None
     expires_at_iso: Optional[str] = None
     now_iso: str = Field(default_factory=lambda: datetime.utcnow().isoformat() + "Z")
+    files: Optional[List[BundleFileEntry]] = None  # set for bundles only
+
+
+class BatchFileInfoRequest(BaseModel):
+    file_ids: List[str] = Field(..., min_length=1, max_length=100)
+
+
+class BatchFileInfoResponse(BaseModel):
+    files: Dict[str, DownloadResponse]  # keyed by file_id, in request order
+
+
+class BundleFileRequest(BaseModel):
+    filename: str = Field(..., min_length=1)
+    content_type: Optional[str] = None
+
+
+class BundleInitRequest(BaseModel):
+    files: List[BundleFileRequest] = Field(..., min_length=1, max_length=100)
+    name: Optional[str] = Field(None, min_length=1)
+    max_downloads: int = Field(..., ge=1, le=5)
+    expires_in_hours: int = Field(..., ge=1, le=72)
+
+
+class BundleUploadUrl(BaseModel):
+    filename: str
+    s3_key: str
+    upload_url: str
+
+
+class BundleInitResponse(BaseModel):
+    file_id: str
+    files: List[BundleUploadUrl]
+    download_page_url: str
+
+
+class MultipartInitRequest(UploadInitRequest):
+    content_type: Optional[str] = None
+    size_bytes: int = Field(..., ge=1)  # declared total; the parts are checked again on complete
+
+
+class MultipartInitResponse(BaseModel):
+    file_id: str
+    upload_id: str
+    s3_key: str
+    download_page_url: str
+
+
+class MultipartPartsRequest(BaseModel):
+    file_id: str = Field(..., min_length=1)
+    part_numbers: List[conint(ge=1, le=10000)] = Field(..., min_length=1, max_length=100)
+
+
+class MultipartPartUrl(BaseModel):
+    part_number: int
+    upload_url: str
+
+
+class MultipartPartsResponse(BaseModel):
+    file_id: str
+    parts: List[MultipartPartUrl]
+
+
+class CompletedPart(BaseModel):
+    part_number: int = Field(..., ge=1, le=10000)
+    etag: str = Field(..., min_length=1)
+
+
+class MultipartCompleteRequest(BaseModel):
+    file_id: str = Field(..., min_length=1)
+    parts: List[CompletedPart] = Field(..., min_length=1)
 
 
+class MultipartAbortRequest(BaseModel):
+    file_id: str = Field(..., min_length=1)
@@ -0,0 +1,192 @@
+"""Fast local SigV4 presigning for S3 URLs.
+
+botocore's generate_presigned_url walks the full request pipeline (parameter
+validation, event hooks, endpoint resolution, key derivation) on every call.
+Presigned S3 URLs only need a handful of HMACs, so this module builds them
+directly, deriving the SigV4 signing key once per (day, region, service) and
+optionally caching whole download URLs for a fraction of their lifetime.
+"""
+
+import hashlib
+import hmac
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from aws_clients import get_credentials
+
+
+_ALGORITHM = "AWS4-HMAC-SHA256"
+_DNS_COMPATIBLE_BUCKET = re.compile(r"^[a-z0-9][a-z0-9-]{1,61}[a-z0-9]$")
+
+_signing_keys: Dict[Tuple[str, str, str, str], bytes] = {}
+_signing_keys_lock = threading.Lock()
+
+_URL_CACHE_MAX_ENTRIES = 1024
+_url_cache: "OrderedDict[Tuple, Tuple[str, float]]" = OrderedDict()
+_url_cache_lock = threading.Lock()
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _get_signing_key(secret_key: str, datestamp: str, region: str, service: str) -> bytes:
+    cache_key = (secret_key, datestamp, region, service)
+    key = _signing_keys.get(cache_key)
+    if key is None:
+        k_date = _hmac(("AWS4" + secret_key).encode("utf-8"), datestamp)
+        k_region = _hmac(k_date, region)
+        k_service = _hmac(k_region, service)
+        key = _hmac(k_service, "aws4_request")
+        with _signing_keys_lock:
+            # Keys are only valid for one day; drop stale ones as days roll over
+            if len(_signing_keys) >= 16:
+                _signing_keys.clear()
+            _signing_keys[cache_key] = key
+    return key
+
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+def _build_location(
+    bucket: str,
+    key: str,
+    region: str,
+    endpoint_url: Optional[str],
+    force_path_style: bool,
+) -> Tuple[str, str, str]:
+    """Return (scheme_and_host, host, canonical_uri) for the object."""
+    encoded_key = _quote(key, safe="-_.~/")
+    if endpoint_url:
+        base = endpoint_url.rstrip("/")
+        host = base.split("://", 1)[-1]
+        return base, host, f"/{bucket}/{encoded_key}"
+    # Match botocore, which keeps the legacy global endpoint for us-east-1
+    s3_host = "s3.amazonaws.com" if region == "us-east-1" else f"s3.{region}.amazonaws.com"
+    if force_path_style or not _DNS_COMPATIBLE_BUCKET.match(bucket):
+        return f"https://{s3_host}", s3_host, f"/{bucket}/{encoded_key}"
+    host = f"{bucket}.{s3_host}"
+    return f"https://{host}", host, f"/{encoded_key}"
+
+
+def presign_s3_url(
+    method: str,
+    bucket: str,
+    key: str,
+    expires_in_seconds: int,
+    region_name: str,
+    endpoint_url: Optional[str] = None,
+    force_path_style: bool = False,
+    content_type: Optional[str] = None,
+    query_params: Optional[Dict[str, str]] = None,
+) -> Optional[str]:
+    """
+    Build a SigV4 query-string presigned URL without going through botocore.
+    Returns None when no credentials are available so callers can fall back.
+    """
+    credentials = get_credentials()
+    if credentials is None or not credentials.access_key:
+        return None
+
+    now = datetime.now(tz=timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    datestamp = amz_date[:8]
+    scope = f"{datestamp}/{region_name}/s3/aws4_request"
+
+    base, host, canonical_uri = _build_location(bucket, key, region_name, endpoint_url, force_path_style)
+
+    headers = {"host": host}
+    if content_type:
+        headers["content-type"] = content_type
+    signed_headers = ";".join(sorted(headers))
+
+    params = dict(query_params or {})
+    params.update({
+        "X-Amz-Algorithm": _ALGORITHM,
+        "X-Amz-Credential": f"{credentials.access_key}/{scope}",
+        "X-Amz-Date": amz_date,
+        "X-Amz-Expires": str(expires_in_seconds),
+        "X-Amz-SignedHeaders": signed_headers,
+    })
+    if credentials.token:
+        params["X-Amz-Security-Token"] = credentials.token
+    canonical_query = "&".join(
+        f"{_quote(k)}={_quote(v)}" for k, v in sorted(params.items())
+    )
+
+    canonical_headers = "".join(f"{name}:{headers[name].strip()}\n" for name in sorted(headers))
+    canonical_request = "\n".join([
+        method,
+        canonical_uri,
+        canonical_query,
+        canonical_headers,
+        signed_headers,
+        "UNSIGNED-PAYLOAD",
+    ])
+    string_to_sign = "\n".join([
+        _ALGORITHM,
+        amz_date,
+        scope,
+        hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+    ])
+    signing_key = _get_signing_key(credentials.secret_key, datestamp, region_name, "s3")
+    signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    return f"{base}{canonical_uri}?{canonical_query}&X-Amz-Signature={signature}"
+
+
+def get_cached_download_url(
+    bucket: str,
+    key: str,
+    disposition: str,
+    expires_in_seconds: int,
+    cache_fraction: float,
+    region_name: str,
+    endpoint_url: Optional[str] = None,
+    force_path_style: bool = False,
+) -> Optional[str]:
+    """
+    Presign a GET URL, reusing a previous one for the same (key, disposition)
+    while it still has at least (1 - cache_fraction) of its lifetime left.
+    """
+    cache_key = (bucket, key, disposition, region_name, endpoint_url, force_path_style)
+    now = time.monotonic()
+    if cache_fraction > 0:
+        with _url_cache_lock:
+            entry = _url_cache.get(cache_key)
+            if entry is not None:
+                if entry[1] > now:
+                    _url_cache.move_to_end(cache_key)
+                    return entry[0]
+                del _url_cache[cache_key]
+
+    url = presign_s3_url(
+        "GET",
+        bucket,
+        key,
+        expires_in_seconds,
+        region_name,
+        endpoint_url=endpoint_url,
+        force_path_style=force_path_style,
+        query_params={"response-content-disposition": disposition},
+    )
+    if url is not None and cache_fraction > 0:
+        with _url_cache_lock:
+            _url_cache[cache_key] = (url, now + expires_in_seconds * cache_fraction)
+            if len(_url_cache) > _URL_CACHE_MAX_ENTRIES:
+                _url_cache.popitem(last=False)
+    return url
+
+
+def invalidate_download_url(bucket: str, key: str) -> None:
+    """Forget cached download URLs for an object (e.g. once it is deleted)."""
+    with _url_cache_lock:
+        for cache_key in [k for k in _url_cache if k[0] == bucket and k[1] == key]:
+            del _url_cache[cache_key]
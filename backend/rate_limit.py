@@ -0,0 +1,252 @@
+"""Per-key rate limiting for upload endpoints.
+
+SlidingWindowRateLimiter keeps its counters in process memory, so each
+Lambda container or uvicorn worker enforces the limit on its own.
+DynamoDBRateLimiter shares fixed-window counters across instances through
+atomic DynamoDB updates. Pick one with RATE_LIMIT_BACKEND.
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from config import Settings, get_aws_endpoint_url
+from db_utils import increment_rate_counter
+from logs import get_logger
+
+
+logger = get_logger("rate_limit")
+
+
+class RateLimiter(ABC):
+    """Interface shared by the rate limiter backends."""
+
+    @abstractmethod
+    def allow(self, key: str, now: Optional[float] = None) -> bool:
+        """Record a hit for `key` and return False if it is over the limit."""
+
+
+class _Window:
+    __slots__ = ("start", "count", "prev_count")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.count = 0
+        self.prev_count = 0
+
+
+class SlidingWindowRateLimiter(RateLimiter):
+    """
+    Sliding-window counter: each key keeps the count of the current and the
+    previous fixed window, and the previous one is weighted by how much of it
+    still overlaps the sliding window. Checks are O(1) and each key costs one
+    small __slots__ object instead of a list of timestamps.
+
+    Idle keys are swept every `sweep_interval` seconds (amortised over calls),
+    and at most `max_keys` are tracked; beyond that the least recently used are dropped.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        window_seconds: int,
+        max_keys: int = 100_000,
+        sweep_interval: Optional[float] = None,
+    ):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval if sweep_interval is not None else min(window_seconds, 60)
+        self._windows: "OrderedDict[str, _Window]" = OrderedDict()
+        self._next_sweep = time.monotonic() + self.sweep_interval
+        self._lock = threading.Lock()
+
+    def allow(self, key: str, now: Optional[float] = None) -> bool:
+        """Record a hit for `key` and return False if it is over the limit."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+            window = self._windows.get(key)
+            if window is None:
+                if len(self._windows) >= self.max_keys:
+                    self._windows.popitem(last=False)
+                window = self._windows[key] = _Window(now)
+            else:
+                # Least recently used first, so a flood of new keys evicts idle ones
+                self._windows.move_to_end(key)
+
+            elapsed = now - window.start
+            if elapsed >= self.window_seconds:
+                windows_passed = int(elapsed // self.window_seconds)
+                window.prev_count = window.count if windows_passed == 1 else 0
+                window.count = 0
+                window.start += windows_passed * self.window_seconds
+                elapsed = now - window.start
+
+            weight = 1.0 - elapsed / self.window_seconds
+            if window.prev_count * weight + window.count >= self.limit:
+                return False
+            window.count += 1
+            return True
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _sweep(self, now: float) -> None:
+        # A key idle for two windows has no weight left in the sliding window
+        cutoff = now - 2 * self.window_seconds
+        for key in [k for k, w in self._windows.items() if w.start <= cutoff]:
+            del self._windows[key]
+        self._next_sweep = now + self.sweep_interval
+
+
+class _Counter:
+    __slots__ = ("window", "synced_count", "pending")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.synced_count = 0
+        self.pending = 0
+
+
+class DynamoDBRateLimiter(RateLimiter):
+    """
+    Fixed-window counters stored as items in a DynamoDB table, keyed by
+    (key, window index) and reaped by the table's TTL.
+
+    To keep a round-trip off most checks, hits are counted locally and a
+    background thread adds every key's pending hits to the shared counter
+    with one atomic ADD each `sync_interval` seconds, which also refreshes
+    the last known global count. A check that brings the local estimate
+    within `sync_margin` of the limit syncs inline instead. The last known
+    global count plus local pending hits is checked first, so keys already
+    over the limit are rejected without a call. Every admitted hit reaches
+    DynamoDB, including those pending when a window rolls over or a key is
+    evicted; between syncs each instance can admit at most the hits of one
+    `sync_interval` beyond what it has seen. DynamoDB errors fail open.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        window_seconds: int,
+        table_name: str,
+        region_name: str,
+        endpoint_url: Optional[str] = None,
+        sync_interval: float = 5.0,
+        sync_margin: int = 1,
+        max_keys: int = 100_000,
+    ):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.table_name = table_name
+        self.region_name = region_name
+        self.endpoint_url = endpoint_url
+        self.sync_interval = sync_interval
+        self.sync_margin = sync_margin
+        self.max_keys = max_keys
+        self._counters: "OrderedDict[str, _Counter]" = OrderedDict()
+        # Pending hits of counters that rolled over or were evicted
+        self._retired: List[Tuple[str, _Counter]] = []
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+
+    def allow(self, key: str, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.time()
+        window = int(now // self.window_seconds)
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="rate-limit-sync", daemon=True)
+                self._flusher.start()
+            counter = self._counters.get(key)
+            if counter is None or counter.window != window:
+                if counter is not None:
+                    self._retire(key, counter)
+                elif len(self._counters) >= self.max_keys:
+                    self._retire(*self._counters.popitem(last=False))
+                counter = self._counters[key] = _Counter(window)
+            self._counters.move_to_end(key)
+
+            if counter.synced_count + counter.pending >= self.limit:
+                return False
+            counter.pending += 1
+            if counter.synced_count + counter.pending <= self.limit - self.sync_margin:
+                return True
+            pending, counter.pending = counter.pending, 0
+
+        total = self._sync(key, counter, pending)
+        return total is None or total <= self.limit
+
+    def flush(self) -> None:
+        """Add every key's pending hits to the shared counters."""
+        with self._lock:
+            batch = [(key, counter, counter.pending) for key, counter in self._counters.items() if counter.pending]
+            batch.extend((key, counter, counter.pending) for key, counter in self._retired)
+            for _, counter, _ in batch:
+                counter.pending = 0
+            self._retired = []
+        for key, counter, pending in batch:
+            self._sync(key, counter, pending)
+
+    def _retire(self, key: str, counter: _Counter) -> None:
+        if counter.pending:
+            self._retired.append((key, counter))
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Rate limit flush failed")
+
+    def _sync(self, key: str, counter: _Counter, pending: int) -> Optional[int]:
+        """ADD `pending` hits to the shared counter; returns the new total, or None on errors."""
+        try:
+            total = increment_rate_counter(
+                table_name=self.table_name,
+                region_name=self.region_name,
+                counter_key=f"{key}#{counter.window}",
+                amount=pending,
+                ttl_epoch=(counter.window + 2) * self.window_seconds,
+                endpoint_url=self.endpoint_url,
+            )
+        except (ClientError, BotoCoreError) as e:
+            logger.warning("Rate limit sync failed for %s: %s", key, e)
+            # Try again with the next flush
+            with self._lock:
+                counter.pending += pending
+                if self._counters.get(key) is not counter:
+                    self._retire(key, counter)
+            return None
+
+        with self._lock:
+            counter.synced_count = max(counter.synced_count, total)
+        return total
+
+
+def create_rate_limiter(settings: Settings) -> RateLimiter:
+    """Build the upload rate limiter selected by RATE_LIMIT_BACKEND."""
+    if settings.rate_limit_backend == "dynamodb":
+        return DynamoDBRateLimiter(
+            limit=settings.rate_limit_uploads,
+            window_seconds=settings.rate_limit_window_seconds,
+            table_name=settings.rate_limit_table_name or settings.ddb_table_name,
+            region_name=settings.aws_region,
+            endpoint_url=get_aws_endpoint_url(settings),
+            sync_interval=settings.rate_limit_sync_seconds,
+            max_keys=settings.rate_limit_max_keys,
+        )
+    return SlidingWindowRateLimiter(
+        limit=settings.rate_limit_uploads,
+        window_seconds=settings.rate_limit_window_seconds,
+        max_keys=settings.rate_limit_max_keys,
+    )
@@ -0,0 +1,366 @@
+"""Reconcile S3 objects under uploads/ with the metadata table.
+
+TTL and lifecycle rules clean up each side on its own schedule, and a
+crash between the two halves of a deletion leaves one side behind. This
+job reads both sides in full and fixes what does not line up:
+
+- orphaned objects: no live item or content index entry refers to them
+  (their item expired, was reaped by TTL, or was never written). They
+  are deleted with delete_objects once older than the grace period.
+- dangling deletions: items whose scheduled deletion is due but whose
+  objects are already gone are flagged object_deleted.
+- expired items: items past expiry (plus grace) are deleted in bulk
+  instead of waiting up to two days for TTL.
+- stale content index entries: entries whose object is gone are dropped
+  so no new upload is deduplicated against missing bytes.
+
+Nothing younger than `grace_seconds` is touched, which covers uploads
+whose object and item are still being written.
+
+The job runs in two phases so memory stays bounded however large the
+bucket is. Keys are sharded by the first two characters of the file_id
+(uploads/<file_id>/...), 256 shards for uuid4 ids.
+
+1. The table is read by a parallel Scan, one segment per worker. Expired
+   items are deleted as they stream past. Whatever the join needs
+   (referenced keys, dangling and content entry candidates) is appended
+   to a spill file per shard on local disk (/tmp on Lambda), about 100
+   bytes per live key.
+2. Each shard's objects are listed with list_objects_v2 from the shard's
+   first key, on the same pool. Only that shard's spill file is loaded
+   into memory, and orphans are deleted in batches of 1000 as the
+   listing goes.
+
+At most `workers` shards are held at once, i.e. about workers/256 of the
+referenced keys. Listing objects after the scan is safe because anything
+uploaded since is younger than the grace period.
+
+Run it from the command line (`python reconcile.py --dry-run`) or as the
+Lambda task {"task": "reconcile"}.
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from config import Settings, get_aws_endpoint_url, get_settings
+from db_utils import (
+    CONTENT_KEY_PREFIX,
+    INTERNAL_KEY_PREFIXES,
+    delete_content_entry,
+    delete_metadata_items,
+    item_s3_keys,
+    mark_object_deleted,
+    scan_items,
+)
+from expiry import UPLOADS_PREFIX
+from logs import get_logger
+from s3_utils import delete_s3_objects, list_s3_objects
+
+
+logger = get_logger("reconcile")
+
+DEFAULT_GRACE_SECONDS = 3600
+BATCH_SIZE = 1000
+SHARD_PREFIX_LENGTH = 2
+
+# Shard i holds the keys in (_BOUNDS[i-1], _BOUNDS[i]]. The first and last
+# shards are open-ended, so keys that do not start with hex digits are
+# still covered.
+_BOUNDS = [
+    UPLOADS_PREFIX + "".join(chars)
+    for chars in itertools.product("0123456789abcdef", repeat=SHARD_PREFIX_LENGTH)
+][1:]
+SHARD_COUNT = len(_BOUNDS) + 1
+
+_PROJECTION = (
+    "file_id, s3_key, #files, expires_at_epoch, object_deleted, delete_after_epoch, "
+    "refs, created_epoch, object_expires_epoch"
+)
+
+_COUNTERS = (
+    "objects",
+    "items",
+    "orphaned_objects",
+    "dangling_items",
+    "expired_items",
+    "stale_content_entries",
+    "failed",
+)
+
+
+def shard_of(key: str) -> int:
+    return bisect.bisect_left(_BOUNDS, key)
+
+
+class _Spill:
+    """Per-shard JSON-lines files written by the scan and read back by the join."""
+
+    def __init__(self, directory: str):
+        self._paths = [os.path.join(directory, f"shard-{shard:03d}.jsonl") for shard in range(SHARD_COUNT)]
+        self._files = [open(path, "w", encoding="utf-8") for path in self._paths]
+        self._locks = [threading.Lock() for _ in self._paths]
+
+    def write(self, shard: int, lines: List[str]) -> None:
+        with self._locks[shard]:
+            self._files[shard].writelines(lines)
+
+    def close(self) -> None:
+        for f in self._files:
+            f.close()
+
+    def read(self, shard: int) -> Iterator[List[str]]:
+        with open(self._paths[shard], encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+class _Run:
+    """Settings and clock of one pass, shared by the worker threads."""
+
+    def __init__(self, settings: Settings, grace_seconds: int, dry_run: bool):
+        self.settings = settings
+        self.endpoint_url = get_aws_endpoint_url(settings)
+        self.now = time.time()
+        self.cutoff = self.now - grace_seconds
+        self.dry_run = dry_run
+
+    def delete_items(self, file_ids: List[str]) -> None:
+        if file_ids and not self.dry_run:
+            delete_metadata_items(
+                table_name=self.settings.ddb_table_name,
+                region_name=self.settings.aws_region,
+                file_ids=file_ids,
+                endpoint_url=self.endpoint_url,
+            )
+
+    def delete_objects(self, keys: List[str]) -> List[str]:
+        """Delete orphans; returns the keys that could not be deleted."""
+        if not keys or self.dry_run:
+            return []
+        _, failed = delete_s3_objects(
+            bucket=self.settings.s3_bucket_name,
+            keys=keys,
+            region_name=self.settings.aws_region,
+            endpoint_url=self.endpoint_url,
+            force_path_style=self.settings.s3_force_path_style,
+        )
+        return failed
+
+    def list_shard(self, shard: int) -> Iterator[Tuple[str, float]]:
+        upper = _BOUNDS[shard] if shard < len(_BOUNDS) else None
+        for key, modified in list_s3_objects(
+            bucket=self.settings.s3_bucket_name,
+            prefix=UPLOADS_PREFIX,
+            region_name=self.settings.aws_region,
+            endpoint_url=self.endpoint_url,
+            force_path_style=self.settings.s3_force_path_style,
+            start_after=_BOUNDS[shard - 1] if shard > 0 else None,
+        ):
+            if upper is not None and key > upper:
+                return
+            yield key, modified
+
+
+class _SpillBuffer:
+    """One scan segment's pending spill lines, written BATCH_SIZE at a time."""
+
+    def __init__(self, spill: _Spill):
+        self._spill = spill
+        self._lines: Dict[int, List[str]] = {}
+        self._count = 0
+
+    def add(self, key: str, record: List[str]) -> None:
+        self._lines.setdefault(shard_of(key), []).append(json.dumps(record) + "\n")
+        self._count += 1
+        if self._count >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        for shard, lines in self._lines.items():
+            self._spill.write(shard, lines)
+        self._lines = {}
+        self._count = 0
+
+
+def _scan_segment(run: _Run, spill: _Spill, segment: int, total_segments: int) -> Dict[str, int]:
+    counts = dict.fromkeys(_COUNTERS, 0)
+    buffer = _SpillBuffer(spill)
+    expired: List[str] = []
+    for item in scan_items(
+        table_name=run.settings.ddb_table_name,
+        region_name=run.settings.aws_region,
+        projection=_PROJECTION,
+        attribute_names={"#files": "files"},
+        endpoint_url=run.endpoint_url,
+        segment=segment,
+        total_segments=total_segments,
+    ):
+        counts["items"] += 1
+        file_id = item["file_id"]
+        if file_id.startswith(CONTENT_KEY_PREFIX):
+            key = item.get("s3_key")
+            if not key:
+                continue
+            # Shared objects stay until their tier's lifecycle rule
+            if int(item.get("refs", 0)) > 0 and int(item.get("object_expires_epoch", 0)) > run.now:
+                buffer.add(key, ["R", key])
+            if int(item.get("created_epoch", run.now)) < run.cutoff:
+                buffer.add(key, ["C", key, file_id[len(CONTENT_KEY_PREFIX):]])
+            continue
+        if file_id.startswith(INTERNAL_KEY_PREFIXES):
+            continue
+
+        keys = item_s3_keys(item)
+        expires_at = int(item.get("expires_at_epoch", 0))
+        if expires_at < run.cutoff:
+            counts["expired_items"] += 1
+            expired.append(file_id)
+            if len(expired) >= BATCH_SIZE:
+                run.delete_items(expired)
+                expired = []
+            continue
+        if item.get("object_deleted"):
+            continue
+        if expires_at > run.now:
+            for key in keys:
+                buffer.add(key, ["R", key])
+        due = item.get("delete_after_epoch")
+        if due is not None and int(due) <= run.now and keys:
+            buffer.add(keys[0], ["D", file_id, *keys])
+    buffer.flush()
+    run.delete_items(expired)
+    return counts
+
+
+def _join_shard(run: _Run, spill: _Spill, shard: int) -> Dict[str, int]:
+    counts = dict.fromkeys(_COUNTERS, 0)
+    referenced: Set[str] = set()
+    content: Dict[str, List[str]] = {}
+    dangling: List[List[str]] = []
+    for record in spill.read(shard):
+        if record[0] == "R":
+            referenced.add(record[1])
+        elif record[0] == "C":
+            content.setdefault(record[1], []).append(record[2])
+        else:
+            dangling.append(record[1:])
+    watched = set(content)
+    for record in dangling:
+        watched.update(record[1:])
+
+    # Keys the candidates need, that are still there after this pass
+    present: Set[str] = set()
+    orphaned: List[str] = []
+
+    def delete_orphans() -> None:
+        failed = run.delete_objects(orphaned)
+        counts["orphaned_objects"] += len(orphaned)
+        counts["failed"] += len(failed)
+        present.update(k for k in failed if k in watched)
+        orphaned.clear()
+
+    for key, modified in run.list_shard(shard):
+        counts["objects"] += 1
+        if key not in referenced and modified < run.cutoff:
+            orphaned.append(key)
+            if len(orphaned) >= BATCH_SIZE:
+                delete_orphans()
+        elif key in watched:
+            present.add(key)
+    delete_orphans()
+    referenced.clear()
+
+    for file_id, *keys in dangling:
+        # Keys in another shard were not listed here; leave those items alone
+        if any(key in present or shard_of(key) != shard for key in keys):
+            continue
+        counts["dangling_items"] += 1
+        if not run.dry_run:
+            mark_object_deleted(
+                table_name=run.settings.ddb_table_name,
+                region_name=run.settings.aws_region,
+                file_id=file_id,
+                endpoint_url=run.endpoint_url,
+            )
+    for key, hashes in content.items():
+        if key in present:
+            continue
+        for sha256 in hashes:
+            counts["stale_content_entries"] += 1
+            if not run.dry_run:
+                delete_content_entry(
+                    table_name=run.settings.ddb_table_name,
+                    region_name=run.settings.aws_region,
+                    sha256=sha256,
+                    s3_key=key,
+                    endpoint_url=run.endpoint_url,
+                )
+    return counts
+
+
+def _add(totals: Dict[str, Any], counts: Dict[str, int]) -> None:
+    for name, value in counts.items():
+        totals[name] += value
+
+
+def reconcile_storage(
+    settings: Optional[Settings] = None,
+    grace_seconds: int = DEFAULT_GRACE_SECONDS,
+    dry_run: bool = False,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Run one reconciliation pass; returns counts per kind of fix and throughput."""
+    if settings is None:
+        settings = get_settings()
+    if workers is None:
+        workers = settings.reconcile_workers
+    run = _Run(settings, grace_seconds, dry_run)
+    totals: Dict[str, Any] = dict.fromkeys(_COUNTERS, 0)
+    started = time.perf_counter()
+
+    with tempfile.TemporaryDirectory(prefix="reconcile-") as directory, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reconcile") as pool:
+        spill = _Spill(directory)
+        try:
+            for counts in pool.map(lambda segment: _scan_segment(run, spill, segment, workers), range(workers)):
+                _add(totals, counts)
+        finally:
+            spill.close()
+        scanned = time.perf_counter()
+        for counts in pool.map(lambda shard: _join_shard(run, spill, shard), range(SHARD_COUNT)):
+            _add(totals, counts)
+    finished = time.perf_counter()
+
+    scan_seconds = scanned - started
+    list_seconds = finished - scanned
+    totals["scan_seconds"] = round(scan_seconds, 3)
+    totals["list_seconds"] = round(list_seconds, 3)
+    totals["items_per_second"] = round(totals["items"] / scan_seconds) if scan_seconds > 0 else 0
+    totals["objects_per_second"] = round(totals["objects"] / list_seconds) if list_seconds > 0 else 0
+    totals["dry_run"] = dry_run
+    logger.info("Reconciliation finished", extra={"fields": totals})
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconcile S3 uploads with the metadata table.")
+    parser.add_argument("--dry-run", action="store_true", help="count what would be fixed without changing anything")
+    parser.add_argument("--grace-seconds", type=int, default=DEFAULT_GRACE_SECONDS,
+                        help="leave objects and items younger than this alone (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="scan segments and listing shards at a time (default: RECONCILE_WORKERS)")
+    args = parser.parse_args()
+    totals = reconcile_storage(grace_seconds=args.grace_seconds, dry_run=args.dry_run, workers=args.workers)
+    print(json.dumps(totals, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,76 @@
 """S3 Lifecycle management for auto-deletion of files."""
 
+from typing import Any, Sequence
+
 from botocore.exceptions import ClientError
+from expiry import lifecycle_rules
+from logs import get_logger
 from s3_utils import get_s3_client
 
 
-def setup_s3_lifecycle_policy(bucket_name: str, region_name: str = "us-east-1", endpoint_url: str = None):
-    """Set up S3 lifecycle policy to auto-delete files after 7 days."""
+logger = get_logger("s3_lifecycle")
+
+
+def _matches(wanted: Any, current: Any) -> bool:
+    """True if `current` contains everything in `wanted` (S3 may add defaults)."""
+    if isinstance(wanted, dict):
+        return isinstance(current, dict) and all(
+            key in current and _matches(value, current[key]) for key, value in wanted.items()
+        )
+    if isinstance(wanted, list):
+        return (
+            isinstance(current, list)
+            and len(wanted) == len(current)
+            and all(any(_matches(w, c) for c in current) for w in wanted)
+        )
+    return wanted == current
+
+
+def get_s3_lifecycle_rules(s3_client, bucket_name: str) -> list:
+    """Return the bucket's lifecycle rules, or [] if it has none."""
+    try:
+        return s3_client.get_bucket_lifecycle_configuration(Bucket=bucket_name).get("Rules", [])
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "NoSuchLifecycleConfiguration":
+            return []
+        raise
+
+
+def setup_s3_lifecycle_policy(
+    bucket_name: str,
+    region_name: str = "us-east-1",
+    endpoint_url: str = None,
+    expiration_days: int = 7,
+    tier_days: Sequence[int] = (),
+):
+    """
+    Set up S3 lifecycle policy to auto-delete files after `expiration_days`,
+    or sooner for objects tagged with one of the expiry `tier_days` (see
+    expiry.py).
+    Nothing is written when the bucket already has this configuration, so
+    running it on every startup is cheap and leaves the bucket untouched.
+
+    Deduplicated objects are shared by several uploads, so new uploads only
+    reuse an object that these rules will not expire before they do (see
+    db_utils.acquire_content_object).
+    """
     
     s3_client = get_s3_client(region_name=region_name, endpoint_url=endpoint_url)
     
-    lifecycle_config = {
-        'Rules': [
-            {
-                'ID': 'delete-old-uploads',
-                'Status': 'Enabled',
-                'Filter': {
-                    'Prefix': 'uploads/'
-                },
-                'Expiration': {
-                    'Days': 7
-                },
-                'AbortIncompleteMultipartUpload': {
-                    'DaysAfterInitiation': 1
-                }
-            }
-        ]
-    }
+    lifecycle_config = {'Rules': lifecycle_rules(expiration_days, tier_days)}
     
     try:
+        if _matches(lifecycle_config["Rules"], get_s3_lifecycle_rules(s3_client, bucket_name)):
+            logger.debug("S3 lifecycle policy already up to date for bucket %s", bucket_name)
+            return True
         s3_client.put_bucket_lifecycle_configuration(
             Bucket=bucket_name,
             LifecycleConfiguration=lifecycle_config
         )
-        print(f"[OK] S3 lifecycle policy set for bucket {bucket_name}")
+        logger.info("S3 lifecycle policy set for bucket %s", bucket_name)
         return True
     except ClientError as e:
-        print(f"[ERROR] Failed to set S3 lifecycle policy: {e}")
+        logger.error("Failed to set S3 lifecycle policy: %s", e)
         return False
 
 
@@ -46,8 +81,8 @@ def remove_s3_lifecycle_policy(bucket_name: str, region_name: str = "us-east-1",
     
     try:
         s3_client.delete_bucket_lifecycle(Bucket=bucket_name)
-        print(f"[OK] S3 lifecycle policy removed from bucket {bucket_name}")
+        logger.info("S3 lifecycle policy removed from bucket %s", bucket_name)
         return True
     except ClientError as e:
-        print(f"[ERROR] Failed to remove S3 lifecycle policy: {e}")
+        logger.error("Failed to remove S3 lifecycle policy: %s", e)
         return False
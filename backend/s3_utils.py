@@ -1,19 +1,32 @@
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
 
-import boto3
-from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from aws_clients import get_client
+from content_encoding import decode_chunks
+from logs import get_logger
+from metrics import timed
+from presign import get_cached_download_url, invalidate_download_url, presign_s3_url
+
+
+logger = get_logger("s3")
+
 
 def get_s3_client(
     region_name: Optional[str] = None,
     endpoint_url: Optional[str] = None,
     force_path_style: bool = False,
 ):
-    cfg = Config(s3={"addressing_style": "path" if force_path_style else "auto"})
-    return boto3.client("s3", region_name=region_name, endpoint_url=endpoint_url, config=cfg)
+    return get_client(
+        "s3",
+        region_name=region_name,
+        endpoint_url=endpoint_url,
+        addressing_style="path" if force_path_style else "auto",
+    )
 
 
+@timed("presign")
 def create_presigned_upload_url(
     bucket: str,
     key: str,
@@ -22,11 +35,34 @@ def create_presigned_upload_url(
     content_type: Optional[str] = None,
     endpoint_url: Optional[str] = None,
     force_path_style: bool = False,
+    fast_presign: bool = False,
+    tagging: Optional[str] = None,
 ) -> str:
+    """
+    Presign a PUT URL for the object. `tagging` (e.g. "expiry-tier=1d") is
+    carried in the URL as x-amz-tagging, so clients need no extra header.
+    """
+    if fast_presign and region_name:
+        url = presign_s3_url(
+            "PUT",
+            bucket,
+            key,
+            expires_in_seconds,
+            region_name,
+            endpoint_url=endpoint_url,
+            force_path_style=force_path_style,
+            content_type=content_type,
+            query_params={"x-amz-tagging": tagging} if tagging else None,
+        )
+        if url:
+            return url
+
     s3 = get_s3_client(region_name, endpoint_url, force_path_style)
     params = {"Bucket": bucket, "Key": key}
     if content_type:
         params["ContentType"] = content_type
+    if tagging:
+        params["Tagging"] = tagging
     
     return s3.generate_presigned_url(
         ClientMethod="put_object",
@@ -35,6 +71,7 @@ def create_presigned_upload_url(
     )
 
 
+@timed("presign")
 def create_presigned_download_url(
     bucket: str,
     key: str,
@@ -42,19 +79,149 @@ def create_presigned_download_url(
     region_name: Optional[str] = None,
     endpoint_url: Optional[str] = None,
     force_path_style: bool = False,
+    fast_presign: bool = False,
+    cache_fraction: float = 0.0,
+    filename: Optional[str] = None,
 ) -> str:
+    """
+    Presign a GET URL for the object. With fast_presign the URL is signed
+    locally and, if cache_fraction > 0, reused for that share of its lifetime.
+    `filename` overrides the download name, for objects shared under
+    another name (deduplicated content).
+    """
+    disposition = f"attachment; filename*=UTF-8''{quote(filename)}" if filename else "attachment"
+    if fast_presign and region_name:
+        url = get_cached_download_url(
+            bucket,
+            key,
+            disposition,
+            expires_in_seconds,
+            cache_fraction,
+            region_name,
+            endpoint_url=endpoint_url,
+            force_path_style=force_path_style,
+        )
+        if url:
+            return url
+
     s3 = get_s3_client(region_name, endpoint_url, force_path_style)
     return s3.generate_presigned_url(
         ClientMethod="get_object",
         Params={
             "Bucket": bucket, 
             "Key": key,
-            "ResponseContentDisposition": "attachment"
+            "ResponseContentDisposition": disposition
         },
         ExpiresIn=expires_in_seconds,
     )
 
 
+def create_multipart_upload(
+    bucket: str,
+    key: str,
+    region_name: Optional[str] = None,
+    content_type: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    force_path_style: bool = False,
+    tagging: Optional[str] = None,
+) -> str:
+    """Start a multipart upload and return its UploadId."""
+    s3 = get_s3_client(region_name, endpoint_url, force_path_style)
+    params = {"Bucket": bucket, "Key": key}
+    if content_type:
+        params["ContentType"] = content_type
+    if tagging:
+        params["Tagging"] = tagging
+    return s3.create_multipart_upload(**params)["UploadId"]
+
+
+@timed("presign")
+def create_presigned_part_urls(
+    bucket: str,
+    key: str,
+    upload_id: str,
+    part_numbers: List[int],
+    expires_in_seconds: int,
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    force_path_style: bool = False,
+) -> Dict[int, str]:
+    """Presign an upload_part URL for each part number in one batch."""
+    s3 = get_s3_client(region_name, endpoint_url, force_path_style)
+    return {
+        part_number: s3.generate_presigned_url(
+            ClientMethod="upload_part",
+            Params={
+                "Bucket": bucket,
+                "Key": key,
+                "UploadId": upload_id,
+                "PartNumber": part_number,
+            },
+            ExpiresIn=expires_in_seconds,
+        )
+        for part_number in part_numbers
+    }
+
+
+def complete_multipart_upload(
+    bucket: str,
+    key: str,
+    upload_id: str,
+    parts: List[Dict[str, Any]],
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    force_path_style: bool = False,
+) -> None:
+    """Complete a multipart upload from a list of {"PartNumber", "ETag"} dicts."""
+    s3 = get_s3_client(region_name, endpoint_url, force_path_style)
+    s3.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+    )
+
+
+def multipart_upload_size(
+    bucket: str,
+    key: str,
+    upload_id: str,
+    part_numbers: List[int],
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    force_path_style: bool = False,
+) -> int:
+    """Total size of the given uploaded parts, from ListParts (1000 parts per page)."""
+    s3 = get_s3_client(region_name, endpoint_url, force_path_style)
+    wanted = set(part_numbers)
+    total = 0
+    params = {"Bucket": bucket, "Key": key, "UploadId": upload_id}
+    while True:
+        resp = s3.list_parts(**params)
+        total += sum(p["Size"] for p in resp.get("Parts", []) if p["PartNumber"] in wanted)
+        if not resp.get("IsTruncated"):
+            return total
+        params["PartNumberMarker"] = resp["NextPartNumberMarker"]
+
+
+def abort_multipart_upload(
+    bucket: str,
+    key: str,
+    upload_id: str,
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    force_path_style: bool = False,
+) -> bool:
+    """Abort a multipart upload. Returns True if successful."""
+    try:
+        s3 = get_s3_client(region_name, endpoint_url, force_path_style)
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        return True
+    except ClientError as e:
+        logger.error("Failed to abort multipart upload %s/%s: %s", bucket, key, e)
+        return False
+
+
 def check_s3_object_exists(
     bucket: str,
     key: str,
@@ -74,6 +241,67 @@ def check_s3_object_exists(
         raise
 
 
+def open_s3_object_ranges(
+    bucket: str,
+    key: str,
+    range_size: int,
+    read_size: int = 64 * 1024,
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    force_path_style: bool = False,
+    missing_ok: bool = False,
+) -> Optional[Tuple[str, Optional[int], Iterator[bytes]]]:
+    """
+    Read an object as a series of ranged GETs of `range_size` bytes.
+
+    Returns (content_type, size, chunks). The first range is requested
+    immediately so the type and size are known up front; the iterator then
+    streams each range in `read_size` pieces, so at most one piece is held
+    in memory however large the object is. Objects stored with a
+    ContentEncoding are decoded on the fly and their size is reported as
+    None, since only the encoded size is known. With missing_ok, a missing
+    object returns None instead of raising NoSuchKey.
+    """
+    s3 = get_s3_client(region_name, endpoint_url, force_path_style)
+    try:
+        first = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{range_size - 1}")
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code")
+        # Ranges cannot be satisfied on an empty object
+        if code == "InvalidRange":
+            return "application/octet-stream", 0, iter(())
+        if missing_ok and code == "NoSuchKey":
+            logger.warning("Skipping missing object %s in %s", key, bucket)
+            return None
+        raise
+    content_range = first.get("ContentRange")
+    size = int(content_range.rsplit("/", 1)[1]) if content_range else first["ContentLength"]
+
+    def chunks() -> Iterator[bytes]:
+        resp = first
+        offset = 0
+        while True:
+            start = offset
+            for chunk in resp["Body"].iter_chunks(read_size):
+                offset += len(chunk)
+                yield chunk
+            if offset >= size or offset == start:
+                return
+            # IfMatch fails the read if the object is replaced mid-stream
+            resp = s3.get_object(
+                Bucket=bucket,
+                Key=key,
+                Range=f"bytes={offset}-{offset + range_size - 1}",
+                IfMatch=first["ETag"],
+            )
+
+    content_type = first.get("ContentType") or "application/octet-stream"
+    encoding = first.get("ContentEncoding")
+    if encoding:
+        return content_type, None, decode_chunks(chunks(), encoding)
+    return content_type, size, chunks()
+
+
 def delete_s3_object(
     bucket: str,
     key: str,
@@ -85,13 +313,70 @@ def delete_s3_object(
     try:
         s3 = get_s3_client(region_name=region_name, endpoint_url=endpoint_url, force_path_style=force_path_style)
         s3.delete_object(Bucket=bucket, Key=key)
-        print(f"[OK] Deleted S3 object: {bucket}/{key}")
+        invalidate_download_url(bucket, key)
+        logger.info("Deleted S3 object: %s/%s", bucket, key)
         return True
     except ClientError as e:
-        print(f"[ERROR] Failed to delete S3 object {bucket}/{key}: {e}")
+        logger.error("Failed to delete S3 object %s/%s: %s", bucket, key, e)
         return False
 
 
+def delete_s3_objects(
+    bucket: str,
+    keys: List[str],
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    force_path_style: bool = False,
+) -> Tuple[List[str], List[str]]:
+    """
+    Delete objects in batches of up to 1000 keys per delete_objects call.
+    Returns (deleted_keys, failed_keys).
+    """
+    s3 = get_s3_client(region_name=region_name, endpoint_url=endpoint_url, force_path_style=force_path_style)
+    deleted, failed = [], []
+    for start in range(0, len(keys), 1000):
+        batch = keys[start:start + 1000]
+        try:
+            resp = s3.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+            )
+        except ClientError as e:
+            logger.error("Failed to delete %s S3 objects from %s: %s", len(batch), bucket, e)
+            failed.extend(batch)
+            continue
+        errored = {err["Key"] for err in resp.get("Errors", [])}
+        for key in batch:
+            if key in errored:
+                failed.append(key)
+            else:
+                invalidate_download_url(bucket, key)
+                deleted.append(key)
+    return deleted, failed
+
+
+def list_s3_objects(
+    bucket: str,
+    prefix: str = "",
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    force_path_style: bool = False,
+    start_after: Optional[str] = None,
+) -> Iterator[Tuple[str, float]]:
+    """Yield (key, last_modified_epoch) for every object under `prefix`, in key order."""
+    s3 = get_s3_client(region_name, endpoint_url, force_path_style)
+    kwargs: Dict[str, Any] = {"Bucket": bucket, "Prefix": prefix}
+    if start_after:
+        kwargs["StartAfter"] = start_after
+    while True:
+        resp = s3.list_objects_v2(**kwargs)
+        for obj in resp.get("Contents", []):
+            yield obj["Key"], obj["LastModified"].timestamp()
+        if not resp.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = resp["NextContinuationToken"]
+
+
 def ensure_bucket_exists(
     bucket: str,
     region_name: Optional[str] = None,
@@ -0,0 +1,172 @@
+"""Constant-memory streaming of an UploadFile into S3."""
+
+import hashlib
+from typing import Awaitable, Callable, Optional
+
+from aio_utils import run_blocking
+from content_encoding import measure_ratio, new_compressor
+
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when the streamed body exceeds the configured maximum size."""
+
+
+class EmptyUploadError(Exception):
+    """Raised when the uploaded body has no bytes."""
+
+
+class UploadResult:
+    """Outcome of stream_upload_to_s3: size, SHA-256 and the key now holding the bytes."""
+
+    __slots__ = ("size", "sha256", "key", "reused", "encoding")
+
+    def __init__(self, size: int, sha256: str, key: str, reused: bool = False, encoding: Optional[str] = None):
+        self.size = size
+        self.sha256 = sha256
+        self.key = key
+        self.reused = reused
+        self.encoding = encoding
+
+
+async def _read_chunk(upload, size: int) -> bytes:
+    """Read up to `size` bytes, only returning a short chunk at EOF."""
+    buf = bytearray()
+    while len(buf) < size:
+        data = await upload.read(size - len(buf))
+        if not data:
+            break
+        buf += data
+    return bytes(buf)
+
+
+async def stream_upload_to_s3(
+    upload,
+    s3,
+    bucket: str,
+    key: str,
+    content_type: str,
+    max_size: int,
+    chunk_size: int,
+    extra_args: Optional[dict] = None,
+    find_existing: Optional[Callable[[str, int], Awaitable[Optional[str]]]] = None,
+    content_encoding: Optional[str] = None,
+    compress_level: int = 6,
+    compress_max_ratio: float = 0.9,
+) -> UploadResult:
+    """
+    Stream an UploadFile to S3 one chunk at a time, hashing it on the way.
+
+    Bodies that fit in a single chunk go through one put_object call; larger
+    ones become a multipart upload with one part per chunk, so at most one
+    chunk is resident per request regardless of file size. The size limit is
+    enforced while counting bytes and any partial multipart upload is aborted.
+
+    For single-chunk bodies the hash is known before anything is sent, so
+    `find_existing(sha256, size)` is awaited first; if it returns a key that
+    already holds the same bytes, the PUT is skipped.
+
+    With `content_encoding` ("gzip" or "zstd") the body is compressed on the
+    fly and stored with that ContentEncoding, provided a sample of the first
+    chunk shrinks to at most `compress_max_ratio` of its size. Size limits
+    and the hash always apply to the original bytes.
+    """
+    chunk_size = max(chunk_size, MIN_PART_SIZE)
+    extra_args = dict(extra_args or {})
+
+    declared_size = getattr(upload, "size", None)
+    if declared_size is not None and declared_size > max_size:
+        raise UploadTooLargeError()
+
+    chunk = await _read_chunk(upload, min(chunk_size, max_size + 1))
+    total = len(chunk)
+    if total == 0:
+        raise EmptyUploadError()
+    if total > max_size:
+        raise UploadTooLargeError()
+    # Hash off the event loop; hashlib releases the GIL on large buffers
+    digest = hashlib.sha256()
+    await run_blocking(digest.update, chunk)
+
+    compressor = None
+    if content_encoding:
+        ratio = await run_blocking(measure_ratio, chunk, content_encoding, compress_level)
+        if ratio <= compress_max_ratio:
+            compressor = new_compressor(content_encoding, compress_level)
+            extra_args["ContentEncoding"] = content_encoding
+
+    if total < chunk_size:
+        if find_existing is not None:
+            existing_key = await find_existing(digest.hexdigest(), total)
+            if existing_key:
+                return UploadResult(total, digest.hexdigest(), existing_key, reused=True)
+        if compressor is not None:
+            chunk = await run_blocking(lambda: compressor.compress(chunk) + compressor.flush())
+        await run_blocking(
+            s3.put_object,
+            Bucket=bucket,
+            Key=key,
+            Body=chunk,
+            ContentType=content_type,
+            **extra_args,
+        )
+        return UploadResult(total, digest.hexdigest(), key, encoding=extra_args.get("ContentEncoding"))
+
+    mpu = await run_blocking(
+        s3.create_multipart_upload,
+        Bucket=bucket,
+        Key=key,
+        ContentType=content_type,
+        **extra_args,
+    )
+    upload_id = mpu["UploadId"]
+    parts = []
+
+    async def upload_part(body: bytes) -> None:
+        resp = await run_blocking(
+            s3.upload_part,
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=len(parts) + 1,
+            Body=body,
+        )
+        parts.append({"PartNumber": len(parts) + 1, "ETag": resp["ETag"]})
+
+    try:
+        # Compressed output is gathered until it makes a full-sized part
+        pending = bytearray()
+        while chunk:
+            if compressor is None:
+                await upload_part(chunk)
+            else:
+                pending += await run_blocking(compressor.compress, chunk)
+                if len(pending) >= chunk_size:
+                    await upload_part(bytes(pending))
+                    pending.clear()
+
+            chunk = await _read_chunk(upload, chunk_size)
+            total += len(chunk)
+            if total > max_size:
+                raise UploadTooLargeError()
+            await run_blocking(digest.update, chunk)
+
+        if compressor is not None:
+            pending += compressor.flush()
+            if pending or not parts:
+                await upload_part(bytes(pending))
+
+        await run_blocking(
+            s3.complete_multipart_upload,
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except BaseException:
+        await run_blocking(s3.abort_multipart_upload, Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    return UploadResult(total, digest.hexdigest(), key, encoding=extra_args.get("ContentEncoding"))
@@ -0,0 +1,108 @@
+"""Constant-memory ZIP archives streamed straight from S3 objects."""
+
+import time
+import zipfile
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+# Content types that are already compressed; deflating them costs CPU for
+# next to no gain, so they are stored as-is.
+STORED_CONTENT_TYPES = [
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/avif', 'image/heic',
+    'video/', 'audio/', 'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/x-7z-compressed', 'application/x-rar-compressed', 'application/x-bzip2',
+    'application/zstd', 'application/vnd.openxmlformats',
+]
+
+# Yield to the client once this much archive data is pending
+FLUSH_SIZE = 64 * 1024
+
+
+class _ChunkSink:
+    """Write-only, non-seekable file object whose bytes are drained by the generator."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self.pending = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self.pending += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        self.pending = 0
+        return data
+
+
+def compress_type_for(content_type: str) -> int:
+    if any(content_type.startswith(stored) for stored in STORED_CONTENT_TYPES):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def safe_name(filename: str) -> str:
+    """
+    Reduce a user-supplied filename to a plain basename, so no member can
+    land outside the folder it is extracted to ("../x", "a/b.sh", "C:\\x").
+    """
+    parts = [p for p in filename.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    name = parts[-1] if parts else ""
+    return name.split(":")[-1].strip() or "file"
+
+
+def unique_names(filenames: Iterable[str]) -> List[str]:
+    """Make safe archive member names unique: a.txt, a (1).txt, a (2).txt, ..."""
+    seen = set()
+    names = []
+    for filename in filenames:
+        name = safe_name(filename)
+        stem, dot, ext = name.rpartition(".")
+        if not dot:
+            stem, ext = name, ""
+        n = 1
+        while name in seen:
+            name = f"{stem} ({n}).{ext}" if dot else f"{stem} ({n})"
+            n += 1
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def stream_zip(
+    entries: Iterable[Tuple[str, Callable[[], Optional[Tuple[str, Optional[int], Iterator[bytes]]]]]],
+) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of `entries` piece by piece.
+
+    Each entry is (name, opener); the opener is called only when the entry
+    is reached and returns (content_type, size, chunks), or None to leave
+    the entry out. Entries are written with data descriptors since the
+    output cannot seek back, and with ZIP64 records when their size needs
+    them or is unknown (size None). Memory use is bounded by one chunk plus
+    the compressor's window, whatever the size of the archive.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as archive:
+        for name, opener in entries:
+            opened = opener()
+            if opened is None:
+                continue
+            content_type, size, chunks = opened
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = compress_type_for(content_type)
+            info.file_size = size or 0
+            info.external_attr = 0o644 << 16
+            with archive.open(info, mode="w", force_zip64=size is None) as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    if sink.pending >= FLUSH_SIZE:
+                        yield sink.drain()
+            if sink.pending >= FLUSH_SIZE:
+                yield sink.drain()
+    yield sink.drain()
@@ -5,7 +5,7 @@ resource "aws_lambda_function" "api" {
   filename         = "lambda_function.zip"
   function_name    = "${var.project_name}-${var.environment}-api"
   role            = aws_iam_role.lambda_role[0].arn
-  handler         = "lambda_handler.handler"
+  handler         = "lambda_handler.lambda_handler"
   runtime         = "python3.11"
   timeout         = 15  # Reduced for free tier optimization
   memory_size      = 128  # Minimum memory for cost efficiency
@@ -22,6 +22,8 @@ resource "aws_lambda_function" "api" {
       AWS_S3_FORCE_PATH_STYLE = "false"
       PRESIGNED_UPLOAD_TTL_SECONDS = "900"
       PRESIGNED_DOWNLOAD_TTL_SECONDS = "120"
+      FILE_RETENTION_DAYS = tostring(var.file_retention_days)
+      EXPIRY_TIERS_DAYS = join(",", var.expiry_tiers_days)
     }
   }
 
@@ -78,18 +80,29 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Action = [
           "s3:GetObject",
           "s3:PutObject",
+          "s3:PutObjectTagging",
           "s3:DeleteObject",
           "s3:GetObjectAttributes"
         ]
         Resource = "${aws_s3_bucket.files_bucket.arn}/*"
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:ListBucket"
+        ]
+        Resource = aws_s3_bucket.files_bucket.arn
+      },
       {
         Effect = "Allow"
         Action = [
           "dynamodb:GetItem",
           "dynamodb:PutItem",
           "dynamodb:UpdateItem",
-          "dynamodb:DeleteItem"
+          "dynamodb:DeleteItem",
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem",
+          "dynamodb:Scan"
         ]
         Resource = aws_dynamodb_table.files_metadata.arn
       }
@@ -97,6 +110,95 @@ resource "aws_iam_role_policy" "lambda_policy" {
   })
 }
 
+# Scheduled sweep of persisted S3 deletions (see backend/deletion_queue.py)
+resource "aws_cloudwatch_event_rule" "deletion_sweep" {
+  count = var.use_lambda ? 1 : 0
+
+  name                = "${var.project_name}-${var.environment}-deletion-sweep"
+  description         = "Finish S3 deletions left pending by frozen Lambda containers"
+  schedule_expression = "rate(15 minutes)"
+}
+
+resource "aws_cloudwatch_event_target" "deletion_sweep" {
+  count = var.use_lambda ? 1 : 0
+
+  rule = aws_cloudwatch_event_rule.deletion_sweep[0].name
+  arn  = aws_lambda_function.api[0].arn
+}
+
+resource "aws_lambda_permission" "deletion_sweep" {
+  count = var.use_lambda ? 1 : 0
+
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.api[0].function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.deletion_sweep[0].arn
+}
+
+# Same package as the API, with room for a full pass over the bucket
+resource "aws_lambda_function" "reconcile" {
+  count = var.use_lambda ? 1 : 0
+
+  filename         = "lambda_function.zip"
+  function_name    = "${var.project_name}-${var.environment}-reconcile"
+  role            = aws_iam_role.lambda_role[0].arn
+  handler         = "lambda_handler.lambda_handler"
+  runtime         = "python3.11"
+  timeout         = 900
+  memory_size      = 512
+
+  environment {
+    variables = {
+      REGION     = var.aws_region
+      S3_BUCKET_NAME = aws_s3_bucket.files_bucket.bucket
+      DDB_TABLE_NAME = aws_dynamodb_table.files_metadata.name
+      ENVIRONMENT    = var.environment
+      USE_LOCALSTACK = "false"
+      AWS_S3_FORCE_PATH_STYLE = "false"
+      FILE_RETENTION_DAYS = tostring(var.file_retention_days)
+      EXPIRY_TIERS_DAYS = join(",", var.expiry_tiers_days)
+      RECONCILE_WORKERS = "8"
+    }
+  }
+
+  depends_on = [
+    aws_iam_role_policy_attachment.lambda_logs,
+  ]
+
+  tags = {
+    Environment = var.environment
+    ManagedBy   = "terraform"
+    Project     = var.project_name
+  }
+}
+
+resource "aws_cloudwatch_event_rule" "reconcile" {
+  count = var.use_lambda ? 1 : 0
+
+  name                = "${var.project_name}-${var.environment}-reconcile"
+  description         = "Delete orphaned uploads and expired metadata left behind by TTL and lifecycle rules"
+  schedule_expression = "rate(1 day)"
+}
+
+resource "aws_cloudwatch_event_target" "reconcile" {
+  count = var.use_lambda ? 1 : 0
+
+  rule  = aws_cloudwatch_event_rule.reconcile[0].name
+  arn   = aws_lambda_function.reconcile[0].arn
+  input = jsonencode({ task = "reconcile" })
+}
+
+resource "aws_lambda_permission" "reconcile" {
+  count = var.use_lambda ? 1 : 0
+
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.reconcile[0].function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.reconcile[0].arn
+}
+
 # Attach CloudWatch Logs policy to Lambda role
 resource "aws_iam_role_policy_attachment" "lambda_logs" {
   count = var.use_lambda ? 1 : 0
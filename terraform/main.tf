@@ -92,6 +92,30 @@ resource "aws_s3_bucket_lifecycle_configuration" "files_bucket_lifecycle" {
       noncurrent_days = 1
     }
   }
+
+  # Uploads are tagged expiry-tier=<n>d by the API (backend/expiry.py);
+  # S3 applies the shortest matching expiration
+  dynamic "rule" {
+    for_each = [for days in var.expiry_tiers_days : days if days < var.file_retention_days]
+
+    content {
+      id     = "expire-tier-${rule.value}d"
+      status = "Enabled"
+
+      filter {
+        and {
+          prefix = "uploads/"
+          tags = {
+            "expiry-tier" = "${rule.value}d"
+          }
+        }
+      }
+
+      expiration {
+        days = rule.value
+      }
+    }
+  }
 }
 
 # DynamoDB table for metadata
@@ -110,7 +134,7 @@ resource "aws_dynamodb_table" "files_metadata" {
   }
 
   ttl {
-    attribute_name = "expires_at"
+    attribute_name = "expires_at_epoch"
     enabled        = true
   }
 
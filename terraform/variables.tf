@@ -42,6 +42,12 @@ variable "file_retention_days" {
   }
 }
 
+variable "expiry_tiers_days" {
+  description = "Expiry tiers (days) uploads are tagged with; shorter than file_retention_days to free storage sooner"
+  type        = list(number)
+  default     = [1, 3, 7]
+}
+
 variable "log_retention_days" {
   description = "CloudWatch log retention in days"
   type        = number